@@ -0,0 +1,103 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bboost_v1.beraboost_v1 import compute_beraboost_v1_weights
+from scripts.state_history import UserRewardsVaultHistory, ValidatorDelegatorHistory
+
+
+def allocation_deviation(recommended, actual):
+    """Deviation metrics between a recommended and an actual cutting board, both lists of
+    (vault, weight in BP): the L1 distance in BP, the overlap (share of the weight on
+    which both agree, between 0 and 1) and whether both put their largest weight on the same vault."""
+    recommended = {rv.lower(): w for rv, w in recommended}
+    actual = {rv.lower(): w for rv, w in actual}
+    vaults = set(recommended) | set(actual)
+    rec = np.array([recommended.get(rv, 0) for rv in vaults], dtype=np.float64)
+    act = np.array([actual.get(rv, 0) for rv in vaults], dtype=np.float64)
+    return {
+        'l1_distance_bp': np.abs(rec - act).sum(),
+        'overlap': np.minimum(rec, act).sum() / 1e4,
+        'same_top_vault': bool(recommended) and bool(actual) and
+            max(recommended, key=recommended.get) == max(actual, key=actual.get),
+    }
+
+
+def _backtest_blocks(allocations, vd_directory, urv_directory):
+    """Backtest the allocations of a contiguous range of start blocks. Runs in worker
+    processes: each opens the state histories and walks its blocks in order, so the
+    state of one evaluation point is reused for the next."""
+    vd_history = ValidatorDelegatorHistory(directory=vd_directory)
+    urv_history = UserRewardsVaultHistory(directory=urv_directory)
+    blocks = sorted(allocations.start_block.unique())
+    by_block = dict(tuple(allocations.groupby('start_block')))
+
+    results = []
+    for (block, vd_state), (_, user_rv_state) in zip(vd_history.iter_states_at(blocks),
+                                                     urv_history.iter_states_at(blocks)):
+        block_allocations = by_block[block]
+        weights = compute_beraboost_v1_weights(user_rv_state, vd_state,
+                                               block_allocations.validator_address.unique())
+        recommended = {val_pubkey: list(zip(cb.rv_address, cb.weight))
+                       for val_pubkey, cb in weights.groupby('validator_address', sort=False)}
+        for allocation in block_allocations.itertuples(index=False):
+            rec = recommended.get(allocation.validator_address, [])
+            results.append({
+                'validator_address': allocation.validator_address,
+                'block_number': allocation.block_number,
+                'start_block': block,
+                'transaction_hash': allocation.transaction_hash,
+                'recommended': rec,
+                'actual': list(allocation.weights),
+                **allocation_deviation(rec, allocation.weights),
+            })
+    return pd.DataFrame(results)
+
+
+def run_backtest(allocations_df, vd_directory=None, urv_directory=None, max_workers=None):
+    """Compare what run_beraboost_v1 would have recommended with the allocations validators
+    activated, at each start_block.
+
+    allocations_df holds decoded BeraChef ActivateRewardAllocation logs (see
+    decode_weight_update_batch). States come from the validator-delegator and user-rewards
+    vault state histories, which must be up to date with the allocations to test: allocations
+    starting after their last block are skipped. Start blocks are split into contiguous block
+    ranges backtested in parallel processes."""
+    vd_history = ValidatorDelegatorHistory(directory=vd_directory)
+    urv_history = UserRewardsVaultHistory(directory=urv_directory)
+    last_block = min(vd_history.last_block, urv_history.last_block)
+
+    allocations = allocations_df.loc[allocations_df.start_block <= last_block]
+    if len(allocations) < len(allocations_df):
+        print(f"Skipping {len(allocations_df) - len(allocations)} allocations starting after block {last_block}")
+    blocks = np.sort(allocations.start_block.unique())
+    if len(blocks) == 0:
+        return pd.DataFrame()
+
+    # Contiguous block ranges with about the same number of evaluation points each
+    max_workers = max_workers or multiprocessing.cpu_count()
+    block_ranges = [r for r in np.array_split(blocks, max_workers) if len(r)]
+    chunks = [allocations.loc[allocations.start_block.between(r[0], r[-1])] for r in block_ranges]
+    print(f"Backtesting {len(allocations)} allocations at {len(blocks)} start blocks in {len(chunks)} block ranges")
+
+    if len(chunks) == 1:
+        results = [_backtest_blocks(chunks[0], vd_history.directory, urv_history.directory)]
+    else:
+        with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+            futures = [executor.submit(_backtest_blocks, chunk, vd_history.directory, urv_history.directory)
+                       for chunk in chunks]
+            results = [future.result() for future in futures]
+    return pd.concat(results, ignore_index=True).sort_values(['start_block', 'validator_address'],
+                                                             ignore_index=True)
+
+
+def summarize_backtest(backtest_df):
+    """Mean deviation metrics of each validator over its backtested allocations."""
+    return backtest_df.groupby('validator_address').agg(
+        allocations=('start_block', 'count'),
+        mean_l1_distance_bp=('l1_distance_bp', 'mean'),
+        mean_overlap=('overlap', 'mean'),
+        same_top_vault_rate=('same_top_vault', 'mean'),
+    ).reset_index()
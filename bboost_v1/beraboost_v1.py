@@ -1,38 +1,99 @@
 import numpy as np
 import pandas as pd
+from scipy import sparse
 
 
-def run_beraboost_v1(val_pubkey, user_rv_state, vd_state):
+def build_share_matrix(user_rv_state, user_addresses=None):
+    """Sparse users x vaults matrix of user shares, as a (CSR matrix, users, vaults) tuple.
+    Users and vaults are interned to integer indices in sorted address order, so memory
+    scales with the number of positions rather than users x vaults. Shares are computed
+    from the totals of every position, but only the rows of user_addresses are kept if given."""
+    rv_idx, vaults = pd.factorize(user_rv_state.rv_address, sort=True)
+    amount = user_rv_state.amount.to_numpy(dtype=np.float64)
+
     # Compute the total staked amount and user share
-    total_staked = user_rv_state.groupby('rv_address').amount.sum()
-    user_rv_state['user_share'] = user_rv_state.apply(
-        lambda x: x.amount / total_staked[x.rv_address], axis=1)
-
-    # Filter active delegators of the val_pubkey
-    delegators_val = vd_state.loc[vd_state.validator_address == val_pubkey].reset_index(
-        drop=True)
-    delegators_val = delegators_val.loc[delegators_val.delegator_address.isin(
-        user_rv_state.user_address)].reset_index(drop=True)
-    delegators_val['amount_bgt_delegated_norm'] = delegators_val.amount_bgt_delegated / \
-        delegators_val.amount_bgt_delegated.sum()
-
-    # Compute the user share of the active delegators
-    delegator_rv = user_rv_state.loc[user_rv_state.user_address.isin(
-        delegators_val.delegator_address)].reset_index(drop=True)
-    delegator_rv_matrix = delegator_rv.pivot(
-        index='user_address', columns='rv_address', values='user_share').fillna(0)
-
-    # Get max user share for each delegator
-    max_liq = np.argmax(delegator_rv_matrix, axis=1)
-
-    # Compute the weight
-    w = pd.DataFrame({'delegator_address': delegator_rv_matrix.index,
-                      'rv_address': delegator_rv_matrix.columns[max_liq]}).merge(delegators_val[['delegator_address', 'amount_bgt_delegated_norm']],
-                                                                                 on='delegator_address',
-                                                                                 how='left')
-
-    cb = w.groupby('rv_address').amount_bgt_delegated_norm.sum()
-    cb = round(cb*1e4)  # Converting values in BP and rounding
-    cb = cb.loc[cb > 0]  # Filtering non zero values
-    cb_formatted = list(cb.items())
-    return cb_formatted
+    total_staked = np.bincount(rv_idx, weights=amount, minlength=len(vaults))
+    user_share = amount / total_staked[rv_idx]
+
+    user_address = user_rv_state.user_address
+    if user_addresses is not None:
+        keep = user_address.isin(user_addresses).to_numpy()
+        user_address, rv_idx, user_share = user_address[keep], rv_idx[keep], user_share[keep]
+    user_idx, users = pd.factorize(user_address, sort=True)
+
+    share_matrix = sparse.csr_matrix((user_share, (user_idx, rv_idx)), shape=(len(users), len(vaults)))
+    share_matrix.sum_duplicates()
+    return share_matrix, users, vaults
+
+
+def sparse_row_argmax(matrix):
+    """Column of the max stored value of each row of a CSR matrix with sorted indices,
+    ties going to the first column like np.argmax, or -1 for empty rows."""
+    argmax = np.full(matrix.shape[0], -1, dtype=np.int64)
+    row_lengths = np.diff(matrix.indptr)
+    rows = np.flatnonzero(row_lengths)
+    if len(rows) == 0:
+        return argmax
+    row_starts = matrix.indptr[rows]
+    row_max = np.maximum.reduceat(matrix.data, row_starts)
+    is_max = matrix.data == np.repeat(row_max, row_lengths[rows])
+    columns = np.where(is_max, matrix.indices, matrix.shape[1])
+    argmax[rows] = np.minimum.reduceat(columns, row_starts)
+    return argmax
+
+
+def compute_beraboost_v1_weights(user_rv_state, vd_state, val_pubkeys=None):
+    """Cutting-board weights of every validator (or only those in val_pubkeys) in one pass,
+    as a DataFrame with validator_address, rv_address and weight (in BP)."""
+    # Filter the delegations of the requested validators
+    delegations = vd_state
+    if val_pubkeys is not None:
+        delegations = delegations.loc[delegations.validator_address.isin(val_pubkeys)]
+
+    share_matrix, users, vaults = build_share_matrix(
+        user_rv_state, None if val_pubkeys is None else delegations.delegator_address.unique())
+
+    # Get max user share for each user
+    max_liq = sparse_row_argmax(share_matrix)
+
+    # Filter active delegators
+    delegator_idx = users.get_indexer(delegations.delegator_address)
+    active = delegator_idx >= 0
+    delegator_idx = delegator_idx[active]
+    delegations = delegations.loc[active]
+    if len(delegations) == 0:
+        return pd.DataFrame(columns=['validator_address', 'rv_address', 'weight'])
+
+    # Normalize the delegations within each validator
+    val_idx, validators = pd.factorize(delegations.validator_address, sort=True)
+    amount = delegations.amount_bgt_delegated.to_numpy(dtype=np.float64)
+    amount_norm = amount / np.bincount(val_idx, weights=amount)[val_idx]
+
+    # Compute the weight: validators x users delegations times the users x vaults argmax assignment
+    delegation_matrix = sparse.csr_matrix((amount_norm, (val_idx, delegator_idx)),
+                                          shape=(len(validators), len(users)))
+    assigned = max_liq >= 0
+    assignment_matrix = sparse.csr_matrix(
+        (np.ones(assigned.sum()), (np.flatnonzero(assigned), max_liq[assigned])),
+        shape=(len(users), len(vaults)))
+    cb = (delegation_matrix @ assignment_matrix).tocoo()
+
+    weight = np.round(cb.data*1e4)  # Converting values in BP and rounding
+    keep = weight > 0  # Filtering non zero values
+    weights = pd.DataFrame({'validator_address': validators[cb.row[keep]],
+                            'rv_address': vaults[cb.col[keep]],
+                            'weight': weight[keep]})
+    return weights.sort_values(['validator_address', 'rv_address']).reset_index(drop=True)
+
+
+def run_beraboost_v1_all(user_rv_state, vd_state, val_pubkeys=None):
+    """Batch version of run_beraboost_v1: a dict of validator_address to its cutting board,
+    for every validator with active delegators (or only those in val_pubkeys)."""
+    weights = compute_beraboost_v1_weights(user_rv_state, vd_state, val_pubkeys)
+    return {val_pubkey: list(zip(cb.rv_address, cb.weight))
+            for val_pubkey, cb in weights.groupby('validator_address', sort=False)}
+
+
+def run_beraboost_v1(val_pubkey, user_rv_state, vd_state):
+    # Cutting board of a single validator, from the sparse share matrix
+    return run_beraboost_v1_all(user_rv_state, vd_state, [val_pubkey]).get(val_pubkey, [])
@@ -0,0 +1,103 @@
+import os
+
+import pandas as pd
+
+import config
+from bboost_v1.beraboost_v1 import compute_beraboost_v1_weights
+
+
+VD_KEYS = ['validator_address', 'delegator_address']
+URV_KEYS = ['user_address', 'rv_address']
+
+
+def _changed_rows(old, new, keys, value):
+    """Rows of (keys, value) that were added, removed or changed between two states."""
+    merged = old[keys + [value]].merge(new[keys + [value]], on=keys, how='outer',
+                                       suffixes=('_old', '_new'), indicator=True)
+    changed = (merged['_merge'] != 'both') | (merged[value + '_old'] != merged[value + '_new'])
+    return merged.loc[changed]
+
+
+class BeraBoostCache:
+    """Cutting boards of run_beraboost_v1 keyed by validator, persisted between runs.
+
+    A validator is recomputed only when it is dirty: one of its delegators (before or
+    after the update) changed delegation, or a vault position of one of them changed,
+    or the total of a vault they hold changed, since vault totals move every holder's
+    share. The other validators are served from the cache."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or config.BERABOOST_CACHE_DIR
+        self.user_rv_state = pd.DataFrame(columns=URV_KEYS + ['amount'])
+        self.vd_state = pd.DataFrame(columns=VD_KEYS + ['amount_bgt_delegated'])
+        self.weights = pd.DataFrame(columns=['validator_address', 'rv_address', 'weight'])
+        self.last_dirty = []
+        self.load()
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.parquet")
+
+    def load(self):
+        # Start empty, so every validator is dirty, if nothing was saved
+        if os.path.exists(self._path('weights')):
+            self.user_rv_state = pd.read_parquet(self._path('user_rv_state'))
+            self.vd_state = pd.read_parquet(self._path('vd_state'))
+            self.weights = pd.read_parquet(self._path('weights'))
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # Weights are written last: they mark a complete cache
+        for name in ['user_rv_state', 'vd_state', 'weights']:
+            tmp_filename = self._path(name) + '.tmp'
+            getattr(self, name).to_parquet(tmp_filename, index=False)
+            os.replace(tmp_filename, self._path(name))
+
+    def dirty_validators(self, user_rv_state, vd_state):
+        """Validators whose cutting board may differ between the cached and the new states."""
+        changed_delegations = _changed_rows(self.vd_state, vd_state, VD_KEYS, 'amount_bgt_delegated')
+        changed_positions = _changed_rows(self.user_rv_state, user_rv_state, URV_KEYS, 'amount')
+
+        # Vaults whose total changed move the share of each of their holders
+        old_totals = self.user_rv_state.groupby('rv_address').amount.sum()
+        new_totals = user_rv_state.groupby('rv_address').amount.sum()
+        totals = pd.concat([old_totals.rename('old'), new_totals.rename('new')], axis=1)
+        changed_vaults = totals.index[totals.old.ne(totals.new)]
+        holders = pd.concat([
+            self.user_rv_state.loc[self.user_rv_state.rv_address.isin(changed_vaults), 'user_address'],
+            user_rv_state.loc[user_rv_state.rv_address.isin(changed_vaults), 'user_address'],
+        ])
+        dirty_users = pd.concat([changed_positions.user_address, holders]).unique()
+
+        dirty = pd.concat([
+            changed_delegations.validator_address,
+            self.vd_state.loc[self.vd_state.delegator_address.isin(dirty_users), 'validator_address'],
+            vd_state.loc[vd_state.delegator_address.isin(dirty_users), 'validator_address'],
+        ]).unique()
+        return sorted(dirty)
+
+    def refresh(self, user_rv_state, vd_state):
+        """Bring the cache up to date with new states, recomputing only the dirty validators.
+
+        Returns a dict of validator_address to its cutting board, like run_beraboost_v1_all."""
+        user_rv_state = user_rv_state[URV_KEYS + ['amount']].reset_index(drop=True)
+        vd_state = vd_state[VD_KEYS + ['amount_bgt_delegated']].reset_index(drop=True)
+
+        self.last_dirty = self.dirty_validators(user_rv_state, vd_state)
+        if self.last_dirty:
+            recomputed = compute_beraboost_v1_weights(user_rv_state, vd_state, self.last_dirty)
+            kept = self.weights.loc[~self.weights.validator_address.isin(self.last_dirty)]
+            self.weights = pd.concat([kept, recomputed], ignore_index=True) \
+                .sort_values(['validator_address', 'rv_address']).reset_index(drop=True)
+        self.user_rv_state = user_rv_state
+        self.vd_state = vd_state
+        print(f"Recomputed {len(self.last_dirty)} of {self.weights.validator_address.nunique()} validators")
+        return self.cutting_boards()
+
+    def get(self, val_pubkey):
+        """Cached cutting board of a validator, [] if it has no active delegators."""
+        cb = self.weights.loc[self.weights.validator_address == val_pubkey]
+        return list(zip(cb.rv_address, cb.weight))
+
+    def cutting_boards(self):
+        return {val_pubkey: list(zip(cb.rv_address, cb.weight))
+                for val_pubkey, cb in self.weights.groupby('validator_address', sort=False)}
@@ -12,6 +12,60 @@ load_dotenv()
 # RPC endpoint
 RPC_ENDPOINT = os.getenv('RPC_ENDPOINT')
 
+# Pool of RPC endpoints (see scripts/rpc_pool.py): comma-separated RPC_ENDPOINTS, defaulting to RPC_ENDPOINT
+RPC_ENDPOINTS = [e.strip() for e in os.getenv('RPC_ENDPOINTS', RPC_ENDPOINT or '').split(',') if e.strip()]
+# Requests per second allowed by each endpoint: one value for all, or comma-separated values aligned with RPC_ENDPOINTS; 0 for no limit
+_RPC_RATE_LIMITS = [float(r) for r in os.getenv('RPC_RATE_LIMITS', '0').split(',')]
+RPC_RATE_LIMITS = dict(zip(RPC_ENDPOINTS, _RPC_RATE_LIMITS if len(_RPC_RATE_LIMITS) > 1 else _RPC_RATE_LIMITS * len(RPC_ENDPOINTS)))
+RPC_HEDGE_PERCENTILE = float(os.getenv('RPC_HEDGE_PERCENTILE', 90))  # eth_getLogs latency percentile after which a request is hedged
+RPC_HEDGE_DELAY = float(os.getenv('RPC_HEDGE_DELAY', 2))  # Seconds before hedging while an endpoint has few latency samples
+RPC_ENDPOINT_COOLDOWN = float(os.getenv('RPC_ENDPOINT_COOLDOWN', 30))  # Longest pause of a failing endpoint in seconds
+RPC_TIMEOUT = float(os.getenv('RPC_TIMEOUT', 60))  # HTTP timeout in seconds
+
+# eth_getLogs fetching
+LOGS_BATCH_SIZE = int(os.getenv('LOGS_BATCH_SIZE', 10000))  # Initial blocks per eth_getLogs window
+LOGS_MAX_BATCH_SIZE = int(os.getenv('LOGS_MAX_BATCH_SIZE', 500000))  # Largest window in sparse regions
+LOGS_TARGET_PER_WINDOW = int(os.getenv('LOGS_TARGET_PER_WINDOW', 5000))  # Logs aimed for per window
+RPC_MAX_CONCURRENCY = int(os.getenv('RPC_MAX_CONCURRENCY', 4))  # Windows kept in flight at once
+RPC_BATCH_SIZE = int(os.getenv('RPC_BATCH_SIZE', 200))  # Calls per JSON-RPC batch request
+LOGS_MAX_ADDRESSES = int(os.getenv('LOGS_MAX_ADDRESSES', 100))  # Contract addresses per eth_getLogs filter when sharding
+
+# logsBloom pre-scan (see scripts/bloom.py): whether backfills test block headers before calling eth_getLogs,
+# blocks per cached bitmap file, and the largest gap between candidate blocks fetched in one range
+LOGS_BLOOM_PRESCAN = os.getenv('LOGS_BLOOM_PRESCAN', '0') == '1'
+BLOOM_CHUNK_BLOCKS = int(os.getenv('BLOOM_CHUNK_BLOCKS', 100000))
+BLOOM_MERGE_GAP = int(os.getenv('BLOOM_MERGE_GAP', 1000))
+
+# Local cache of finalized RPC responses (see scripts/rpc_cache.py)
+RPC_CACHE_ENABLED = os.getenv('RPC_CACHE_ENABLED', '1') == '1'
+RPC_CACHE_DIR = os.getenv('RPC_CACHE_DIR', 'rpc_cache')
+RPC_CACHE_MAX_BYTES = int(os.getenv('RPC_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+RPC_CACHE_LOGS_CHUNK = int(os.getenv('RPC_CACHE_LOGS_CHUNK', 1000))  # Blocks per cached eth_getLogs chunk
+RPC_FINALIZED_REFRESH = float(os.getenv('RPC_FINALIZED_REFRESH', 30))  # Seconds the finalized block is reused
+RPC_FINALITY_DEPTH = int(os.getenv('RPC_FINALITY_DEPTH', 64))  # Blocks behind the head considered final without a finalized tag
+
+# Follow mode (see scripts/follow.py): blocks kept behind the head, seconds between polls,
+# blocks of hashes kept to find the fork point of a reorg, and seconds between raw log shard flushes
+FOLLOW_CONFIRMATIONS = int(os.getenv('FOLLOW_CONFIRMATIONS', 2))
+FOLLOW_POLL_INTERVAL = float(os.getenv('FOLLOW_POLL_INTERVAL', 2))
+FOLLOW_REORG_WINDOW = int(os.getenv('FOLLOW_REORG_WINDOW', 1024))
+FOLLOW_FLUSH_SECONDS = float(os.getenv('FOLLOW_FLUSH_SECONDS', 300))
+
+# Backfill checkpoints: raw logs are streamed into shards of CHECKPOINT_LOGS logs or CHECKPOINT_BLOCKS blocks
+CHECKPOINT_LOGS = int(os.getenv('CHECKPOINT_LOGS', 100000))
+CHECKPOINT_BLOCKS = int(os.getenv('CHECKPOINT_BLOCKS', 1000000))
+
+# Decoding: rows per chunk, and the table sizes up to which the serial and thread backends are used
+DECODE_CHUNK_SIZE = int(os.getenv('DECODE_CHUNK_SIZE', 100000))
+DECODE_SERIAL_MAX_ROWS = int(os.getenv('DECODE_SERIAL_MAX_ROWS', 500000))
+DECODE_THREAD_MAX_ROWS = int(os.getenv('DECODE_THREAD_MAX_ROWS', 2000000))
+
+# State history: blocks between two position snapshots (see scripts/state_history.py)
+STATE_SNAPSHOT_INTERVAL = int(os.getenv('STATE_SNAPSHOT_INTERVAL', 100000))
+
+# Raw log shard format: "parquet" (columnar, see scripts/log_store.py) or "pkl" (legacy)
+RAW_LOGS_FORMAT = os.getenv('RAW_LOGS_FORMAT', 'parquet')
+
 # Contract addresses and ABIs
 
 
@@ -51,6 +105,15 @@ REWARDS_VAULT = ContractConfig(
     }
 )
 
+# Reward vault factory: its VaultCreated events list every reward vault (see scripts/vault_registry.py)
+REWARD_VAULT_FACTORY = ContractConfig(
+    address=os.getenv('REWARD_VAULT_FACTORY_ADDRESS', "0x94Ad6Ac84f6C6FbA8b8CCbD71d9f4f101def52a8"),
+    abi_url="https://raw.githubusercontent.com/berachain/doc-abis/refs/heads/main/core/RewardVaultFactory.json",
+    event_signatures={
+        "VaultCreated": "0x5d9c31ffa0fecffd7cf379989a3c7af252f0335e0d2a1320b55245912c781f53"
+    }
+)
+
 # Distributor contract
 DISTRIBUTOR = ContractConfig(
     address="0xD2f19a79b026Fb636A7c300bF5947df113940761",
@@ -73,15 +136,39 @@ BERACHEF = ContractConfig(
 RAW_LOGS_DIR = {
     "validator_delegator": "raw_logs/validator_delegator",
     "user_rewards_vault": "raw_logs/user_rewards_vault",
-    "berachef_weight_updates": "raw_logs/berachef_weight_updates"
+    "berachef_weight_updates": "raw_logs/berachef_weight_updates",
+    "rewards_distribution": "raw_logs/rewards_distribution",
+    "reward_vault_factory": "raw_logs/reward_vault_factory"
 }
 
+# Contract ABIs downloaded from ContractConfig.abi_url, cached for offline decoding
+ABI_CACHE_DIR = "abi_cache"
+
+# Per contract/topic set log density estimates, reused between scans
+LOG_DENSITY_FILE = "raw_logs/log_density.json"
+
+# Hashes of the recently followed blocks, compared with the node's to detect reorgs
+FOLLOW_BLOCK_HASHES_FILE = "raw_logs/follow_block_hashes.json"
+
+# Cached logsBloom pre-scan bitmaps, one directory per contract/topic set
+BLOOM_CACHE_DIR = "raw_logs/bloom_cache"
+
+# Block number to timestamp index, and the blocks between anchors when timestamps are interpolated
+BLOCK_TIMESTAMPS_FILE = "raw_logs/block_timestamps.parquet"
+TIMESTAMP_ANCHOR_STEP = int(os.getenv('TIMESTAMP_ANCHOR_STEP', 1000))
+
 PROCESSED_DATA_DIR = {
     "validator_delegator": "processed_data/validator_delegator",
     "user_rewards_vault": "processed_data/user_rewards_vault",
     "berachef_weight_updates": "processed_data/berachef_weight_updates"
 }
 
+# Every reward vault discovered from the factory, with its creation block
+VAULT_REGISTRY_FILE = "processed_data/reward_vault_registry.parquet"
+
+# Cached BeraBoost cutting boards and the states they were computed from
+BERABOOST_CACHE_DIR = "processed_data/beraboost_cache"
+
 # CSV column definitions
 VALIDATOR_DELEGATOR_COLUMNS = [
     "timestamp", "block_number", "validator_address", "delegator_address", "amount_bgt_delegated"
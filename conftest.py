@@ -0,0 +1,2 @@
+# test_rpc.py is a manual script querying a live node at import, not a test module
+collect_ignore = ["test_rpc.py"]
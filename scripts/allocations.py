@@ -0,0 +1,145 @@
+"""
+Timeline of the BeraChef reward allocations of each validator.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from scripts.process_weight_update import decode_weight_update_batch
+from scripts.utils import load_raw_log_table
+
+
+class AllocationTimeline:
+    """
+    Interval index answering which reward allocation was active for a validator at a block.
+
+    Allocations are sorted by (validator, start_block) into flat arrays, each
+    validator owning a contiguous slice, so a lookup is a binary search in that
+    slice and a batch of lookups is a single searchsorted over composite keys.
+    An allocation is active from its start_block until the next one starts.
+    """
+
+    def __init__(self, weight_updates_df: pd.DataFrame):
+        """
+        Args:
+            weight_updates_df: Decoded ActivateRewardAllocation logs (see decode_weight_update_batch)
+                with validator_address, block_number, start_block and weights
+        """
+        # When a validator has several allocations with the same start_block, the last one emitted wins
+        allocations = weight_updates_df.sort_values(
+            ["validator_address", "start_block", "block_number"], kind="stable"
+        ).drop_duplicates(["validator_address", "start_block"], keep="last")
+
+        codes, self.validators = pd.factorize(allocations.validator_address, sort=True)
+        self.start_blocks = allocations.start_block.to_numpy(dtype=np.int64)
+        self.block_numbers = allocations.block_number.to_numpy(dtype=np.int64)
+        self.weights = allocations.weights.to_numpy(dtype=object)
+        self.bounds = np.searchsorted(codes, np.arange(len(self.validators) + 1), side='left')
+
+        self._span = int(self.start_blocks.max()) + 2 if len(self.start_blocks) else 1
+        self._sort_keys = codes.astype(np.int64) * self._span + self.start_blocks
+
+    @classmethod
+    def from_raw_logs(cls, from_block: Optional[int] = None, to_block: Optional[int] = None) -> "AllocationTimeline":
+        """
+        Build the timeline from the saved BeraChef raw logs.
+
+        Args:
+            from_block: First block to load (defaults to the first saved block)
+            to_block: Last block to load (defaults to the last saved block)
+
+        Returns:
+            AllocationTimeline of every decoded allocation
+        """
+        raw_logs = load_raw_log_table("berachef_weight_updates", from_block=from_block, to_block=to_block)
+        weight_updates_df, _ = decode_weight_update_batch(raw_logs)
+        return cls(weight_updates_df)
+
+    def __len__(self) -> int:
+        return len(self.start_blocks)
+
+    def _position(self, validator_address: str, block: int) -> int:
+        """Return the index of the allocation active at block, or -1."""
+        code = self.validators.get_indexer([validator_address])[0]
+        if code < 0:
+            return -1
+        start, stop = self.bounds[code], self.bounds[code + 1]
+        position = start + int(np.searchsorted(self.start_blocks[start:stop], block, side='right')) - 1
+        return position if position >= start else -1
+
+    def active_at(self, validator_address: str, block: int) -> Optional[List[Tuple[str, int]]]:
+        """
+        Return the allocation of a validator active at a block.
+
+        Args:
+            validator_address: Validator, as in the decoded weight updates
+            block: Block number
+
+        Returns:
+            List of (receiver, percentage numerator), or None if the validator had no allocation yet
+        """
+        position = self._position(validator_address, block)
+        return self.weights[position] if position >= 0 else None
+
+    def active_at_batch(self, validator_addresses: Sequence[str], blocks: Sequence[int]) -> pd.DataFrame:
+        """
+        Return the allocations active for many (validator, block) pairs.
+
+        Args:
+            validator_addresses: Validators
+            blocks: Block numbers, aligned with validator_addresses
+
+        Returns:
+            DataFrame with validator_address, block, start_block, allocation_block (block of the
+            allocation's log) and weights, aligned with the inputs; start_block is -1 and weights
+            None where no allocation was active
+        """
+        validator_addresses = np.asarray(validator_addresses, dtype=object)
+        blocks = np.asarray(blocks, dtype=np.int64)
+        codes = self.validators.get_indexer(validator_addresses)
+        known = codes >= 0
+
+        positions = np.full(len(blocks), -1, dtype=np.int64)
+        if len(self.start_blocks):
+            query = codes[known].astype(np.int64) * self._span + np.clip(blocks[known], -1, self._span - 1)
+            candidate = np.searchsorted(self._sort_keys, query, side='right') - 1
+            # The candidate belongs to another validator when none of its allocations started yet
+            in_slice = candidate >= self.bounds[codes[known]]
+            positions[np.flatnonzero(known)[in_slice]] = candidate[in_slice]
+
+        found = positions >= 0
+        start_blocks = np.full(len(blocks), -1, dtype=np.int64)
+        allocation_blocks = np.full(len(blocks), -1, dtype=np.int64)
+        weights = np.full(len(blocks), None, dtype=object)
+        start_blocks[found] = self.start_blocks[positions[found]]
+        allocation_blocks[found] = self.block_numbers[positions[found]]
+        weights[found] = self.weights[positions[found]]
+        return pd.DataFrame({
+            "validator_address": validator_addresses,
+            "block": blocks,
+            "start_block": start_blocks,
+            "allocation_block": allocation_blocks,
+            "weights": weights,
+        })
+
+    def timeline(self, validator_address: str) -> pd.DataFrame:
+        """
+        Return the allocations of a validator with the block range each was active over.
+
+        Args:
+            validator_address: Validator, as in the decoded weight updates
+
+        Returns:
+            DataFrame with start_block, end_block (exclusive, -1 for the current one),
+            allocation_block and weights
+        """
+        code = self.validators.get_indexer([validator_address])[0]
+        start, stop = (self.bounds[code], self.bounds[code + 1]) if code >= 0 else (0, 0)
+        start_blocks = self.start_blocks[start:stop]
+        return pd.DataFrame({
+            "start_block": start_blocks,
+            "end_block": np.append(start_blocks[1:], -1)[:len(start_blocks)],
+            "allocation_block": self.block_numbers[start:stop],
+            "weights": self.weights[start:stop],
+        })
@@ -0,0 +1,174 @@
+"""
+Persistent block number to timestamp index.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import config
+from scripts.rpc import json_rpc_batch
+
+
+class BlockTimestampIndex:
+    """
+    Sorted arrays of known block numbers and timestamps, saved as a Parquet file.
+
+    Missing blocks are fetched with JSON-RPC batch requests of eth_getBlockByNumber,
+    hundreds of blocks per HTTP call and several calls in flight. When exact
+    timestamps are not required, only anchor blocks sampled every anchor_step
+    blocks are fetched and the blocks in between are interpolated linearly.
+    """
+
+    def __init__(self, path: Optional[str] = None, endpoint: Optional[str] = None):
+        """
+        Args:
+            path: Parquet file of the index (defaults to config.BLOCK_TIMESTAMPS_FILE)
+            endpoint: RPC endpoint (defaults to the shared pool over config.RPC_ENDPOINTS)
+        """
+        self.path = path or config.BLOCK_TIMESTAMPS_FILE
+        self.endpoint = endpoint
+        self.blocks = np.zeros(0, dtype=np.int64)
+        self.timestamps = np.zeros(0, dtype=np.int64)
+        if os.path.exists(self.path):
+            table = pq.read_table(self.path)
+            self.blocks = table.column("block_number").to_numpy().astype(np.int64)
+            self.timestamps = table.column("timestamp").to_numpy().astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def save(self):
+        """Write the index atomically."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        table = pa.table({
+            "block_number": pa.array(self.blocks, pa.uint64()),
+            "timestamp": pa.array(self.timestamps, pa.int64()),
+        })
+        tmp_filename = self.path + ".tmp"
+        pq.write_table(table, tmp_filename, compression="zstd")
+        os.replace(tmp_filename, self.path)
+
+    def _known(self, blocks: np.ndarray) -> np.ndarray:
+        positions = np.searchsorted(self.blocks, blocks)
+        in_range = positions < len(self.blocks)
+        known = np.zeros(len(blocks), dtype=bool)
+        known[in_range] = self.blocks[positions[in_range]] == blocks[in_range]
+        return known
+
+    def missing(self, blocks: Sequence[int]) -> np.ndarray:
+        """Return the sorted distinct blocks that are not in the index."""
+        blocks = np.unique(np.asarray(blocks, dtype=np.int64))
+        return blocks[~self._known(blocks)]
+
+    def _fetch_batch(self, blocks: np.ndarray) -> np.ndarray:
+        results = json_rpc_batch([("eth_getBlockByNumber", [hex(int(b)), False]) for b in blocks],
+                                 endpoint=self.endpoint)
+        missing = [int(b) for b, block in zip(blocks, results) if block is None]
+        if missing:
+            raise ValueError(f"Blocks not found on the node: {missing[:10]}")
+        return np.array([int(block["timestamp"], 16) for block in results], dtype=np.int64)
+
+    def fetch(self, blocks: Sequence[int], batch_size: Optional[int] = None,
+              max_workers: Optional[int] = None) -> int:
+        """
+        Fetch the timestamps of the blocks missing from the index.
+
+        Args:
+            blocks: Block numbers
+            batch_size: Blocks per JSON-RPC batch request (defaults to config.RPC_BATCH_SIZE)
+            max_workers: Batch requests in flight (defaults to config.RPC_MAX_CONCURRENCY)
+
+        Returns:
+            Number of blocks fetched
+        """
+        missing = self.missing(blocks)
+        if len(missing) == 0:
+            return 0
+        batch_size = batch_size or config.RPC_BATCH_SIZE
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        print(f"Fetching the timestamps of {len(missing)} blocks in {len(batches)} batch requests")
+        with ThreadPoolExecutor(max_workers=max_workers or config.RPC_MAX_CONCURRENCY) as executor:
+            timestamps = np.concatenate(list(executor.map(self._fetch_batch, batches)))
+
+        blocks = np.concatenate([self.blocks, missing])
+        order = np.argsort(blocks, kind="stable")
+        self.blocks = blocks[order]
+        self.timestamps = np.concatenate([self.timestamps, timestamps])[order]
+        return len(missing)
+
+    def fetch_anchors(self, from_block: int, to_block: int, anchor_step: Optional[int] = None) -> int:
+        """
+        Fetch anchor blocks every anchor_step blocks between from_block and to_block, both included.
+
+        Args:
+            from_block: First block
+            to_block: Last block
+            anchor_step: Blocks between anchors (defaults to config.TIMESTAMP_ANCHOR_STEP)
+
+        Returns:
+            Number of blocks fetched
+        """
+        anchor_step = anchor_step or config.TIMESTAMP_ANCHOR_STEP
+        anchors = np.append(np.arange(from_block, to_block, anchor_step, dtype=np.int64), to_block)
+        return self.fetch(anchors)
+
+    def lookup(self, blocks: Sequence[int], interpolate: bool = False) -> np.ndarray:
+        """
+        Return the timestamps of many blocks.
+
+        Args:
+            blocks: Block numbers
+            interpolate: Interpolate linearly between the known blocks around blocks
+                missing from the index instead of raising
+
+        Returns:
+            Array of Unix timestamps aligned with blocks
+
+        Raises:
+            KeyError: If a block is missing and interpolate is False
+            ValueError: If a block to interpolate is outside the known blocks
+        """
+        blocks = np.asarray(blocks, dtype=np.int64)
+        known = self._known(blocks)
+        if known.all():
+            return self.timestamps[np.searchsorted(self.blocks, blocks)]
+        if not interpolate:
+            raise KeyError(f"{len(np.unique(blocks[~known]))} blocks are missing from the timestamp index")
+        if len(self.blocks) == 0 or blocks.min() < self.blocks[0] or blocks.max() > self.blocks[-1]:
+            raise ValueError("Cannot interpolate timestamps outside the range of the known blocks")
+        timestamps = np.rint(np.interp(blocks, self.blocks, self.timestamps)).astype(np.int64)
+        timestamps[known] = self.timestamps[np.searchsorted(self.blocks, blocks[known])]
+        return timestamps
+
+    def add_timestamps(self, df: pd.DataFrame, block_column: str = "block_number",
+                       interpolate: bool = False, anchor_step: Optional[int] = None,
+                       save: bool = True) -> pd.DataFrame:
+        """
+        Fill the timestamp column of a decoded table from its block numbers.
+
+        Args:
+            df: Decoded logs
+            block_column: Column holding the block numbers
+            interpolate: Fetch anchors only and interpolate the blocks in between,
+                instead of fetching every distinct block
+            anchor_step: Blocks between anchors when interpolating (defaults to config.TIMESTAMP_ANCHOR_STEP)
+            save: Save the index if new blocks were fetched
+
+        Returns:
+            Copy of df with a timestamp column
+        """
+        blocks = df[block_column].to_numpy(dtype=np.int64)
+        if len(blocks) == 0:
+            return df.assign(timestamp=np.zeros(0, dtype=np.int64))
+        if interpolate:
+            fetched = self.fetch_anchors(int(blocks.min()), int(blocks.max()), anchor_step)
+        else:
+            fetched = self.fetch(blocks)
+        if fetched and save:
+            self.save()
+        return df.assign(timestamp=self.lookup(blocks, interpolate=interpolate))
@@ -0,0 +1,264 @@
+"""
+logsBloom pre-scan: skip block ranges whose headers prove they hold no matching log.
+
+Every block header carries a 2048-bit Bloom filter of the addresses and topics of
+its logs. A block can only hold a log of one of our contracts with one of our
+event signatures if its bloom contains the bits of at least one address and of
+at least one signature, so blocks failing that test never need an eth_getLogs
+call. Blooms give false positives but no false negatives; on blocks crowded with
+logs they saturate and the pre-scan keeps most blocks, so it pays off for sparse
+streams on providers that cap eth_getLogs ranges tightly or charge per call.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from eth_utils import keccak
+from web3 import Web3
+
+import config
+from scripts.log_store import to_bytes
+from scripts.range_planner import density_key
+from scripts.rpc import json_rpc_batch
+from scripts.utils import iter_log_windows
+
+
+BLOOM_BYTES = 256
+
+
+def bloom_bits(value: str | bytes) -> List[Tuple[int, int]]:
+    """
+    Return the three (byte index, bit mask) pairs a value sets in a logsBloom.
+
+    Args:
+        value: Contract address or topic, as bytes or hex string
+
+    Returns:
+        List of (index in the 256-byte big-endian bloom, bit mask) tuples
+    """
+    digest = keccak(to_bytes(value))
+    bits = []
+    for i in (0, 2, 4):
+        bit = ((digest[i] << 8) | digest[i + 1]) & 2047
+        bits.append((BLOOM_BYTES - 1 - bit // 8, 1 << (bit % 8)))
+    return bits
+
+
+def _contains(blooms: np.ndarray, value: str | bytes) -> np.ndarray:
+    result = np.ones(len(blooms), dtype=bool)
+    for index, mask in bloom_bits(value):
+        result &= (blooms[:, index] & mask) != 0
+    return result
+
+
+def bloom_may_contain(blooms: np.ndarray, contract_address: str | List[str],
+                      event_signature: str | List[str]) -> np.ndarray:
+    """
+    Test many logsBlooms against an eth_getLogs filter.
+
+    Args:
+        blooms: uint8 array of shape (blocks, 256)
+        contract_address: Single contract address or list of contract addresses
+        event_signature: Single event signature or list of event signatures (topic0)
+
+    Returns:
+        Boolean array, False where the block certainly holds no matching log
+    """
+    addresses = [contract_address] if isinstance(contract_address, str) else contract_address
+    signatures = [event_signature] if isinstance(event_signature, str) else event_signature
+    has_address = np.zeros(len(blooms), dtype=bool)
+    for address in addresses:
+        has_address |= _contains(blooms, address)
+    has_signature = np.zeros(len(blooms), dtype=bool)
+    for signature in signatures:
+        has_signature |= _contains(blooms, signature)
+    return has_address & has_signature
+
+
+def fetch_blooms(blocks: np.ndarray, batch_size: Optional[int] = None, max_workers: Optional[int] = None,
+                 endpoint: Optional[str] = None) -> np.ndarray:
+    """
+    Fetch the logsBloom of many blocks with JSON-RPC batch requests of eth_getBlockByNumber.
+
+    Args:
+        blocks: Block numbers
+        batch_size: Blocks per batch request (defaults to config.RPC_BATCH_SIZE)
+        max_workers: Batch requests in flight (defaults to config.RPC_MAX_CONCURRENCY)
+        endpoint: RPC endpoint (defaults to the shared pool over config.RPC_ENDPOINTS)
+
+    Returns:
+        uint8 array of shape (len(blocks), 256)
+    """
+    batch_size = batch_size or config.RPC_BATCH_SIZE
+    batches = [blocks[i:i + batch_size] for i in range(0, len(blocks), batch_size)]
+
+    def fetch_batch(batch: np.ndarray) -> bytes:
+        headers = json_rpc_batch([("eth_getBlockByNumber", [hex(int(b)), False]) for b in batch], endpoint=endpoint)
+        missing = [int(b) for b, header in zip(batch, headers) if header is None]
+        if missing:
+            raise ValueError(f"Blocks not found on the node: {missing[:10]}")
+        return b"".join(bytes.fromhex(header["logsBloom"][2:]) for header in headers)
+
+    with ThreadPoolExecutor(max_workers=max_workers or config.RPC_MAX_CONCURRENCY) as executor:
+        raw = b"".join(executor.map(fetch_batch, batches))
+    return np.frombuffer(raw, dtype=np.uint8).reshape(len(blocks), BLOOM_BYTES)
+
+
+class BloomPrescanIndex:
+    """
+    Per-block results of the bloom test of one contract/topic set, cached on disk.
+
+    Results are kept as two bitmaps per chunk of chunk_blocks blocks: the blocks
+    tested, and among them the blocks that may hold a matching log. Only blocks
+    config.RPC_FINALITY_DEPTH behind the head are cached, as the header of a
+    block that can still be reorganized may change.
+    """
+
+    def __init__(self, contract_address: str | List[str], event_signature: str | List[str],
+                 directory: Optional[str] = None, chunk_blocks: Optional[int] = None,
+                 endpoint: Optional[str] = None):
+        """
+        Args:
+            contract_address: Single contract address or list of contract addresses
+            event_signature: Single event signature or list of event signatures
+            directory: Directory of the cached bitmaps (defaults to a subdirectory of
+                config.BLOOM_CACHE_DIR named after the contract/topic set)
+            chunk_blocks: Blocks per bitmap file (defaults to config.BLOOM_CHUNK_BLOCKS)
+            endpoint: RPC endpoint (defaults to the shared pool over config.RPC_ENDPOINTS)
+        """
+        self.contract_address = contract_address
+        self.event_signature = event_signature
+        self.directory = directory or os.path.join(config.BLOOM_CACHE_DIR,
+                                                   density_key(contract_address, event_signature)[:16])
+        self.chunk_blocks = chunk_blocks or config.BLOOM_CHUNK_BLOCKS
+        self.endpoint = endpoint
+        self.num_fetched = 0
+
+    def _chunk_path(self, chunk: int) -> str:
+        return os.path.join(self.directory, f"bloom_{chunk * self.chunk_blocks:010d}.npz")
+
+    def _load_chunk(self, chunk: int) -> Tuple[np.ndarray, np.ndarray]:
+        path = self._chunk_path(chunk)
+        if not os.path.exists(path):
+            return np.zeros(self.chunk_blocks, dtype=bool), np.zeros(self.chunk_blocks, dtype=bool)
+        with np.load(path) as bitmaps:
+            tested = np.unpackbits(bitmaps["tested"], count=self.chunk_blocks).astype(bool)
+            candidates = np.unpackbits(bitmaps["candidates"], count=self.chunk_blocks).astype(bool)
+        return tested, candidates
+
+    def _save_chunk(self, chunk: int, tested: np.ndarray, candidates: np.ndarray):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._chunk_path(chunk)
+        tmp_filename = path + ".tmp.npz"
+        np.savez(tmp_filename, tested=np.packbits(tested), candidates=np.packbits(candidates))
+        os.replace(tmp_filename, path)
+
+    def _final_block(self) -> int:
+        head = int(json_rpc_batch([("eth_blockNumber", [])], endpoint=self.endpoint)[0], 16)
+        return head - config.RPC_FINALITY_DEPTH
+
+    def scan(self, from_block: int, to_block: int, batch_size: Optional[int] = None,
+             max_workers: Optional[int] = None) -> np.ndarray:
+        """
+        Return which blocks may hold a matching log, fetching the headers not tested yet.
+
+        Args:
+            from_block: First block
+            to_block: Last block (inclusive)
+            batch_size: Blocks per batch request (defaults to config.RPC_BATCH_SIZE)
+            max_workers: Batch requests in flight (defaults to config.RPC_MAX_CONCURRENCY)
+
+        Returns:
+            Boolean array aligned with the blocks from from_block to to_block
+        """
+        result = np.zeros(to_block - from_block + 1, dtype=bool)
+        final_block = None
+        for chunk in range(from_block // self.chunk_blocks, to_block // self.chunk_blocks + 1):
+            chunk_start = chunk * self.chunk_blocks
+            start = max(from_block, chunk_start)
+            end = min(to_block, chunk_start + self.chunk_blocks - 1)
+            tested, candidates = self._load_chunk(chunk)
+            offsets = np.arange(start - chunk_start, end - chunk_start + 1)
+            untested = offsets[~tested[offsets]]
+            if len(untested):
+                if final_block is None:
+                    final_block = self._final_block()
+                blocks = untested + chunk_start
+                matches = bloom_may_contain(fetch_blooms(blocks, batch_size, max_workers, self.endpoint),
+                                            self.contract_address, self.event_signature)
+                self.num_fetched += len(blocks)
+                candidates[untested] = matches
+                final = blocks <= final_block
+                if final.any():
+                    tested[untested[final]] = True
+                    self._save_chunk(chunk, tested, candidates)
+            result[start - from_block:end - from_block + 1] = candidates[offsets]
+        return result
+
+    def candidate_ranges(self, from_block: int, to_block: int, merge_gap: Optional[int] = None,
+                         max_workers: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Return the block ranges that may hold matching logs.
+
+        Args:
+            from_block: First block
+            to_block: Last block (inclusive)
+            merge_gap: Candidate blocks at most this many blocks apart are merged into one
+                range, trading a few empty blocks for fewer eth_getLogs calls
+                (defaults to config.BLOOM_MERGE_GAP)
+            max_workers: Batch requests in flight (defaults to config.RPC_MAX_CONCURRENCY)
+
+        Returns:
+            Sorted list of disjoint (from_block, to_block) tuples
+        """
+        merge_gap = config.BLOOM_MERGE_GAP if merge_gap is None else merge_gap
+        blocks = np.flatnonzero(self.scan(from_block, to_block, max_workers=max_workers)) + from_block
+        if len(blocks) == 0:
+            return []
+        breaks = np.flatnonzero(np.diff(blocks) > merge_gap + 1)
+        starts = np.concatenate([blocks[:1], blocks[breaks + 1]])
+        ends = np.concatenate([blocks[breaks], blocks[-1:]])
+        return [(int(start), int(end)) for start, end in zip(starts, ends)]
+
+
+def iter_prescanned_log_windows(web3: Web3, contract_address: str | List[str], event_signature: str | List[str],
+                                from_block: int, to_block: int, max_workers: Optional[int] = None,
+                                merge_gap: Optional[int] = None) -> Iterator[Tuple[int, int, List[Dict]]]:
+    """
+    Like iter_log_windows, but only the ranges passing the logsBloom pre-scan are fetched.
+
+    Ranges the blooms prove empty are yielded as windows without logs, so the
+    windows still cover [from_block, to_block] contiguously and can be recorded in
+    checkpoint manifests.
+
+    Args:
+        web3: Web3 instance
+        contract_address: Single contract address or list of contract addresses to filter logs
+        event_signature: Single event signature or list of event signatures to filter logs
+        from_block: Starting block number
+        to_block: Ending block number (inclusive)
+        max_workers: Maximum concurrent requests (defaults to config.RPC_MAX_CONCURRENCY)
+        merge_gap: Largest gap between candidate blocks fetched in the same range
+            (defaults to config.BLOOM_MERGE_GAP)
+
+    Yields:
+        (start_block, end_block, logs) tuples in block order
+    """
+    index = BloomPrescanIndex(contract_address, event_signature)
+    ranges = index.candidate_ranges(from_block, to_block, merge_gap, max_workers)
+    num_blocks = sum(end - start + 1 for start, end in ranges)
+    print(f"Bloom pre-scan kept {num_blocks} of {to_block - from_block + 1} blocks in {len(ranges)} ranges "
+          f"({index.num_fetched} headers fetched)")
+
+    # The candidate ranges are dense by construction: scanning them adaptively would grow and
+    # save a density estimate that is far too high for a full scan of the same contracts
+    next_block = from_block
+    for start, end in ranges:
+        if start > next_block:
+            yield next_block, start - 1, []
+        yield from iter_log_windows(web3, contract_address, event_signature, start, end,
+                                    max_workers=max_workers, adaptive=False, verbose=False)
+        next_block = end + 1
+    if next_block <= to_block:
+        yield next_block, to_block, []
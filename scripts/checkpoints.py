@@ -0,0 +1,176 @@
+"""
+Checkpoint manifests recording which block ranges of raw logs have been durably saved.
+"""
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Merge overlapping or adjacent inclusive block ranges.
+
+    Args:
+        ranges: List of (from_block, to_block) tuples
+
+    Returns:
+        Sorted list of disjoint (from_block, to_block) tuples
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_ranges(from_block: int, to_block: int, covered: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Return the parts of [from_block, to_block] not covered by any range.
+
+    Args:
+        from_block: First block of the range
+        to_block: Last block of the range (inclusive)
+        covered: Covered (from_block, to_block) tuples
+
+    Returns:
+        Sorted list of missing (from_block, to_block) tuples
+    """
+    missing = []
+    current_block = from_block
+    for start, end in merge_ranges(covered):
+        if end < current_block:
+            continue
+        if start > to_block:
+            break
+        if start > current_block:
+            missing.append((current_block, start - 1))
+        current_block = max(current_block, end + 1)
+    if current_block <= to_block:
+        missing.append((current_block, to_block))
+    return missing
+
+
+class CheckpointManifest:
+    """
+    Manifest of the block ranges saved for one data type.
+
+    Each entry records an inclusive block range, the raw log file holding its logs
+    (None for ranges without any log) and the number of logs. The manifest is
+    rewritten atomically after each entry, so it never claims a range whose file
+    was not fully written.
+    """
+
+    def __init__(self, data_type: str):
+        """
+        Args:
+            data_type: Type of data (validator_delegator, user_rewards_vault, berachef_weight_updates)
+        """
+        self.data_type = data_type
+        self.directory = config.RAW_LOGS_DIR[data_type]
+        self.path = os.path.join(self.directory, MANIFEST_FILENAME)
+        self.entries = []
+        self.load()
+
+    def load(self):
+        """Load the manifest from disk, starting empty if it does not exist."""
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)["ranges"]
+        else:
+            self.entries = []
+
+    def save(self):
+        """Atomically write the manifest to disk."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_filename = self.path + ".tmp"
+        with open(tmp_filename, 'w') as f:
+            json.dump({"data_type": self.data_type, "ranges": self.entries}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, self.path)
+
+    def add_range(self, from_block: int, to_block: int, filename: Optional[str] = None, num_logs: int = 0):
+        """
+        Record a block range as saved and persist the manifest.
+
+        Args:
+            from_block: First block of the range
+            to_block: Last block of the range (inclusive)
+            filename: Raw log file holding the range's logs, or None if the range has no logs
+            num_logs: Number of logs in the range
+        """
+        self.entries.append({
+            "from_block": from_block,
+            "to_block": to_block,
+            "file": os.path.basename(filename) if filename else None,
+            "num_logs": num_logs,
+            "saved_at": datetime.now().strftime("%Y-%m-%d_%H:%M:%S"),
+        })
+        self.save()
+
+    def valid_entries(self) -> List[Dict]:
+        """Return the entries whose raw log file still exists, sorted by block."""
+        entries = [
+            entry for entry in self.entries
+            if entry["file"] is None or os.path.exists(os.path.join(self.directory, entry["file"]))
+        ]
+        return sorted(entries, key=lambda entry: entry["from_block"])
+
+    def covered_ranges(self) -> List[Tuple[int, int]]:
+        """Return the merged block ranges that are durably saved."""
+        return merge_ranges([(entry["from_block"], entry["to_block"]) for entry in self.valid_entries()])
+
+    def missing_ranges(self, from_block: int, to_block: int) -> List[Tuple[int, int]]:
+        """
+        Return the block ranges of [from_block, to_block] that still have to be fetched.
+
+        Args:
+            from_block: First block of the range
+            to_block: Last block of the range (inclusive)
+
+        Returns:
+            Sorted list of missing (from_block, to_block) tuples
+        """
+        return subtract_ranges(from_block, to_block, self.covered_ranges())
+
+    def gaps(self) -> List[Tuple[int, int]]:
+        """Return the holes between the first and last saved blocks."""
+        covered = self.covered_ranges()
+        if not covered:
+            return []
+        return subtract_ranges(covered[0][0], covered[-1][1], covered)
+
+    def last_block(self) -> int:
+        """Return the last saved block of the contiguous range starting at the first saved block, or 0."""
+        covered = self.covered_ranges()
+        return covered[0][1] if covered else 0
+
+    def files(self, from_block: int = 0, to_block: Optional[int] = None) -> List[str]:
+        """
+        Return the raw log files overlapping [from_block, to_block] in block order.
+
+        Args:
+            from_block: First block of interest
+            to_block: Last block of interest (defaults to the last saved block)
+
+        Returns:
+            List of file paths
+        """
+        files = []
+        for entry in self.valid_entries():
+            if entry["file"] is None or entry["to_block"] < from_block:
+                continue
+            if to_block is not None and entry["from_block"] > to_block:
+                continue
+            path = os.path.join(self.directory, entry["file"])
+            if path not in files:
+                files.append(path)
+        return files
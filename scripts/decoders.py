@@ -0,0 +1,171 @@
+"""
+Registry routing raw logs to batch decoders by (address, topic0).
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import config
+from scripts.log_store import logs_to_table, to_bytes
+from scripts.process_user_rewards_vault import decode_user_rewards_vault_batch
+from scripts.process_validator_delegator import decode_validator_delegator_batch
+from scripts.process_weight_update import decode_weight_update_batch
+from scripts.vault_registry import reward_vault_addresses as registry_vault_addresses
+
+
+ERROR_COLUMNS = ["block_number", "log_index", "tx_hash", "error"]
+
+
+class DecoderRegistry:
+    """
+    Route a mixed batch of raw logs to the batch decoder of each data type.
+
+    Each data type is registered with the contract addresses and topic0s it
+    decodes and a batch decoder taking a raw log table. A batch containing logs
+    of several contracts is split with one vectorized filter per data type and
+    each part is decoded in a single call.
+    """
+
+    def __init__(self):
+        self.routes = {}
+
+    def register(self, data_type: str, addresses: Optional[List[str]], event_signatures: List[str],
+                 decode_batch: Callable[[pa.Table], pd.DataFrame | Tuple[pd.DataFrame, pd.DataFrame]]):
+        """
+        Register the batch decoder of a data type.
+
+        Args:
+            data_type: Name of the output table (e.g. validator_delegator)
+            addresses: Emitting contract addresses, or None to accept any address
+            event_signatures: topic0s decoded by this data type
+            decode_batch: Function decoding a raw log table into a DataFrame, or into a
+                (decoded, errors) tuple of DataFrames
+        """
+        for other_type, route in self.routes.items():
+            shared_topics = set(route["event_signatures"]) & set(s.lower() for s in event_signatures)
+            same_addresses = addresses is None or route["addresses"] is None or \
+                set(route["addresses"]) & set(a.lower() for a in addresses)
+            if shared_topics and same_addresses:
+                raise ValueError(f"{data_type} overlaps with {other_type} on topics {sorted(shared_topics)}")
+
+        self.routes[data_type] = {
+            "addresses": [a.lower() for a in addresses] if addresses is not None else None,
+            "event_signatures": [s.lower() for s in event_signatures],
+            "decode_batch": decode_batch,
+        }
+
+    def register_contract(self, data_type: str, contract_config: config.ContractConfig,
+                          decode_batch: Callable, addresses: Optional[List[str]] = None,
+                          event_names: Optional[List[str]] = None):
+        """
+        Register a data type from a ContractConfig.
+
+        Args:
+            data_type: Name of the output table
+            contract_config: Contract whose event_signatures are decoded
+            decode_batch: Batch decoder of the data type
+            addresses: Emitting addresses (defaults to contract_config.address)
+            event_names: Events to decode (defaults to all of contract_config.event_signatures)
+        """
+        if addresses is None:
+            addresses = [contract_config.address]
+        if event_names is None:
+            event_names = list(contract_config.event_signatures)
+        self.register(data_type, addresses, [contract_config.event_signatures[name] for name in event_names],
+                      decode_batch)
+
+    def addresses(self) -> List[str]:
+        """Return every registered contract address."""
+        return sorted({a for route in self.routes.values() for a in (route["addresses"] or [])})
+
+    def event_signatures(self) -> List[str]:
+        """Return every registered topic0."""
+        return sorted({s for route in self.routes.values() for s in route["event_signatures"]})
+
+    def route(self, raw_logs: pa.Table) -> Tuple[Dict[str, pa.Table], pa.Table]:
+        """
+        Split a raw log table by data type.
+
+        Args:
+            raw_logs: Raw log table (see scripts.log_store.RAW_LOG_SCHEMA)
+
+        Returns:
+            Tuple of (tables, unrouted): the rows of each data type keyed by data type,
+            and the rows no decoder is registered for
+        """
+        tables = {}
+        routed = pa.array([False] * raw_logs.num_rows)
+        for data_type, route in self.routes.items():
+            mask = pc.is_in(raw_logs.column("topic0"),
+                            value_set=pa.array([to_bytes(s) for s in route["event_signatures"]], pa.binary(32)))
+            if route["addresses"] is not None:
+                mask = pc.and_(mask, pc.is_in(
+                    raw_logs.column("address"),
+                    value_set=pa.array([to_bytes(a) for a in route["addresses"]], pa.binary(20))))
+            mask = pc.fill_null(mask, False)
+            tables[data_type] = raw_logs.filter(mask)
+            routed = pc.or_(routed, mask)
+        return tables, raw_logs.filter(pc.invert(routed))
+
+    def decode(self, raw_logs: pa.Table | List[Dict]) -> Tuple[Dict[str, pd.DataFrame], pd.DataFrame]:
+        """
+        Decode a mixed batch of raw logs in one pass.
+
+        Args:
+            raw_logs: Raw log table or list of raw log entries
+
+        Returns:
+            Tuple of (decoded, errors). decoded maps each data type to its decoded
+            DataFrame; errors gathers the rows rejected by the decoders and the
+            rows no decoder is registered for, with a data_type column
+        """
+        if not isinstance(raw_logs, pa.Table):
+            raw_logs = logs_to_table(raw_logs)
+
+        tables, unrouted = self.route(raw_logs)
+        decoded = {}
+        error_reports = []
+        for data_type, table in tables.items():
+            result = self.routes[data_type]["decode_batch"](table)
+            decoded_df, errors = result if isinstance(result, tuple) else (result, None)
+            decoded[data_type] = decoded_df
+            if errors is not None and len(errors):
+                error_reports.append(errors.assign(data_type=data_type))
+
+        if unrouted.num_rows:
+            error_reports.append(pd.DataFrame({
+                "block_number": unrouted.column("block_number").to_pylist(),
+                "log_index": unrouted.column("log_index").to_pylist(),
+                "tx_hash": ["0x" + h.hex() for h in unrouted.column("tx_hash").to_pylist()],
+                "error": "no decoder registered for (address, topic0)",
+                "data_type": None,
+            }))
+
+        errors = pd.concat(error_reports, ignore_index=True) if error_reports else \
+            pd.DataFrame(columns=ERROR_COLUMNS + ["data_type"])
+        return decoded, errors
+
+
+def build_default_registry(reward_vault_addresses: Optional[List[str]] = None) -> DecoderRegistry:
+    """
+    Build the registry of every stream of the pipeline from config.
+
+    Args:
+        reward_vault_addresses: Reward vaults to decode (defaults to every vault of the vault registry)
+
+    Returns:
+        DecoderRegistry with validator_delegator, user_rewards_vault and berachef_weight_updates
+    """
+    if reward_vault_addresses is None:
+        reward_vault_addresses = registry_vault_addresses()
+
+    registry = DecoderRegistry()
+    registry.register_contract("validator_delegator", config.BGT_TOKEN, decode_validator_delegator_batch,
+                               event_names=["Delegation", "Undelegation"])
+    registry.register_contract("user_rewards_vault", config.REWARDS_VAULT, decode_user_rewards_vault_batch,
+                               addresses=reward_vault_addresses, event_names=["Staked", "Withdrawn"])
+    registry.register_contract("berachef_weight_updates", config.BERACHEF, decode_weight_update_batch,
+                               event_names=["ActivateRewardAllocation"])
+    return registry
@@ -0,0 +1,144 @@
+"""
+Precompiled ABI event decoders for batches of raw logs.
+"""
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from eth_abi.decoding import ContextFramesBytesIO, TupleDecoder
+from eth_abi.registry import registry
+from eth_utils import event_abi_to_log_topic
+from eth_utils.abi import collapse_if_tuple
+from web3 import Web3
+
+import config
+from scripts.log_store import bytes_to_hex, fixed_binary_to_numpy, logs_to_table
+from scripts.utils import get_contract_abi
+
+
+@lru_cache(maxsize=100000)
+def checksum_address(address: str | bytes) -> str:
+    """Checksum an address, memoized since the same few contracts appear in most logs."""
+    return Web3.to_checksum_address(address)
+
+
+def _normalize_value(abi_input: Dict, value):
+    """Checksum addresses and turn arrays into lists, recursively, like web3's process_log."""
+    abi_type = abi_input["type"]
+    if abi_type.endswith("]"):
+        element_input = dict(abi_input, type=abi_type[:abi_type.rindex("[")])
+        return [_normalize_value(element_input, v) for v in value]
+    if abi_type == "tuple":
+        return tuple(_normalize_value(component, v) for component, v in zip(abi_input["components"], value))
+    if abi_type == "address":
+        return checksum_address(value)
+    return value
+
+
+class EventDecoder:
+    """
+    Decoder for one ABI event, compiled once and reused for every log.
+
+    The event's topic0, indexed inputs and the eth_abi decoder of its data are
+    resolved when the decoder is built, so decoding a batch does not construct a
+    web3 contract or touch the network per log.
+    """
+
+    def __init__(self, abi: List[Dict], event_name: str):
+        """
+        Args:
+            abi: Contract ABI
+            event_name: Name of the event to decode
+        """
+        self.event_abi = next(
+            item for item in abi if item.get("type") == "event" and item.get("name") == event_name
+        )
+        self.event_name = event_name
+        self.topic0 = "0x" + event_abi_to_log_topic(self.event_abi).hex()
+        self.indexed_inputs = [i for i in self.event_abi["inputs"] if i.get("indexed")]
+        self.data_inputs = [i for i in self.event_abi["inputs"] if not i.get("indexed")]
+        self.data_types = [collapse_if_tuple(i) for i in self.data_inputs]
+        self._data_decoder = TupleDecoder(decoders=[registry.get_decoder(t) for t in self.data_types])
+
+    @classmethod
+    def from_contract_config(cls, contract_config: config.ContractConfig, event_name: str) -> "EventDecoder":
+        """Build a decoder from a ContractConfig, using the cached ABI at its abi_url."""
+        return cls(get_contract_abi(contract_config.abi_url), event_name)
+
+    def decode_data(self, data: bytes) -> Dict:
+        """
+        Decode the non-indexed arguments of one log.
+
+        Args:
+            data: Log data
+
+        Returns:
+            Dictionary of argument name to value
+        """
+        values = self._data_decoder(ContextFramesBytesIO(bytes(data)))
+        return {
+            abi_input["name"]: _normalize_value(abi_input, value)
+            for abi_input, value in zip(self.data_inputs, values)
+        }
+
+    def decode_batch(self, raw_logs: pa.Table | List[Dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Decode a batch of raw logs of this event.
+
+        Indexed arguments are returned as the hex of their topic (the keccak hash
+        for dynamic types such as bytes), non-indexed arguments are decoded from data.
+
+        Args:
+            raw_logs: Raw log table (see scripts.log_store.RAW_LOG_SCHEMA) or list of raw log entries
+
+        Returns:
+            Tuple of (decoded, errors) DataFrames. decoded has block_number, log_index,
+            tx_hash, address and one column per event argument, in block order; errors
+            has one row per rejected log with its block_number, log_index, tx_hash and error
+        """
+        if not isinstance(raw_logs, pa.Table):
+            raw_logs = logs_to_table(raw_logs)
+
+        block_numbers = raw_logs.column("block_number").to_numpy().astype(np.int64)
+        log_indexes = raw_logs.column("log_index").to_numpy().astype(np.int64)
+        tx_hashes = bytes_to_hex(fixed_binary_to_numpy(raw_logs.column("tx_hash"), 32))
+        topic0 = bytes_to_hex(fixed_binary_to_numpy(raw_logs.column("topic0"), 32))
+        topics = [
+            bytes_to_hex(fixed_binary_to_numpy(raw_logs.column(f"topic{i + 1}"), 32))
+            for i in range(len(self.indexed_inputs))
+        ]
+        addresses = raw_logs.column("address").to_pylist()
+        data = raw_logs.column("data").to_pylist()
+
+        rows = []
+        errors = []
+        for row in range(raw_logs.num_rows):
+            try:
+                if topic0[row] != self.topic0:
+                    raise ValueError(f"Unknown event signature: {topic0[row]}")
+                decoded = {
+                    "block_number": block_numbers[row],
+                    "log_index": log_indexes[row],
+                    "tx_hash": tx_hashes[row],
+                    "address": checksum_address(addresses[row]),
+                }
+                for abi_input, topic in zip(self.indexed_inputs, topics):
+                    decoded[abi_input["name"]] = topic[row]
+                decoded.update(self.decode_data(data[row]))
+                rows.append(decoded)
+            except Exception as e:
+                errors.append({
+                    "block_number": block_numbers[row],
+                    "log_index": log_indexes[row],
+                    "tx_hash": tx_hashes[row],
+                    "error": str(e),
+                })
+
+        columns = ["block_number", "log_index", "tx_hash", "address"] + \
+            [i["name"] for i in self.indexed_inputs] + [i["name"] for i in self.data_inputs]
+        if errors:
+            print(f"Could not decode {len(errors)} of {raw_logs.num_rows} {self.event_name} logs")
+        return (pd.DataFrame(rows, columns=columns),
+                pd.DataFrame(errors, columns=["block_number", "log_index", "tx_hash", "error"]))
@@ -0,0 +1,175 @@
+"""
+Reusable executor running batch decoders over large raw log tables.
+"""
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+import config
+from scripts.log_store import logs_to_table
+
+
+BACKENDS = ("serial", "thread", "process")
+
+
+def _shared_memory_dir() -> Optional[str]:
+    """Return a RAM-backed directory for transport files if the platform has one."""
+    return "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def _decode_shared_chunk(path: str, start: int, stop: int, decode_batch: Callable):
+    """
+    Decode rows [start, stop) of a table memory-mapped from an Arrow IPC file.
+
+    Runs in worker processes: only the path and row bounds are pickled, the
+    columns themselves are read zero-copy from the mapped file.
+    """
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+        return decode_batch(table.slice(start, stop - start))
+
+
+class DecodeExecutor:
+    """
+    Run a batch decoder over a raw log table in chunks with a serial, thread or process backend.
+
+    Tables are cut into chunks of chunk_size rows which are decoded independently
+    and concatenated in their original (block) order. The process backend writes
+    the table once to an Arrow IPC file in shared memory that workers map
+    zero-copy, so no log is pickled, and its pool stays warm across calls.
+    With backend "auto" the backend is picked from the number of rows.
+    """
+
+    def __init__(self, backend: str = "auto", max_workers: Optional[int] = None,
+                 chunk_size: Optional[int] = None, serial_max_rows: Optional[int] = None,
+                 thread_max_rows: Optional[int] = None):
+        """
+        Args:
+            backend: "serial", "thread", "process" or "auto"
+            max_workers: Number of threads or processes (defaults to CPU count)
+            chunk_size: Rows per chunk (defaults to config.DECODE_CHUNK_SIZE)
+            serial_max_rows: Largest table decoded serially in auto mode (defaults to config.DECODE_SERIAL_MAX_ROWS)
+            thread_max_rows: Largest table decoded with threads in auto mode (defaults to config.DECODE_THREAD_MAX_ROWS)
+        """
+        if backend != "auto" and backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS + ('auto',)}")
+        self.backend = backend
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.chunk_size = chunk_size or config.DECODE_CHUNK_SIZE
+        self.serial_max_rows = serial_max_rows or config.DECODE_SERIAL_MAX_ROWS
+        self.thread_max_rows = thread_max_rows or config.DECODE_THREAD_MAX_ROWS
+        self._thread_pool = None
+        self._process_pool = None
+
+    def choose_backend(self, num_rows: int) -> str:
+        """Return the backend used for a table of num_rows rows."""
+        if self.backend != "auto":
+            return self.backend
+        if num_rows <= self.serial_max_rows or self.max_workers == 1:
+            return "serial"
+        if num_rows <= self.thread_max_rows:
+            return "thread"
+        return "process"
+
+    def _chunks(self, num_rows: int) -> List[tuple]:
+        return [(start, min(start + self.chunk_size, num_rows)) for start in range(0, num_rows, self.chunk_size)]
+
+    def map_batches(self, decode_batch: Callable, raw_logs: pa.Table | List) -> list:
+        """
+        Apply decode_batch to each chunk of a raw log table.
+
+        Args:
+            decode_batch: Batch decoder taking a raw log table; must be a module-level
+                function for the process backend
+            raw_logs: Raw log table or list of raw log entries
+
+        Returns:
+            List of decode_batch results, one per chunk, in row order
+        """
+        if not isinstance(raw_logs, pa.Table):
+            raw_logs = logs_to_table(raw_logs)
+        chunks = self._chunks(raw_logs.num_rows)
+        backend = self.choose_backend(raw_logs.num_rows)
+
+        if backend == "serial" or len(chunks) <= 1:
+            return [decode_batch(raw_logs.slice(start, stop - start)) for start, stop in chunks]
+
+        if backend == "thread":
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+            return list(self._thread_pool.map(
+                lambda bounds: decode_batch(raw_logs.slice(bounds[0], bounds[1] - bounds[0])), chunks))
+
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        fd, path = tempfile.mkstemp(suffix=".arrow", dir=_shared_memory_dir())
+        try:
+            with os.fdopen(fd, 'wb') as sink, pa.ipc.new_file(sink, raw_logs.schema) as writer:
+                writer.write_table(raw_logs)
+            futures = [
+                self._process_pool.submit(_decode_shared_chunk, path, start, stop, decode_batch)
+                for start, stop in chunks
+            ]
+            return [future.result() for future in futures]
+        finally:
+            os.remove(path)
+
+    def decode(self, decode_batch: Callable, raw_logs: pa.Table | List):
+        """
+        Decode a raw log table and concatenate the chunk results.
+
+        Args:
+            decode_batch: Batch decoder returning a DataFrame or a (decoded, errors) tuple
+            raw_logs: Raw log table or list of raw log entries
+
+        Returns:
+            A DataFrame, or a (decoded, errors) tuple of DataFrames, matching decode_batch
+        """
+        results = self.map_batches(decode_batch, raw_logs)
+        if not results:
+            empty = logs_to_table([])
+            return decode_batch(empty)
+        if isinstance(results[0], tuple):
+            return tuple(pd.concat(parts, ignore_index=True) for parts in zip(*results))
+        return pd.concat(results, ignore_index=True)
+
+    def close(self):
+        """Shut down the worker pools."""
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown()
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+_EXECUTORS = {}
+
+
+def get_decode_executor(backend: str = "auto", max_workers: Optional[int] = None) -> DecodeExecutor:
+    """
+    Return a shared DecodeExecutor, so its pools stay warm across calls.
+
+    Args:
+        backend: "serial", "thread", "process" or "auto"
+        max_workers: Number of threads or processes (defaults to CPU count)
+
+    Returns:
+        DecodeExecutor shared by every caller with the same arguments
+    """
+    key = (backend, max_workers)
+    if key not in _EXECUTORS:
+        _EXECUTORS[key] = DecodeExecutor(backend=backend, max_workers=max_workers)
+    return _EXECUTORS[key]
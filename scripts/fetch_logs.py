@@ -3,23 +3,29 @@
 Script to fetch logs from the Berachain blockchain and save them as raw logs.
 """
 import os
-import multiprocessing
-from typing import Optional, List, Dict, Tuple
+from contextlib import ExitStack
+from typing import Callable, Optional, List, Dict, Tuple
 import pandas as pd
-from tqdm.auto import tqdm
 
 from web3 import Web3
 
 import config
-from scripts.utils import setup_web3, get_logs, save_raw_logs, load_csv_data, load_raw_logs
-from scripts.process_validator_delegator import decode_validator_delegator_log, decode_all_validator_delegator_logs
-from scripts.process_user_rewards_vault import process_user_rewards_vault_logs
+from scripts.bloom import iter_prescanned_log_windows
+from scripts.checkpoints import CheckpointManifest
+from scripts.log_store import to_bytes
+from scripts.utils import (iter_log_windows, iter_sharded_log_windows, RawLogShardWriter,
+                           iter_raw_log_shards, load_csv_data, load_raw_logs, merge_raw_logs)
+from scripts.vault_registry import VaultRegistry, reward_vault_addresses
+from scripts.process_validator_delegator import (decode_validator_delegator_log, decode_all_validator_delegator_logs,
+                                                 decode_all_validator_delegator_logs_multiprocessing)
+from scripts.process_user_rewards_vault import decode_user_rewards_vault_batch, process_user_rewards_vault_logs
+from scripts.state import UserRewardsVaultState
+from scripts.state_history import UserRewardsVaultHistory
 
 
 def process_log(log: Dict) -> Dict:
     """
     Process a single log entry.
-    This function creates a new Web3 instance for each worker process.
     
     Args:
         log: Log entry to decode
@@ -27,38 +33,21 @@ def process_log(log: Dict) -> Dict:
     Returns:
         Decoded log entry
     """
-    # Create a new Web3 instance for each worker process
-    web3 = setup_web3()
-    return decode_validator_delegator_log(web3, log)
+    return decode_validator_delegator_log(log)
 
 
 def decode_logs_with_multiprocessing(logs: List[Dict], num_processes: int = None) -> pd.DataFrame:
     """
-    Decode logs using multiprocessing for improved performance.
+    Decode logs using the shared decode executor for improved performance.
     
     Args:
         logs: List of log entries to decode
-        num_processes: Number of processes to use (defaults to CPU count)
+        num_processes: Number of workers to use (defaults to CPU count)
         
     Returns:
-        DataFrame with decoded logs
+        DataFrame with decoded logs, in block order
     """
-    if num_processes is None:
-        num_processes = multiprocessing.cpu_count()
-    
-    print(f"Decoding {len(logs)} logs using {num_processes} processes...")
-    
-    # Use multiprocessing to decode logs
-    with multiprocessing.Pool(processes=num_processes) as pool:
-        # Use tqdm with imap_unordered for better performance
-        # imap_unordered processes results as they become available, regardless of input order
-        results = list(tqdm(
-            pool.imap_unordered(process_log, logs),
-            total=len(logs),
-            desc="Decoding logs"
-        ))
-    
-    return pd.DataFrame(results)
+    return decode_all_validator_delegator_logs_multiprocessing(logs, num_processes)
 
 
 def process_raw_logs_file(input_path: str, output_dir: str = None, num_processes: int = None):
@@ -103,9 +92,49 @@ def process_raw_logs_file(input_path: str, output_dir: str = None, num_processes
     return output_path
 
 
+def process_raw_log_shards(data_type: str, decode_function: Callable[[List[Dict]], pd.DataFrame],
+                           output_path: Optional[str] = None, from_block: int = 0,
+                           to_block: Optional[int] = None) -> str:
+    """
+    Decode the checkpointed raw logs of a data type shard by shard into a single CSV file.
+    
+    Each shard is decoded and appended to the CSV before the next one is loaded,
+    so peak memory is bounded by one shard whatever the length of the history.
+    
+    Args:
+        data_type: Type of data (validator_delegator, user_rewards_vault, berachef_weight_updates)
+        decode_function: Function decoding a list of raw logs into a DataFrame,
+            e.g. decode_all_validator_delegator_logs
+        output_path: CSV file to write (defaults to <processed data dir>/decoded_logs/logs_<from>_<to>_decoded.csv)
+        from_block: First block to decode
+        to_block: Last block to decode (defaults to the last saved block)
+        
+    Returns:
+        Path of the CSV file
+    """
+    if output_path is None:
+        output_dir = os.path.join(config.PROCESSED_DATA_DIR[data_type], "decoded_logs")
+        last_block = to_block if to_block is not None else CheckpointManifest(data_type).last_block()
+        output_path = os.path.join(output_dir, f"logs_{from_block:010d}_{last_block:010d}_decoded.csv")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    
+    num_decoded = 0
+    write_header = True
+    for logs in iter_raw_log_shards(data_type, from_block, to_block):
+        decoded_logs_df = decode_function(logs)
+        decoded_logs_df.to_csv(output_path, mode='w' if write_header else 'a', header=write_header, index=False)
+        write_header = False
+        num_decoded += len(decoded_logs_df)
+    
+    print(f"Saved {num_decoded} decoded logs to {output_path}")
+    return output_path
+
+
 def get_last_processed_block(data_type: str) -> int:
     """
-    Get the last processed block number from the latest data.
+    Get the last processed block number from the checkpoint manifest.
+    
+    Falls back to the latest processed CSV for data fetched before manifests existed.
     
     Args:
         data_type: Type of data (validator_delegator, user_rewards_vault, rewards_distribution)
@@ -113,6 +142,11 @@ def get_last_processed_block(data_type: str) -> int:
     Returns:
         Last processed block number, or 0 if no data is available
     """
+    if data_type in config.RAW_LOGS_DIR:
+        last_block = CheckpointManifest(data_type).last_block()
+        if last_block > 0:
+            return last_block
+
     # Load the latest data
     data = load_csv_data(data_type, is_latest=True)
     
@@ -131,25 +165,90 @@ def get_last_processed_block(data_type: str) -> int:
     return max_block
 
 
+def fetch_logs_with_checkpoints(web3: Web3, data_type: str, contract_address: str | List[str],
+                                event_signature: str | List[str], from_block: int = 0,
+                                to_block: Optional[int] = None, max_workers: Optional[int] = None,
+                                checkpoint_logs: Optional[int] = None,
+                                checkpoint_blocks: Optional[int] = None,
+                                bloom_prescan: Optional[bool] = None,
+                                address_shards: Optional[List[Tuple[List[str], int]]] = None) -> int:
+    """
+    Fetch the block ranges missing from a data type's checkpoint manifest.
+    
+    Logs are streamed into shards of checkpoint_logs logs or checkpoint_blocks
+    blocks, each recorded in the manifest once saved, so an interrupted backfill
+    resumes from its last shard instead of starting over.
+    
+    Args:
+        web3: Web3 instance
+        data_type: Type of data (validator_delegator, user_rewards_vault, berachef_weight_updates)
+        contract_address: Single contract address or list of contract addresses to filter logs
+        event_signature: Single event signature or list of event signatures to filter logs
+        from_block: Starting block number
+        to_block: Ending block number (defaults to latest block)
+        max_workers: Maximum concurrent eth_getLogs requests (defaults to config.RPC_MAX_CONCURRENCY)
+        checkpoint_logs: Logs per shard (defaults to config.CHECKPOINT_LOGS)
+        checkpoint_blocks: Blocks per shard (defaults to config.CHECKPOINT_BLOCKS)
+        bloom_prescan: Only call eth_getLogs on the ranges whose block headers' logsBloom may
+            hold a matching log (defaults to config.LOGS_BLOOM_PRESCAN)
+        address_shards: (contract addresses, first block) tuples scanned as separate
+            eth_getLogs filters instead of contract_address (see iter_sharded_log_windows)
+        
+    Returns:
+        Number of logs fetched
+    """
+    if to_block is None:
+        to_block = web3.eth.get_block("latest")["number"]
+    if checkpoint_logs is None:
+        checkpoint_logs = config.CHECKPOINT_LOGS
+    if checkpoint_blocks is None:
+        checkpoint_blocks = config.CHECKPOINT_BLOCKS
+    if bloom_prescan is None:
+        bloom_prescan = config.LOGS_BLOOM_PRESCAN
+    window_iterator = iter_prescanned_log_windows if bloom_prescan else iter_log_windows
+    
+    manifest = CheckpointManifest(data_type)
+    missing_ranges = manifest.missing_ranges(from_block, to_block)
+    if not missing_ranges:
+        print(f"Blocks {from_block} to {to_block} are already saved for {data_type}")
+        return 0
+    
+    total_logs = 0
+    for range_start, range_end in missing_ranges:
+        print(f"Fetching {data_type} logs from block {range_start} to {range_end}...")
+        # Shards are written as windows arrive, so memory stays bounded by one shard
+        with RawLogShardWriter(data_type, range_start, checkpoint_logs, checkpoint_blocks, manifest) as writer:
+            if address_shards is None:
+                windows = window_iterator(web3, contract_address, event_signature,
+                                          range_start, range_end, max_workers=max_workers)
+            else:
+                windows = iter_sharded_log_windows(web3, address_shards, event_signature, range_start, range_end,
+                                                   max_workers=max_workers, window_iterator=window_iterator)
+            for start, end, logs in windows:
+                writer.add_window(start, end, logs)
+        total_logs += writer.num_logs
+    
+    gaps = manifest.gaps()
+    if gaps:
+        print(f"Checkpoint manifest for {data_type} still has {len(gaps)} gaps: {gaps[:5]}")
+    return total_logs
+
+
 def fetch_validator_delegator_logs(web3: Web3, from_block: Optional[int] = None, 
                                   to_block: Optional[int] = None, 
-                                  timestamp: Optional[int] = None):
+                                  max_workers: Optional[int] = None):
     """
     Fetch validator-delegator delegation and undelegation logs and save them.
     
+    Only the block ranges missing from the validator_delegator checkpoint manifest are fetched.
+    
     Args:
         web3: Web3 instance
-        from_block: Starting block number (defaults to last processed block + 1 or 0)
+        from_block: Starting block number (defaults to 0, already saved ranges are skipped)
         to_block: Ending block number (defaults to latest block)
-        timestamp: Unix timestamp for the log file (defaults to current time)
+        max_workers: Maximum concurrent eth_getLogs requests (defaults to config.RPC_MAX_CONCURRENCY)
     """
-    # If from_block is not provided, use the last processed block + 1
-    if from_block is None:
-        last_block = get_last_processed_block("validator_delegator")
-        from_block = last_block + 1 if last_block > 0 else 0
-        print(f"Using last processed block + 1 as from_block: {from_block}")
-    
-    print(f"Fetching validator-delegator logs from block {from_block} to {to_block or 'latest'}...")
+    print(f"Fetching validator-delegator logs from block {from_block or 0} to {to_block or 'latest'}...")
     
     # Get both Delegation and Undelegation event signatures
     event_signatures = [
@@ -157,39 +256,139 @@ def fetch_validator_delegator_logs(web3: Web3, from_block: Optional[int] = None,
         config.BGT_TOKEN.event_signatures["Undelegation"]
     ]
     
-    logs = get_logs(
+    num_logs = fetch_logs_with_checkpoints(
         web3=web3,
+        data_type="validator_delegator",
         contract_address=config.BGT_TOKEN.address,
         event_signature=event_signatures,
-        from_block=from_block,
-        to_block=to_block
+        from_block=from_block or 0,
+        to_block=to_block,
+        max_workers=max_workers
     )
     
-    print(f"Found {len(logs)} validator-delegator logs")
+    print(f"Found {num_logs} validator-delegator logs")
+
+
+def discover_reward_vaults(web3: Web3, to_block: Optional[int] = None,
+                           max_workers: Optional[int] = None) -> VaultRegistry:
+    """
+    Fetch the reward vault factory's VaultCreated logs and add the new vaults to the vault registry.
+    
+    Vaults created before the last saved block of the user-rewards vault logs are
+    marked for backfill (see backfill_reward_vaults).
+    
+    Args:
+        web3: Web3 instance
+        to_block: Ending block number (defaults to latest block)
+        max_workers: Maximum concurrent eth_getLogs requests (defaults to config.RPC_MAX_CONCURRENCY)
+        
+    Returns:
+        The updated VaultRegistry
+    """
+    fetch_logs_with_checkpoints(
+        web3=web3,
+        data_type="reward_vault_factory",
+        contract_address=config.REWARD_VAULT_FACTORY.address,
+        event_signature=config.REWARD_VAULT_FACTORY.event_signatures["VaultCreated"],
+        from_block=0,
+        to_block=to_block,
+        max_workers=max_workers
+    )
     
-    if logs:
-        save_raw_logs(logs, "validator_delegator", timestamp.replace(" ", "_"))
+    covered_ranges = CheckpointManifest("user_rewards_vault").covered_ranges()
+    registry = VaultRegistry()
+    num_added = registry.update_from_raw_logs(covered_to=covered_ranges[-1][1] if covered_ranges else 0)
+    registry.save()
+    print(f"Vault registry holds {len(registry)} reward vaults ({num_added} new)")
+    return registry
+
+
+def backfill_reward_vaults(web3: Web3, registry: VaultRegistry, event_signatures: List[str],
+                           max_workers: Optional[int] = None) -> int:
+    """
+    Fetch the logs of newly discovered vaults over the blocks already saved without them.
+    
+    Each saved user_rewards_vault shard overlapping a vault's backfill range is
+    fetched for those vaults and rewritten with their logs merged in block order
+    (see merge_raw_logs), and the vaults' progress is recorded in the registry
+    after each shard, so an interrupted backfill resumes where it stopped. The saved
+    user-rewards vault state and history are then rebuilt from the merged logs.
+    
+    Args:
+        web3: Web3 instance
+        registry: Vault registry with the vaults to backfill
+        event_signatures: Event signatures to filter logs
+        max_workers: Maximum concurrent eth_getLogs requests (defaults to config.RPC_MAX_CONCURRENCY)
+        
+    Returns:
+        Number of logs added
+    """
+    if not registry.has_backfills():
+        return 0
+    
+    # States may include blocks backfilled by a previous interrupted run, so they are
+    # rebuilt from the creation of the first vault of the backfill
+    rebuild_from = int(registry.vaults.loc[registry.vaults.backfill_to >= 0, "creation_block"].min())
+    pending = registry.pending_backfills()
+    total_logs = 0
+    if len(pending):
+        print(f"Backfilling {len(pending)} new reward vaults from block {int(pending.backfill_from.min())} "
+              f"to {int(pending.backfill_to.max())}...")
+        manifest = CheckpointManifest("user_rewards_vault")
+        for entry in manifest.valid_entries():
+            vaults = pending.loc[(pending.backfill_from <= entry["to_block"]) &
+                                 (pending.backfill_to >= entry["from_block"])]
+            if vaults.empty:
+                continue
+            start = max(entry["from_block"], int(vaults.backfill_from.min()))
+            end = min(entry["to_block"], int(vaults.backfill_to.max()))
+            shards = registry.plan_shards(start, end, vaults=vaults.assign(creation_block=vaults.backfill_from))
+            logs = [log for _, _, window_logs in iter_sharded_log_windows(web3, shards, event_signatures, start, end,
+                                                                          max_workers=max_workers)
+                    for log in window_logs]
+            total_logs += merge_raw_logs("user_rewards_vault", logs, manifest)
+            registry.mark_backfilled(vaults.vault_address.tolist(), entry["to_block"])
+            registry.save()
+        # Blocks no shard covers yet are fetched later with every vault
+        registry.mark_backfilled(pending.vault_address.tolist(), int(pending.backfill_to.max()))
+        registry.save()
+    
+    urv_state = UserRewardsVaultState()
+    if urv_state.last_block >= rebuild_from:
+        applied = urv_state.rebuild("user_rewards_vault", decode_user_rewards_vault_batch)
+        print(f"Rebuilt the user-rewards vault state from {applied} logs up to block {urv_state.last_block}")
+    urv_history = UserRewardsVaultHistory()
+    if urv_history.last_block >= rebuild_from:
+        history_to_block = urv_history.last_block
+        urv_history.rollback(rebuild_from - 1)
+        urv_history.update(history_to_block)
+        print(f"Rebuilt the user-rewards vault history from block {rebuild_from} to {urv_history.last_block}")
+    registry.finish_backfills()
+    registry.save()
+    
+    print(f"Backfilled {total_logs} user-rewards vault logs")
+    return total_logs
 
 
 def fetch_user_rewards_vault_logs(web3: Web3, from_block: Optional[int] = None, 
                                  to_block: Optional[int] = None, 
-                                 timestamp: Optional[int] = None):
+                                 max_workers: Optional[int] = None):
     """
     Fetch user-rewards vault staking and withdrawal logs from all reward vaults and save them.
     
+    Reward vaults are discovered from the reward vault factory (see
+    discover_reward_vaults) and fetched in groups of config.LOGS_MAX_ADDRESSES
+    addresses, each group starting at the creation block of its oldest vault.
+    Vaults discovered after their blocks were saved are backfilled first. Only the
+    block ranges missing from the user_rewards_vault checkpoint manifest are fetched.
+    
     Args:
         web3: Web3 instance
-        from_block: Starting block number (defaults to last processed block + 1 or 0)
+        from_block: Starting block number (defaults to 0, already saved ranges are skipped)
         to_block: Ending block number (defaults to latest block)
-        timestamp: Unix timestamp for the log file (defaults to current time)
+        max_workers: Maximum concurrent eth_getLogs requests (defaults to config.RPC_MAX_CONCURRENCY)
     """
-    # If from_block is not provided, use the last processed block + 1
-    if from_block is None:
-        last_block = get_last_processed_block("user_rewards_vault")
-        from_block = last_block + 1 if last_block > 0 else 0
-        print(f"Using last processed block + 1 as from_block: {from_block}")
-    
-    print(f"Fetching user-rewards vault logs from block {from_block} to {to_block or 'latest'}...")
+    print(f"Fetching user-rewards vault logs from block {from_block or 0} to {to_block or 'latest'}...")
     
     # Get both Staked and Withdrawn event signatures
     event_signatures = [
@@ -204,65 +403,254 @@ def fetch_user_rewards_vault_logs(web3: Web3, from_block: Optional[int] = None,
         print("No reward vault event signatures set. Skipping.")
         return
     
-    # Get all reward vault addresses from the dictionary
-    reward_vault_addresses = list(config.REWARD_VAULT_DIC.values())
+    if to_block is None:
+        to_block = web3.eth.get_block("latest")["number"]
+    registry = discover_reward_vaults(web3, to_block, max_workers)
+    backfill_reward_vaults(web3, registry, event_signatures, max_workers)
     
-    if not reward_vault_addresses:
-        print("No reward vault addresses found in config.REWARD_VAULT_DIC. Skipping.")
+    if not len(registry):
+        print("No reward vaults found in the vault registry or config.REWARD_VAULT_DIC. Skipping.")
         return
     
-    print(f"Querying logs for {len(reward_vault_addresses)} reward vaults: {', '.join(reward_vault_addresses)}")
+    address_shards = registry.plan_shards(from_block or 0, to_block)
+    print(f"Querying logs for {len(registry)} reward vaults in {len(address_shards)} address groups")
     
-    # Query logs for all reward vault addresses at once
-    logs = get_logs(
+    num_logs = fetch_logs_with_checkpoints(
         web3=web3,
-        contract_address=reward_vault_addresses,  # Pass the list of addresses
+        data_type="user_rewards_vault",
+        contract_address=registry.addresses(),
         event_signature=event_signatures,
-        from_block=from_block,
-        to_block=to_block
+        from_block=from_block or 0,
+        to_block=to_block,
+        max_workers=max_workers,
+        address_shards=address_shards
     )
     
-    print(f"Found {len(logs)} user-rewards vault logs across all reward vaults")
-    
-    if logs:
-        save_raw_logs(logs, "user_rewards_vault", timestamp.replace(" ", "_"))
+    print(f"Found {num_logs} user-rewards vault logs across all reward vaults")
 
 
 def fetch_berachef_weight_update_logs(web3: Web3, from_block: Optional[int] = None, 
                                      to_block: Optional[int] = None, 
-                                     timestamp: Optional[str] = None):
+                                     max_workers: Optional[int] = None):
     """
     Fetch BeraChef validator weight update logs and save them.
     
+    Only the block ranges missing from the berachef_weight_updates checkpoint manifest are fetched.
+    
     Args:
         web3: Web3 instance
-        from_block: Starting block number (defaults to last processed block + 1 or 0)
+        from_block: Starting block number (defaults to 0, already saved ranges are skipped)
         to_block: Ending block number (defaults to latest block)
-        timestamp: Timestamp string for the log file (defaults to current time)
+        max_workers: Maximum concurrent eth_getLogs requests (defaults to config.RPC_MAX_CONCURRENCY)
     """
-    # If from_block is not provided, use the last processed block + 1
-    if from_block is None:
-        last_block = get_last_processed_block("berachef_weight_updates")
-        from_block = last_block + 1 if last_block > 0 else 0
-        print(f"Using last processed block + 1 as from_block: {from_block}")
-    
-    print(f"Fetching BeraChef weight update logs from block {from_block} to {to_block or 'latest'}...")
+    print(f"Fetching BeraChef weight update logs from block {from_block or 0} to {to_block or 'latest'}...")
 
     # Get the ActivateRewardAllocation event signature
     event_signature = config.BERACHEF.event_signatures["ActivateRewardAllocation"]
 
-    logs = get_logs(
+    num_logs = fetch_logs_with_checkpoints(
         web3=web3,
+        data_type="berachef_weight_updates",
         contract_address=config.BERACHEF.address,
         event_signature=event_signature,
-        from_block=from_block,
-        to_block=to_block
+        from_block=from_block or 0,
+        to_block=to_block,
+        max_workers=max_workers
     )
     
-    print(f"Found {len(logs)} BeraChef weight update logs")
+    print(f"Found {num_logs} BeraChef weight update logs")
+
+
+def ingest_streams() -> Dict[str, Tuple[List[str], List[str]]]:
+    """
+    Return the contracts and events of each data type fetched by the combined scan.
+    
+    Returns:
+        Dictionary mapping each data type to its (contract addresses, event signatures)
+    """
+    reward_vault_signatures = [config.REWARDS_VAULT.event_signatures.get("Staked"),
+                               config.REWARDS_VAULT.event_signatures.get("Withdrawn")]
+    return {
+        "validator_delegator": (
+            [config.BGT_TOKEN.address],
+            [config.BGT_TOKEN.event_signatures["Delegation"], config.BGT_TOKEN.event_signatures["Undelegation"]],
+        ),
+        "user_rewards_vault": (
+            reward_vault_addresses(),
+            [sig for sig in reward_vault_signatures if sig],
+        ),
+        "reward_vault_factory": (
+            [config.REWARD_VAULT_FACTORY.address],
+            [config.REWARD_VAULT_FACTORY.event_signatures["VaultCreated"]],
+        ),
+        "berachef_weight_updates": (
+            [config.BERACHEF.address],
+            [config.BERACHEF.event_signatures["ActivateRewardAllocation"]],
+        ),
+        "rewards_distribution": (
+            [config.DISTRIBUTOR.address],
+            [config.DISTRIBUTOR.event_signatures["Distributed"]],
+        ),
+    }
+
+
+def demultiplex_logs(logs: List[Dict], streams: Dict[str, Tuple[List[str], List[str]]]) -> Dict[str, List[Dict]]:
+    """
+    Split the logs of a combined scan by data type.
+    
+    A log belongs to the data type whose contracts include its address and whose
+    events include its topic0. Logs matching no data type, which the union filter
+    can return for address/event pairs no data type asked for, are dropped.
+    
+    Args:
+        logs: Logs fetched with the union of the streams' addresses and event signatures
+        streams: Dictionary mapping data types to their (contract addresses, event signatures)
+        
+    Returns:
+        Dictionary mapping every data type of streams to its logs, in block order
+    """
+    routes = {}
+    for data_type, (addresses, signatures) in streams.items():
+        for address in addresses:
+            for signature in signatures:
+                routes[(to_bytes(address.lower()), to_bytes(signature.lower()))] = data_type
+    
+    demultiplexed = {data_type: [] for data_type in streams}
+    for log in logs:
+        if not log["topics"]:
+            continue
+        data_type = routes.get((to_bytes(log["address"].lower()), to_bytes(log["topics"][0])))
+        if data_type is not None:
+            demultiplexed[data_type].append(log)
+    return demultiplexed
+
+
+def plan_combined_shards(streams: Dict[str, Tuple[List[str], List[str]]], registry: Optional[VaultRegistry],
+                         from_block: int, to_block: int) -> List[Tuple[List[str], int]]:
+    """
+    Split the contracts of a combined scan into address groups for eth_getLogs.
+    
+    The reward vaults of the user_rewards_vault stream are grouped by the vault
+    registry (see VaultRegistry.plan_shards), so each group holds at most
+    config.LOGS_MAX_ADDRESSES vaults and starts at the creation block of its oldest
+    vault. The contracts of the other streams form one more group scanned from from_block.
+    
+    Args:
+        streams: Dictionary mapping data types to their (contract addresses, event signatures)
+        registry: Vault registry of the user_rewards_vault stream (its addresses are
+            grouped with the other streams' if None)
+        from_block: First block of the scan
+        to_block: Last block of the scan
+        
+    Returns:
+        List of (contract addresses, first block) tuples (see iter_sharded_log_windows)
+    """
+    sharded = registry is not None and "user_rewards_vault" in streams
+    addresses = sorted({address for data_type, (addresses, _) in streams.items()
+                        if not (sharded and data_type == "user_rewards_vault") for address in addresses})
+    shards = [(addresses, from_block)] if addresses else []
+    if sharded:
+        shards.extend(registry.plan_shards(from_block, to_block))
+    return shards
+
+
+def plan_combined_scan(missing_ranges: Dict[str, List[Tuple[int, int]]]) -> List[Tuple[int, int, List[str]]]:
+    """
+    Split the missing ranges of several data types into segments missing for the same data types.
+    
+    Args:
+        missing_ranges: Dictionary mapping data types to their missing (from_block, to_block) tuples
+        
+    Returns:
+        Sorted list of (from_block, to_block, data types) tuples, adjacent segments
+        missing for the same data types merged
+    """
+    boundaries = sorted({block for ranges in missing_ranges.values()
+                         for start, end in ranges for block in (start, end + 1)})
+    segments = []
+    for start, next_start in zip(boundaries, boundaries[1:]):
+        data_types = [data_type for data_type, ranges in missing_ranges.items()
+                      if any(range_start <= start and next_start - 1 <= range_end for range_start, range_end in ranges)]
+        if not data_types:
+            continue
+        if segments and segments[-1][1] == start - 1 and segments[-1][2] == data_types:
+            segments[-1] = (segments[-1][0], next_start - 1, data_types)
+        else:
+            segments.append((start, next_start - 1, data_types))
+    return segments
+
+
+def fetch_all_logs(web3: Web3, from_block: Optional[int] = None, to_block: Optional[int] = None,
+                   data_types: Optional[List[str]] = None, max_workers: Optional[int] = None,
+                   checkpoint_logs: Optional[int] = None, checkpoint_blocks: Optional[int] = None,
+                   bloom_prescan: Optional[bool] = None) -> Dict[str, int]:
+    """
+    Fetch the validator-delegator, user-rewards vault, reward vault factory, BeraChef and Distributor logs in a single scan.
+    
+    Each window is fetched with eth_getLogs calls filtering on the union of the data
+    types' events, one per address group of plan_combined_shards, and its logs are
+    demultiplexed into each data type's shards and checkpoint manifest. A block range
+    already saved for some data types is only scanned for the others, so data types
+    fetched separately before stay consistent. When user-rewards vault logs are
+    fetched, new reward vaults are discovered and backfilled first (see
+    discover_reward_vaults and backfill_reward_vaults).
     
-    if logs:
-        if timestamp is None:
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
-        save_raw_logs(logs, "berachef_weight_updates", timestamp.replace(" ", "_"))
-        
\ No newline at end of file
+    Args:
+        web3: Web3 instance
+        from_block: Starting block number (defaults to 0, already saved ranges are skipped)
+        to_block: Ending block number (defaults to latest block)
+        data_types: Data types to fetch (defaults to every data type of ingest_streams)
+        max_workers: Maximum concurrent eth_getLogs requests (defaults to config.RPC_MAX_CONCURRENCY)
+        checkpoint_logs: Logs per shard (defaults to config.CHECKPOINT_LOGS)
+        checkpoint_blocks: Blocks per shard (defaults to config.CHECKPOINT_BLOCKS)
+        bloom_prescan: Only call eth_getLogs on the ranges whose block headers' logsBloom may
+            hold a matching log (defaults to config.LOGS_BLOOM_PRESCAN)
+        
+    Returns:
+        Dictionary mapping each data type to the number of logs fetched
+    """
+    streams = ingest_streams()
+    if data_types is not None:
+        streams = {data_type: streams[data_type] for data_type in data_types}
+    if to_block is None:
+        to_block = web3.eth.get_block("latest")["number"]
+    from_block = from_block or 0
+    registry = None
+    if "user_rewards_vault" in streams and streams["user_rewards_vault"][1]:
+        event_signatures = streams["user_rewards_vault"][1]
+        registry = discover_reward_vaults(web3, to_block, max_workers)
+        backfill_reward_vaults(web3, registry, event_signatures, max_workers)
+        streams["user_rewards_vault"] = (registry.addresses(), event_signatures)
+    streams = {data_type: stream for data_type, stream in streams.items() if stream[0] and stream[1]}
+    if bloom_prescan is None:
+        bloom_prescan = config.LOGS_BLOOM_PRESCAN
+    window_iterator = iter_prescanned_log_windows if bloom_prescan else iter_log_windows
+    
+    manifests = {data_type: CheckpointManifest(data_type) for data_type in streams}
+    segments = plan_combined_scan({data_type: manifest.missing_ranges(from_block, to_block)
+                                   for data_type, manifest in manifests.items()})
+    num_logs = {data_type: 0 for data_type in streams}
+    if not segments:
+        print(f"Blocks {from_block} to {to_block} are already saved for {', '.join(streams)}")
+        return num_logs
+    
+    for segment_start, segment_end, data_types in segments:
+        segment_streams = {data_type: streams[data_type] for data_type in data_types}
+        address_shards = plan_combined_shards(segment_streams, registry, segment_start, segment_end)
+        signatures = sorted({signature for _, signatures in segment_streams.values() for signature in signatures})
+        print(f"Fetching {', '.join(data_types)} logs from block {segment_start} to {segment_end} in one scan...")
+        with ExitStack() as stack:
+            writers = {data_type: stack.enter_context(RawLogShardWriter(data_type, segment_start, checkpoint_logs,
+                                                                        checkpoint_blocks, manifests[data_type]))
+                       for data_type in data_types}
+            windows = iter_sharded_log_windows(web3, address_shards, signatures, segment_start, segment_end,
+                                               max_workers=max_workers, window_iterator=window_iterator)
+            for start, end, logs in windows:
+                for data_type, data_type_logs in demultiplex_logs(logs, segment_streams).items():
+                    writers[data_type].add_window(start, end, data_type_logs)
+        for data_type, writer in writers.items():
+            num_logs[data_type] += writer.num_logs
+    
+    for data_type, count in num_logs.items():
+        print(f"Found {count} {data_type} logs")
+    return num_logs
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Follow the chain head, keeping the raw logs and position states current within seconds.
+
+Each poll fetches the logs of the blocks that reached the confirmation depth in
+one combined eth_getLogs scan (see fetch_all_logs), adds the reward vaults
+created in them to the vault registry, demultiplexes them into the per-data-type
+shard writers, applies them to the position states and pushes the update to the
+subscribers. The hashes of recently followed blocks are compared
+with the node's on every poll: when they differ, the raw logs and states are
+rolled back to the last block both agree on and the new branch is fetched.
+"""
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+from web3 import Web3
+from web3.exceptions import BlockNotFound
+
+import config
+from scripts.checkpoints import CheckpointManifest
+from scripts.fetch_logs import demultiplex_logs, fetch_all_logs, ingest_streams, plan_combined_shards
+from scripts.log_store import logs_to_table
+from scripts.process_user_rewards_vault import decode_user_rewards_vault_batch
+from scripts.process_validator_delegator import decode_validator_delegator_batch
+from scripts.state import IncrementalPositionStore, UserRewardsVaultState, ValidatorDelegatorState
+from scripts.state_history import StateHistory, UserRewardsVaultHistory, ValidatorDelegatorHistory
+from scripts.utils import (RawLogShardWriter, fetch_log_window, iter_sharded_log_windows, load_raw_log_table,
+                           truncate_raw_logs)
+from scripts.vault_registry import VaultRegistry, decode_vault_creations
+
+
+# Batch decoders of the data types position states are kept for
+STATE_DECODERS = {
+    "validator_delegator": decode_validator_delegator_batch,
+    "user_rewards_vault": decode_user_rewards_vault_batch,
+}
+
+
+def default_states() -> Dict[str, List]:
+    """Return the saved incremental states and histories of the validator-delegator and user-rewards vault positions."""
+    return {
+        "validator_delegator": [ValidatorDelegatorState(), ValidatorDelegatorHistory()],
+        "user_rewards_vault": [UserRewardsVaultState(), UserRewardsVaultHistory()],
+    }
+
+
+def decode_logs(data_type: str, raw_logs: pa.Table | List[Dict]) -> pd.DataFrame:
+    """Decode raw logs with the batch decoder of a data type."""
+    result = STATE_DECODERS[data_type](raw_logs)
+    return result[0] if isinstance(result, tuple) else result
+
+
+class LogFollower:
+    """
+    Long-running follower of new blocks with reorg detection and rollback.
+
+    Raw logs are buffered in one RawLogShardWriter per data type and flushed every
+    flush_seconds or when a shard is full; the incremental states are saved at the
+    same time, so the saved states never get ahead of the saved raw logs they can
+    be rolled back from. Histories write their deltas as they are extended.
+    """
+
+    def __init__(self, web3: Web3, data_types: Optional[List[str]] = None, states: Optional[Dict[str, List]] = None,
+                 confirmations: Optional[int] = None, poll_interval: Optional[float] = None,
+                 reorg_window: Optional[int] = None, flush_seconds: Optional[float] = None,
+                 hashes_path: Optional[str] = None, max_workers: Optional[int] = None):
+        """
+        Args:
+            web3: Web3 instance
+            data_types: Data types to follow (defaults to every data type of ingest_streams)
+            states: Position stores to keep current by data type, IncrementalPositionStore or
+                StateHistory instances (defaults to default_states())
+            confirmations: Blocks kept behind the head (defaults to config.FOLLOW_CONFIRMATIONS)
+            poll_interval: Seconds between polls (defaults to config.FOLLOW_POLL_INTERVAL)
+            reorg_window: Blocks of hashes kept to find the fork point of a reorg
+                (defaults to config.FOLLOW_REORG_WINDOW)
+            flush_seconds: Seconds between raw log shard flushes (defaults to config.FOLLOW_FLUSH_SECONDS)
+            hashes_path: JSON file of the followed block hashes (defaults to config.FOLLOW_BLOCK_HASHES_FILE)
+            max_workers: Maximum concurrent eth_getLogs requests when catching up
+                (defaults to config.RPC_MAX_CONCURRENCY)
+        """
+        self.web3 = web3
+        streams = ingest_streams()
+        if data_types is not None:
+            streams = {data_type: streams[data_type] for data_type in data_types}
+        self.streams = {data_type: stream for data_type, stream in streams.items() if stream[0] and stream[1]}
+        self.states = default_states() if states is None else states
+        self.states = {data_type: stores for data_type, stores in self.states.items() if data_type in self.streams}
+        self.confirmations = config.FOLLOW_CONFIRMATIONS if confirmations is None else confirmations
+        self.poll_interval = poll_interval or config.FOLLOW_POLL_INTERVAL
+        self.reorg_window = reorg_window or config.FOLLOW_REORG_WINDOW
+        self.flush_seconds = config.FOLLOW_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.hashes_path = hashes_path or config.FOLLOW_BLOCK_HASHES_FILE
+        self.max_workers = max_workers
+        self.registry = None
+        self.signatures = sorted({signature for _, signatures in self.streams.values() for signature in signatures})
+        self.subscribers = []
+        self.writers = {}
+        self.block_hashes = {}
+        self.cursor = None
+        self.flushed_at = time.monotonic()
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        """
+        Register a callback receiving every update.
+
+        Updates are dictionaries with a "type" of "logs" (from_block, to_block, logs by
+        data type, decoded logs by data type and the states) or "reorg" (fork_block, the
+        last block kept, and the states after the rollback).
+        """
+        self.subscribers.append(callback)
+
+    def _notify(self, update: Dict):
+        for callback in self.subscribers:
+            try:
+                callback(update)
+            except Exception as e:
+                print(f"Error in follow subscriber {getattr(callback, '__name__', callback)}: {e}")
+
+    def _load_hashes(self):
+        if os.path.exists(self.hashes_path):
+            with open(self.hashes_path, 'r') as f:
+                self.block_hashes = {int(block): block_hash for block, block_hash in json.load(f).items()}
+
+    def _save_hashes(self):
+        os.makedirs(os.path.dirname(self.hashes_path) or ".", exist_ok=True)
+        tmp_filename = self.hashes_path + ".tmp"
+        with open(tmp_filename, 'w') as f:
+            json.dump({str(block): block_hash for block, block_hash in sorted(self.block_hashes.items())}, f)
+        os.replace(tmp_filename, self.hashes_path)
+
+    def _block_hash(self, block: int) -> Optional[str]:
+        try:
+            return Web3.to_hex(self.web3.eth.get_block(block)["hash"])
+        except BlockNotFound:
+            return None
+
+    def find_fork(self) -> Optional[int]:
+        """
+        Compare the stored block hashes with the node's.
+
+        Returns:
+            None if the last followed block is still canonical, otherwise the last
+            stored block that is
+
+        Raises:
+            RuntimeError: If no stored block is canonical any more
+        """
+        blocks = sorted(self.block_hashes, reverse=True)
+        if not blocks or self._block_hash(blocks[0]) == self.block_hashes[blocks[0]]:
+            return None
+        for block in blocks[1:]:
+            if self._block_hash(block) == self.block_hashes[block]:
+                return block
+        raise RuntimeError(f"Reorg deeper than the {len(blocks)} stored block hashes, "
+                           f"roll back with truncate_raw_logs and rebuild the states")
+
+    def _open_writers(self, from_block: int):
+        for data_type in self.streams:
+            self.writers[data_type] = RawLogShardWriter(data_type, from_block)
+
+    def start(self, from_block: int = 0):
+        """
+        Resume from the saved raw logs: roll back a reorg that happened while stopped,
+        fetch the ranges some data types are missing and bring the states up to date.
+
+        Args:
+            from_block: First block to follow from if nothing was saved yet
+        """
+        self._load_hashes()
+        manifests = [CheckpointManifest(data_type) for data_type in self.streams]
+        last_blocks = [manifest.last_block() if manifest.covered_ranges() else from_block - 1 for manifest in manifests]
+        self.cursor = max(max(last_blocks), from_block - 1)
+        # Hashes of blocks whose raw logs were not flushed before stopping are refetched anyway
+        self.block_hashes = {block: h for block, h in self.block_hashes.items() if block <= self.cursor}
+        # Histories are extended on every poll, so they can be ahead of the raw logs saved before stopping
+        for stores in self.states.values():
+            for store in stores:
+                if isinstance(store, StateHistory):
+                    store.rollback(self.cursor)
+
+        fork_block = self.find_fork()
+        if fork_block is not None:
+            self.rollback(fork_block)
+        # Also discovers the reward vaults created while stopped and backfills them
+        fetch_all_logs(self.web3, from_block, self.cursor, list(self.streams), self.max_workers)
+        if "user_rewards_vault" in self.streams:
+            self.registry = VaultRegistry()
+            self.streams["user_rewards_vault"] = (self.registry.addresses(), self.streams["user_rewards_vault"][1])
+
+        for data_type, stores in self.states.items():
+            for store in stores:
+                # A backfill rebuilds the saved states
+                store.load()
+                store.update_from_raw_logs(data_type, STATE_DECODERS[data_type], self.cursor)
+                if isinstance(store, IncrementalPositionStore):
+                    store.save()
+        self._open_writers(self.cursor + 1)
+        if self.cursor >= 0 and self.cursor not in self.block_hashes:
+            self.block_hashes[self.cursor] = self._block_hash(self.cursor)
+        print(f"Following {', '.join(self.streams)} from block {self.cursor + 1}")
+
+    def rollback(self, fork_block: int):
+        """
+        Undo the blocks after fork_block in the raw logs, the states and the stored hashes.
+
+        Args:
+            fork_block: Last block to keep
+        """
+        print(f"Reorg detected: rolling back to block {fork_block}")
+        for data_type in self.streams:
+            writer = self.writers.get(data_type)
+            table = load_raw_log_table(data_type, from_block=fork_block + 1)
+            buffered = [log for log in writer.buffer if log["blockNumber"] > fork_block] if writer else []
+            if buffered:
+                table = pa.concat_tables([table, logs_to_table(buffered).select(table.column_names)])
+            for store in self.states.get(data_type, []):
+                if isinstance(store, StateHistory):
+                    store.rollback(fork_block)
+                else:
+                    store.rollback(fork_block, decode_logs(data_type, table))
+
+            if writer is None or writer.shard_start > fork_block:
+                truncate_raw_logs(data_type, fork_block, writer.manifest if writer else None)
+                if writer is not None:
+                    writer.shard_start, writer.shard_end, writer.buffer = fork_block + 1, None, []
+            else:
+                writer.buffer = [log for log in writer.buffer if log["blockNumber"] <= fork_block]
+                writer.shard_end = fork_block
+
+        self.block_hashes = {block: h for block, h in self.block_hashes.items() if block <= fork_block}
+        self.cursor = fork_block
+        self.flush()
+        self._notify({"type": "reorg", "fork_block": fork_block, "states": self.states})
+
+    def _fetch(self, from_block: int, to_block: int):
+        """Fetch the logs of a block range, in a single call per address group when it fits in one window."""
+        address_shards = plan_combined_shards(self.streams, self.registry, from_block, to_block)
+        if to_block - from_block + 1 <= config.LOGS_BATCH_SIZE:
+            try:
+                logs = [log for addresses, start in address_shards
+                        for log in fetch_log_window(self.web3, addresses, self.signatures, start, to_block)]
+                yield from_block, to_block, sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"]))
+                return
+            except Exception as e:
+                print(f"Error fetching logs from {from_block} to {to_block}, scanning in windows: {e}")
+        yield from iter_sharded_log_windows(self.web3, address_shards, self.signatures, from_block, to_block,
+                                            max_workers=self.max_workers)
+
+    def _add_new_vaults(self, windows: List[Tuple[int, int, List[Dict]]],
+                        to_block: int) -> List[Tuple[int, int, List[Dict]]]:
+        """
+        Add the reward vaults created in the fetched windows to the vault registry and the
+        user_rewards_vault stream, and merge their logs up to to_block into the windows.
+        """
+        if self.registry is None or "reward_vault_factory" not in self.streams:
+            return windows
+        factory_stream = {"reward_vault_factory": self.streams["reward_vault_factory"]}
+        factory_logs = [log for _, _, logs in windows
+                        for log in demultiplex_logs(logs, factory_stream)["reward_vault_factory"]]
+        if not factory_logs:
+            return windows
+        known = set(self.registry.addresses())
+        # Vaults are created after the cursor, so their earlier blocks need no backfill
+        if not self.registry.update(decode_vault_creations(factory_logs), covered_to=self.cursor):
+            return windows
+        new_vaults = self.registry.vaults.loc[~self.registry.vaults.vault_address.isin(known)]
+        signatures = self.streams["user_rewards_vault"][1]
+        self.streams["user_rewards_vault"] = (self.registry.addresses(), signatures)
+        print(f"Following {len(new_vaults)} new reward vaults")
+
+        from_block = int(new_vaults.creation_block.min())
+        address_shards = self.registry.plan_shards(from_block, to_block, vaults=new_vaults)
+        new_logs = [log for _, _, logs in iter_sharded_log_windows(self.web3, address_shards, signatures, from_block,
+                                                                   to_block, max_workers=self.max_workers)
+                    for log in logs]
+        merged = []
+        for start, end, logs in windows:
+            logs = logs + [log for log in new_logs if start <= log["blockNumber"] <= end]
+            merged.append((start, end, sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"]))))
+        return merged
+
+    def poll(self) -> Optional[Dict]:
+        """
+        Fetch and apply the blocks that reached the confirmation depth since the last poll.
+
+        Returns:
+            The update pushed to the subscribers, or None if there was no new block
+        """
+        fork_block = self.find_fork()
+        if fork_block is not None:
+            self.rollback(fork_block)
+
+        target = self.web3.eth.block_number - self.confirmations
+        if target <= self.cursor:
+            return None
+        target_hash = self._block_hash(target)
+
+        from_block = self.cursor + 1
+        logs_by_type = {data_type: [] for data_type in self.streams}
+        windows = self._add_new_vaults(list(self._fetch(from_block, target)), target)
+        for _, _, logs in windows:
+            for log in logs:
+                self.block_hashes[log["blockNumber"]] = Web3.to_hex(log["blockHash"])
+        if self._block_hash(target) != target_hash:
+            # The range was reorganized while being fetched: fetch it again on the next poll
+            self.block_hashes = {block: h for block, h in self.block_hashes.items() if block <= self.cursor}
+            return None
+
+        for start, end, logs in windows:
+            for data_type, data_type_logs in demultiplex_logs(logs, self.streams).items():
+                self.writers[data_type].add_window(start, end, data_type_logs)
+                logs_by_type[data_type].extend(data_type_logs)
+        decoded = {}
+        for data_type, stores in self.states.items():
+            decoded[data_type] = decode_logs(data_type, logs_by_type[data_type])
+            for store in stores:
+                if isinstance(store, StateHistory):
+                    store.extend(decoded[data_type], through_block=target)
+                else:
+                    store.apply(decoded[data_type], through_block=target)
+
+        self.cursor = target
+        self.block_hashes[target] = target_hash
+        self.block_hashes = {block: h for block, h in self.block_hashes.items()
+                             if block > target - self.reorg_window}
+        if time.monotonic() - self.flushed_at >= self.flush_seconds:
+            self.flush()
+
+        update = {"type": "logs", "from_block": from_block, "to_block": target, "logs": logs_by_type,
+                  "decoded": decoded, "states": self.states}
+        self._notify(update)
+        return update
+
+    def flush(self):
+        """Save the buffered raw logs and the vault registry, then the incremental states and the block hashes."""
+        for writer in self.writers.values():
+            writer.flush()
+        if self.registry is not None:
+            self.registry.save()
+        for stores in self.states.values():
+            for store in stores:
+                if isinstance(store, IncrementalPositionStore):
+                    store.save()
+        self._save_hashes()
+        self.flushed_at = time.monotonic()
+
+    def run(self, from_block: int = 0, max_polls: Optional[int] = None):
+        """
+        Follow the chain until interrupted.
+
+        Errors of a poll are printed and the poll is retried, so a flaky endpoint
+        does not stop the follower; everything fetched is flushed on exit.
+
+        Args:
+            from_block: First block to follow from if nothing was saved yet
+            max_polls: Number of polls before returning (defaults to running forever)
+        """
+        self.start(from_block)
+        polls = 0
+        try:
+            while max_polls is None or polls < max_polls:
+                started = time.monotonic()
+                try:
+                    update = self.poll()
+                    if update is not None:
+                        print(f"Applied blocks {update['from_block']} to {update['to_block']}: " +
+                              ", ".join(f"{len(logs)} {data_type}" for data_type, logs in update["logs"].items()))
+                except Exception as e:
+                    print(f"Error following the chain at block {self.cursor + 1}: {e}")
+                polls += 1
+                time.sleep(max(0.0, self.poll_interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            print("Stopping the follower")
+        finally:
+            self.flush()
+
+
+if __name__ == "__main__":
+    from scripts.utils import setup_web3
+    LogFollower(setup_web3()).run()
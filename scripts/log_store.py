@@ -0,0 +1,251 @@
+"""
+Columnar (Parquet) storage for raw logs.
+
+Raw logs are stored one row per log with fixed-width binary columns for hashes,
+topics and addresses, so they load without unpickling web3 objects and can be
+decoded column-wise. Parquet dictionary-encodes the low-cardinality columns
+(address, topic0) on write.
+"""
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+
+
+RAW_LOG_SCHEMA = pa.schema([
+    ("block_number", pa.uint64()),
+    ("log_index", pa.uint32()),
+    ("tx_hash", pa.binary(32)),
+    ("address", pa.binary(20)),
+    ("topic0", pa.binary(32)),
+    ("topic1", pa.binary(32)),
+    ("topic2", pa.binary(32)),
+    ("topic3", pa.binary(32)),
+    ("data", pa.binary()),
+])
+
+RAW_LOG_COLUMNS = RAW_LOG_SCHEMA.names
+
+
+def to_bytes(value) -> bytes:
+    """Convert a HexBytes, bytes or hex string value to bytes."""
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    value = value[2:] if value.startswith("0x") else value
+    return bytes.fromhex(value)
+
+
+def logs_to_table(logs: List[Dict]) -> pa.Table:
+    """
+    Convert web3 log entries to a columnar table.
+
+    Accepts AttributeDicts returned by eth_getLogs as well as the plain dicts with
+    hex strings written by the legacy JSON files.
+
+    Args:
+        logs: List of log entries
+
+    Returns:
+        pyarrow Table with the RAW_LOG_SCHEMA columns
+    """
+    columns = {name: [] for name in RAW_LOG_COLUMNS}
+    for log in logs:
+        topics = log['topics']
+        columns["block_number"].append(log['blockNumber'])
+        columns["log_index"].append(log['logIndex'])
+        columns["tx_hash"].append(to_bytes(log['transactionHash']))
+        columns["address"].append(to_bytes(log['address']))
+        for i in range(4):
+            columns[f"topic{i}"].append(to_bytes(topics[i]) if i < len(topics) else None)
+        columns["data"].append(to_bytes(log['data']))
+    return pa.Table.from_pydict(columns, schema=RAW_LOG_SCHEMA)
+
+
+def table_to_logs(table: pa.Table) -> List[AttributeDict]:
+    """
+    Convert a columnar table back to web3-style log entries.
+
+    Only the columns present in the table are set, so projected tables give
+    projected log entries.
+
+    Args:
+        table: pyarrow Table with a subset of the RAW_LOG_SCHEMA columns
+
+    Returns:
+        List of AttributeDict log entries shaped like eth_getLogs results
+    """
+    columns = table.to_pydict()
+    topic_columns = [f"topic{i}" for i in range(4) if f"topic{i}" in columns]
+    logs = []
+    for row in range(table.num_rows):
+        log = {}
+        if "address" in columns:
+            log["address"] = Web3.to_checksum_address(columns["address"][row])
+        if "block_number" in columns:
+            log["blockNumber"] = columns["block_number"][row]
+        if "log_index" in columns:
+            log["logIndex"] = columns["log_index"][row]
+        if "tx_hash" in columns:
+            log["transactionHash"] = HexBytes(columns["tx_hash"][row])
+        if topic_columns:
+            log["topics"] = [HexBytes(columns[c][row]) for c in topic_columns if columns[c][row] is not None]
+        if "data" in columns:
+            log["data"] = HexBytes(columns["data"][row])
+        logs.append(AttributeDict(log))
+    return logs
+
+
+def write_log_table(table: pa.Table, filename: str):
+    """
+    Durably write a raw log table to a Parquet file.
+
+    Args:
+        table: pyarrow Table with the RAW_LOG_SCHEMA columns
+        filename: Destination path
+    """
+    tmp_filename = filename + ".tmp"
+    pq.write_table(table, tmp_filename, compression="zstd", use_dictionary=["address", "topic0"])
+    with open(tmp_filename, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
+def block_range_filter(from_block: Optional[int] = None, to_block: Optional[int] = None):
+    """Build a pyarrow dataset expression selecting block_number in [from_block, to_block]."""
+    expression = None
+    if from_block is not None:
+        expression = ds.field("block_number") >= from_block
+    if to_block is not None:
+        upper = ds.field("block_number") <= to_block
+        expression = upper if expression is None else expression & upper
+    return expression
+
+
+def read_log_table(filenames: str | List[str], columns: Optional[List[str]] = None,
+                   from_block: Optional[int] = None, to_block: Optional[int] = None) -> pa.Table:
+    """
+    Read raw logs from one or more Parquet files.
+
+    The block range is pushed down to the Parquet reader, which skips row groups
+    whose block_number statistics fall outside it, and only the requested columns
+    are decoded.
+
+    Args:
+        filenames: Parquet file or list of Parquet files
+        columns: Columns to read (defaults to all RAW_LOG_COLUMNS)
+        from_block: First block to read
+        to_block: Last block to read (inclusive)
+
+    Returns:
+        pyarrow Table sorted by block_number and log_index
+    """
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    if not filenames:
+        return RAW_LOG_SCHEMA.empty_table().select(columns or RAW_LOG_COLUMNS)
+
+    dataset = ds.dataset(filenames, schema=RAW_LOG_SCHEMA, format="parquet")
+    table = dataset.to_table(columns=columns, filter=block_range_filter(from_block, to_block))
+    sort_keys = [(c, "ascending") for c in ("block_number", "log_index") if c in table.column_names]
+    return table.sort_by(sort_keys) if sort_keys else table
+
+
+def _combine(column) -> pa.Array:
+    """Return a single contiguous Array for an Array or ChunkedArray."""
+    if isinstance(column, pa.ChunkedArray):
+        return column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+    return column
+
+
+def fixed_binary_to_numpy(column, width: int) -> np.ndarray:
+    """
+    View a fixed-width binary column as a 2D uint8 array without copying rows one by one.
+
+    Args:
+        column: pyarrow fixed_size_binary Array or ChunkedArray
+        width: Byte width of the column
+
+    Returns:
+        Array of shape (len(column), width); null entries are all zeros
+    """
+    array = _combine(column)
+    if len(array) == 0:
+        return np.zeros((0, width), dtype=np.uint8)
+    if array.null_count:
+        array = array.fill_null(pa.scalar(b"\0" * width, pa.binary(width)))
+    values = np.frombuffer(array.buffers()[1], dtype=np.uint8)
+    return values[array.offset * width:(array.offset + len(array)) * width].reshape(-1, width)
+
+
+def binary_to_uint256(column) -> np.ndarray:
+    """
+    Right-align a variable-length binary column into 32-byte big-endian words.
+
+    Values longer than 32 bytes keep their last 32 bytes, i.e. the last ABI word.
+
+    Args:
+        column: pyarrow binary Array or ChunkedArray
+
+    Returns:
+        uint8 array of shape (len(column), 32)
+    """
+    array = _combine(column)
+    if len(array) == 0:
+        return np.zeros((0, 32), dtype=np.uint8)
+    offsets = np.frombuffer(array.buffers()[1], dtype=np.int32)[array.offset:array.offset + len(array) + 1]
+    values = np.frombuffer(array.buffers()[2], dtype=np.uint8) if array.buffers()[2] is not None \
+        else np.zeros(0, dtype=np.uint8)
+    lengths = np.diff(offsets)
+    ends = offsets[1:]
+    if (lengths == 32).all():
+        return values[offsets[0]:ends[-1]].reshape(-1, 32)
+
+    words = np.zeros((len(array), 32), dtype=np.uint8)
+    for k in range(32):
+        has_byte = lengths > k
+        words[has_byte, 31 - k] = values[ends[has_byte] - 1 - k]
+    return words
+
+
+def uint256_to_float(words: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    """
+    Convert 32-byte big-endian unsigned integers to float64.
+
+    Args:
+        words: uint8 array of shape (n, 32)
+        scale: Factor applied to the result, e.g. 1e-18 to convert wei to token units
+
+    Returns:
+        float64 array of shape (n,)
+    """
+    limbs = np.ascontiguousarray(words).view(">u8").astype(np.float64)
+    values = ((limbs[:, 0] * 2.0 ** 64 + limbs[:, 1]) * 2.0 ** 64 + limbs[:, 2]) * 2.0 ** 64 + limbs[:, 3]
+    return values * scale
+
+
+def bytes_to_hex(values: np.ndarray) -> np.ndarray:
+    """
+    Hex-encode the rows of a 2D uint8 array as '0x'-prefixed strings.
+
+    Args:
+        values: uint8 array of shape (n, width)
+
+    Returns:
+        Array of n strings
+    """
+    width = values.shape[1]
+    if len(values) == 0:
+        return np.array([], dtype=f"U{2 * width + 2}")
+    hex_strings = np.frombuffer(np.ascontiguousarray(values).tobytes().hex().encode(), dtype=f"S{2 * width}")
+    return np.char.add("0x", hex_strings.astype(f"U{2 * width}"))
+
+
+def hex_to_bytes(value: str) -> np.ndarray:
+    """Convert a hex string such as an event signature to a uint8 array."""
+    return np.frombuffer(to_bytes(value), dtype=np.uint8)
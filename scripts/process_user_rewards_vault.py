@@ -4,12 +4,18 @@ Script to process user-rewards vault logs and create CSV files.
 """
 import os
 import time
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from tqdm import tqdm
 
 import config
 from scripts.utils import *
+from scripts.executor import get_decode_executor
+from scripts.log_store import (binary_to_uint256, bytes_to_hex, fixed_binary_to_numpy, hex_to_bytes,
+                               logs_to_table, uint256_to_float)
 
 
 def decode_user_rewards_vault_log(log: Dict) -> Dict:
@@ -85,39 +91,88 @@ def process_urv_log_for_multiprocessing(log: Dict) -> Dict:
         return None
 
 
-def decode_all_user_rewards_vault_logs_multiprocessing(raw_logs: List[Dict], num_processes: int = None) -> pd.DataFrame:
+def decode_all_user_rewards_vault_logs_multiprocessing(raw_logs: List[Dict] | pa.Table, num_processes: int = None) -> pd.DataFrame:
     """
-    Decode all user-rewards vault logs using multiprocessing for improved performance.
+    Decode all user-rewards vault logs using the shared decode executor for improved performance.
+    
+    Logs are decoded in large chunks with decode_user_rewards_vault_batch. The
+    executor picks a serial, thread or process backend from the number of logs,
+    keeps its pool warm across calls and returns rows in block order. Use
+    decode_user_rewards_vault_batch directly to get the error report.
     
     Args:
-        raw_logs: List of raw log entries
-        num_processes: Number of processes to use (defaults to CPU count)
+        raw_logs: List of raw log entries or raw log table
+        num_processes: Number of workers to use (defaults to CPU count)
         
     Returns:
         DataFrame with decoded logs
     """
-    import multiprocessing
-    from tqdm.auto import tqdm
+    executor = get_decode_executor(max_workers=num_processes)
+    num_logs = raw_logs.num_rows if isinstance(raw_logs, pa.Table) else len(raw_logs)
+    print(f"Decoding {num_logs} logs with the {executor.choose_backend(num_logs)} backend...")
+    decoded_logs_df, _ = executor.decode(decode_user_rewards_vault_batch, raw_logs)
+    return decoded_logs_df
+
+
+def decode_user_rewards_vault_batch(raw_logs: pa.Table | List[Dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Decode a whole batch of user-rewards vault logs in one vectorized pass.
+    
+    The user address is the last 20 bytes of topic1, the reward vault is the
+    emitting address, and the amount is the uint256 in data, negated where topic0
+    is a Withdrawn event. Rows that cannot be decoded are not dropped silently:
+    they are returned in an error report instead.
+    
+    Args:
+        raw_logs: Raw log table (see scripts.log_store.RAW_LOG_SCHEMA) or list of raw log entries
+        
+    Returns:
+        Tuple of (decoded, errors) DataFrames. decoded has the same columns as
+        decode_all_user_rewards_vault_logs, in block order; errors has one row per
+        rejected log with its block_number, log_index, tx_hash and error
+    """
+    if not isinstance(raw_logs, pa.Table):
+        raw_logs = logs_to_table(raw_logs)
+    
+    topic0 = fixed_binary_to_numpy(raw_logs.column("topic0"), 32)
+    is_staked = (topic0 == hex_to_bytes(config.REWARDS_VAULT.event_signatures['Staked'])).all(axis=1)
+    is_withdrawn = (topic0 == hex_to_bytes(config.REWARDS_VAULT.event_signatures['Withdrawn'])).all(axis=1)
+    has_user = raw_logs.column("topic1").is_valid().to_numpy(zero_copy_only=False)
+    data_lengths = pc.binary_length(raw_logs.column("data")).to_numpy(zero_copy_only=False)
+    
+    errors = np.full(raw_logs.num_rows, None, dtype=object)
+    errors[data_lengths != 32] = "data is not a single uint256"
+    errors[~has_user] = "missing topic1 (user address)"
+    errors[~(is_staked | is_withdrawn)] = "unknown event signature"
+    valid = pd.isna(errors)
     
-    if num_processes is None:
-        num_processes = multiprocessing.cpu_count()
+    block_numbers = raw_logs.column("block_number").to_numpy().astype(np.int64)
+    tx_hashes = bytes_to_hex(fixed_binary_to_numpy(raw_logs.column("tx_hash"), 32))
     
-    print(f"Decoding {len(raw_logs)} logs using {num_processes} processes...")
+    # Checksum each distinct vault address once rather than once per log
+    addresses = raw_logs.column("address").filter(pa.array(valid)).combine_chunks().dictionary_encode()
+    checksummed = np.array([Web3.to_checksum_address(a) for a in addresses.dictionary.to_pylist()], dtype=object)
     
-    # Use multiprocessing to decode logs
-    with multiprocessing.Pool(processes=num_processes) as pool:
-        # Use tqdm with imap_unordered for better performance
-        # imap_unordered processes results as they become available, regardless of input order
-        results = list(tqdm(
-            pool.imap_unordered(process_urv_log_for_multiprocessing, raw_logs),
-            total=len(raw_logs),
-            desc="Decoding logs"
-        ))
+    amounts = uint256_to_float(binary_to_uint256(raw_logs.column("data"))[valid], 1e-18)  # Convert to BGT units
+    decoded = pd.DataFrame({
+        "tx_hash": tx_hashes[valid],
+        "block_number": block_numbers[valid],
+        "user_address": bytes_to_hex(fixed_binary_to_numpy(raw_logs.column("topic1"), 32)[valid, 12:]),
+        "rv_address": checksummed[addresses.indices.to_numpy(zero_copy_only=False)],
+        "amount": np.where(is_withdrawn[valid], -amounts, amounts),
+        "event_type": bytes_to_hex(topic0[valid]),
+    })
     
-    # Filter out None values (failed decoding)
-    results = [r for r in results if r is not None]
+    error_report = pd.DataFrame({
+        "block_number": block_numbers[~valid],
+        "log_index": raw_logs.column("log_index").to_numpy().astype(np.int64)[~valid],
+        "tx_hash": tx_hashes[~valid],
+        "error": errors[~valid],
+    })
+    if len(error_report):
+        print(f"Could not decode {len(error_report)} of {raw_logs.num_rows} user-rewards vault logs")
     
-    return pd.DataFrame(results)
+    return decoded, error_report
 
 
 def process_user_rewards_vault_logs(input_path: str, output_dir: Optional[str] = None, use_multiprocessing: bool = True, num_processes: Optional[int] = None):
@@ -9,12 +9,17 @@ import time
 from typing import Dict, List, Optional
 import requests
 from web3 import Web3
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from tqdm import tqdm
 
 
 import config
 from scripts.utils import *
+from scripts.executor import get_decode_executor
+from scripts.log_store import (binary_to_uint256, bytes_to_hex, fixed_binary_to_numpy, hex_to_bytes,
+                               logs_to_table, uint256_to_float)
 
 
 def decode_validator_delegator_log(log: Dict) -> Dict:
@@ -75,37 +80,60 @@ def process_vd_log_for_multiprocessing(log):
         return None
 
 
-def decode_all_validator_delegator_logs_multiprocessing(raw_logs: List[Dict], num_processes: int = None) -> pd.DataFrame:
+def decode_all_validator_delegator_logs_multiprocessing(raw_logs: List[Dict] | pa.Table, num_processes: int = None) -> pd.DataFrame:
     """
-    Decode all validator-delegator logs using multiprocessing for improved performance.
+    Decode all validator-delegator logs using the shared decode executor for improved performance.
+    
+    Logs are decoded in large chunks with decode_validator_delegator_batch. The
+    executor picks a serial, thread or process backend from the number of logs,
+    keeps its pool warm across calls and returns rows in block order.
     
     Args:
-        raw_logs: List of raw log entries
-        num_processes: Number of processes to use (defaults to CPU count)
+        raw_logs: List of raw log entries or raw log table
+        num_processes: Number of workers to use (defaults to CPU count)
         
     Returns:
         DataFrame with decoded logs
     """
-    import multiprocessing
-    from tqdm.auto import tqdm
-    
-    if num_processes is None:
-        num_processes = multiprocessing.cpu_count()
+    executor = get_decode_executor(max_workers=num_processes)
+    num_logs = raw_logs.num_rows if isinstance(raw_logs, pa.Table) else len(raw_logs)
+    print(f"Decoding {num_logs} logs with the {executor.choose_backend(num_logs)} backend...")
+    return executor.decode(decode_validator_delegator_batch, raw_logs)
+
+
+def decode_validator_delegator_batch(raw_logs: pa.Table | List[Dict]) -> pd.DataFrame:
+    """
+    Decode a whole batch of validator-delegator logs in one vectorized pass.
     
-    print(f"Decoding {len(raw_logs)} logs using {num_processes} processes...")
+    Topics and data are read as byte arrays straight from the columnar raw log
+    table: the delegator address is the last 20 bytes of topic2, the validator is
+    topic3, and the amount is the uint256 in data, negated where topic0 is an
+    Undelegation. Logs with any other topic0 are dropped, like in
+    decode_all_validator_delegator_logs.
     
+    Args:
+        raw_logs: Raw log table (see scripts.log_store.RAW_LOG_SCHEMA) or list of raw log entries
+        
+    Returns:
+        DataFrame with the same columns as decode_all_validator_delegator_logs, in block order
+    """
+    if not isinstance(raw_logs, pa.Table):
+        raw_logs = logs_to_table(raw_logs)
     
-    # Use multiprocessing to decode logs
-    with multiprocessing.Pool(processes=num_processes) as pool:
-        # Use tqdm with imap_unordered for better performance
-        # imap_unordered processes results as they become available, regardless of input order
-        results = list(tqdm(
-            pool.imap_unordered(process_vd_log_for_multiprocessing, raw_logs),
-            total=len(raw_logs),
-            desc="Decoding logs"
-        ))
+    topic0 = fixed_binary_to_numpy(raw_logs.column("topic0"), 32)
+    is_delegation = (topic0 == hex_to_bytes(config.BGT_TOKEN.event_signatures['Delegation'])).all(axis=1)
+    is_undelegation = (topic0 == hex_to_bytes(config.BGT_TOKEN.event_signatures['Undelegation'])).all(axis=1)
+    known = is_delegation | is_undelegation
+    if not known.all():
+        print(f"Skipping {int((~known).sum())} logs with an unknown event signature")
     
-    # Filter out None values (failed decoding)
-    results = [r for r in results if r is not None]
+    sign = np.where(is_undelegation, -1.0, 1.0)[known]
+    amounts = uint256_to_float(binary_to_uint256(raw_logs.column("data"))[known], 1e-18)  # Convert to BGT units
     
-    return pd.DataFrame(results)
+    return pd.DataFrame({
+        "tx_hash": bytes_to_hex(fixed_binary_to_numpy(raw_logs.column("tx_hash"), 32)[known]),
+        "block_number": raw_logs.column("block_number").to_numpy()[known].astype(np.int64),
+        "validator_address": bytes_to_hex(fixed_binary_to_numpy(raw_logs.column("topic3"), 32)[known]),
+        "delegator_address": bytes_to_hex(fixed_binary_to_numpy(raw_logs.column("topic2"), 32)[known, 12:]),
+        "amount_bgt_delegated": sign * amounts,
+    })
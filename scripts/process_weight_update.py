@@ -1,29 +1,163 @@
 import os
 import time
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from tqdm import tqdm
 
 import config
 from scripts.utils import *
+from scripts.event_decoder import EventDecoder, checksum_address
+from scripts.log_store import bytes_to_hex, fixed_binary_to_numpy, hex_to_bytes, logs_to_table, to_bytes
+
+
+@lru_cache(maxsize=None)
+def get_weight_update_decoder() -> EventDecoder:
+    """Return the precompiled ActivateRewardAllocation decoder, built once from the cached BeraChef ABI."""
+    return EventDecoder.from_contract_config(config.BERACHEF, "ActivateRewardAllocation")
 
 
 def decode_weight_update_log(w3: Web3, log: Dict) -> Dict:
     event_signature = '0x' + log['topics'][0].hex() if isinstance(log['topics'][0], bytes) else log['topics'][0]
     assert event_signature == config.BERACHEF.event_signatures['ActivateRewardAllocation'], f"Invalid event signature: {event_signature}"
-    # Load contract
-    abi = get_contract_abi(config.BERACHEF.abi_url)
-    berachef_contract = w3.eth.contract(address=config.BERACHEF.address, abi=abi)
-    decoded_log = berachef_contract.events.ActivateRewardAllocation().process_log(log)
+    # Decode with the cached decoder instead of building a contract per log
+    args = get_weight_update_decoder().decode_data(to_bytes(log['data']))
         
     return {
         "block_number": log['blockNumber'],
         "transaction_hash": '0x' + log['transactionHash'].hex() if isinstance(log['transactionHash'], bytes) else log['transactionHash'],
         "validator_address": '0x' + log['topics'][1].hex() if isinstance(log['topics'][1], bytes) else log['topics'][1],
-        "start_block": decoded_log.args.startBlock,
-        "weights": [(w.receiver, w.percentageNumerator) for w in decoded_log.args.weights]
+        "start_block": args['startBlock'],
+        "weights": [(receiver, percentage_numerator) for receiver, percentage_numerator in args['weights']]
     }
 
+
+def _decode_weights_columns(data: np.ndarray, offsets: np.ndarray) -> Tuple[np.ndarray, list, np.ndarray]:
+    """
+    Vectorized decoding of canonically encoded (uint64 startBlock, (address,uint96)[] weights) data.
+    
+    Args:
+        data: Concatenated log data bytes of the batch
+        offsets: Start offset of each log's data, plus the end offset of the last one
+        
+    Returns:
+        Tuple of (start_blocks, weights, canonical). weights holds a list of
+        (receiver, percentageNumerator) tuples per row; rows where canonical is False
+        are not encoded in the standard layout and must be decoded with the ABI decoder
+    """
+    starts = offsets[:-1].astype(np.int64)
+    lengths = np.diff(offsets).astype(np.int64)
+    num_rows = len(starts)
+    
+    def word_u64(positions: np.ndarray) -> np.ndarray:
+        """Read the low 8 bytes of the 32-byte words at positions as uint64."""
+        idx = positions[:, None] + np.arange(24, 32)
+        return data[idx].astype(np.uint64) @ (np.uint64(256) ** np.arange(7, -1, -1, dtype=np.uint64))
+    
+    def word_high_is_zero(positions: np.ndarray, num_bytes: int) -> np.ndarray:
+        """Check that the first num_bytes bytes of the words at positions are zero."""
+        return ~data[positions[:, None] + np.arange(num_bytes)].any(axis=1)
+    
+    canonical = lengths >= 96
+    safe_starts = np.where(canonical, starts, 0)
+    if len(data) < 96:
+        data = np.concatenate([data, np.zeros(96, dtype=np.uint8)])
+    start_blocks = word_u64(safe_starts)
+    array_offsets = word_u64(safe_starts + 32)
+    counts = word_u64(safe_starts + 64).astype(np.int64)
+    canonical &= word_high_is_zero(safe_starts, 24) & word_high_is_zero(safe_starts + 32, 24) \
+        & word_high_is_zero(safe_starts + 64, 24)
+    canonical &= (array_offsets == 64) & (counts >= 0) & (lengths == 96 + 64 * counts)
+    counts = np.where(canonical, counts, 0)
+    
+    # One entry per weight across the whole batch
+    entry_rows = np.repeat(np.arange(num_rows), counts)
+    entry_rank = np.arange(len(entry_rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    entry_starts = starts[entry_rows] + 96 + 64 * entry_rank
+    receivers = data[entry_starts[:, None] + np.arange(12, 32)]
+    numerators = word_u64(entry_starts + 32)
+    # uint96 numerators above 2**64 are left to the ABI decoder
+    large = ~word_high_is_zero(entry_starts + 32 + 20, 4)
+    if large.any():
+        canonical[np.unique(entry_rows[large])] = False
+    
+    receiver_hex = bytes_to_hex(receivers)
+    receiver_list = [checksum_address(address) for address in receiver_hex]
+    numerator_list = numerators.tolist()
+    weights = [[] for _ in range(num_rows)]
+    for row, receiver, numerator in zip(entry_rows.tolist(), receiver_list, numerator_list):
+        weights[row].append((receiver, numerator))
+    return start_blocks.astype(np.int64), weights, canonical
+
+
+def decode_weight_update_batch(raw_logs: pa.Table | List[Dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Decode a whole shard of BeraChef ActivateRewardAllocation logs.
+    
+    The dynamic weights array is decoded for all logs at once with NumPy; logs not
+    in the canonical ABI layout go through the precompiled ABI decoder. No contract
+    is built and no network call is made per log once the BeraChef ABI is cached.
+    
+    Args:
+        raw_logs: Raw log table (see scripts.log_store.RAW_LOG_SCHEMA) or list of raw log entries
+        
+    Returns:
+        Tuple of (decoded, errors) DataFrames. decoded has the fields of
+        decode_weight_update_log, in block order; errors has one row per rejected log
+    """
+    if not isinstance(raw_logs, pa.Table):
+        raw_logs = logs_to_table(raw_logs)
+    
+    topic0 = fixed_binary_to_numpy(raw_logs.column("topic0"), 32)
+    known = (topic0 == hex_to_bytes(config.BERACHEF.event_signatures['ActivateRewardAllocation'])).all(axis=1)
+    
+    data_column = raw_logs.column("data").combine_chunks()
+    offsets = np.frombuffer(data_column.buffers()[1], dtype=np.int32)[
+        data_column.offset:data_column.offset + len(data_column) + 1]
+    data = np.frombuffer(data_column.buffers()[2], dtype=np.uint8) if data_column.buffers()[2] is not None \
+        else np.zeros(0, dtype=np.uint8)
+    start_blocks, weights, canonical = _decode_weights_columns(data, offsets)
+    
+    block_numbers = raw_logs.column("block_number").to_numpy().astype(np.int64)
+    log_indexes = raw_logs.column("log_index").to_numpy().astype(np.int64)
+    tx_hashes = bytes_to_hex(fixed_binary_to_numpy(raw_logs.column("tx_hash"), 32))
+    validators = bytes_to_hex(fixed_binary_to_numpy(raw_logs.column("topic1"), 32))
+    
+    start_blocks = start_blocks.astype(object)
+    errors = {}
+    for row in np.flatnonzero(known & ~canonical):
+        try:
+            args = get_weight_update_decoder().decode_data(data[offsets[row]:offsets[row + 1]].tobytes())
+            start_blocks[row] = args['startBlock']
+            weights[row] = [(receiver, percentage_numerator) for receiver, percentage_numerator in args['weights']]
+        except Exception as e:
+            errors[row] = str(e)
+    for row in np.flatnonzero(~known):
+        errors[row] = f"Invalid event signature: {bytes_to_hex(topic0[row:row + 1])[0]}"
+    
+    valid = np.ones(raw_logs.num_rows, dtype=bool)
+    valid[list(errors)] = False
+    decoded_logs_df = pd.DataFrame({
+        "block_number": block_numbers[valid],
+        "transaction_hash": tx_hashes[valid],
+        "validator_address": validators[valid],
+        "start_block": start_blocks[valid].astype(np.int64),
+        "weights": [w for w, v in zip(weights, valid) if v],
+    })
+    error_rows = sorted(errors)
+    error_report = pd.DataFrame({
+        "block_number": block_numbers[error_rows],
+        "log_index": log_indexes[error_rows],
+        "tx_hash": tx_hashes[error_rows],
+        "error": [errors[row] for row in error_rows],
+    })
+    if len(error_report):
+        print(f"Could not decode {len(error_report)} of {raw_logs.num_rows} BeraChef weight update logs")
+    return decoded_logs_df, error_report
+
+
 def process_weight_update_log_for_multiprocessing(w3: Web3, log: Dict) -> Dict:
     """
     Process a single log entry for multiprocessing.
@@ -0,0 +1,249 @@
+"""
+Adaptive block-range planning for eth_getLogs scans.
+"""
+import hashlib
+import json
+import os
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+
+# Error messages providers return when a window matches too many logs or the response is too large.
+# The JSON-RPC code is not matched: providers also use -32005 for rate limiting, which is retried with
+# backoff rather than bisected
+RESULT_LIMIT_ERRORS = (
+    "more than 10000 results",
+    "query returned more than",
+    "too many results",
+    "exceeds max results",
+    "response size",
+    "response is too big",
+    "log response size exceeded",
+)
+
+# Error messages providers return when the window spans too many blocks. Only these lower the
+# persisted max_batch_size, so they are kept to actual span limits: result limits often mention a
+# block range too (e.g. "log response size exceeded, use up to a 2K block range")
+BLOCK_RANGE_LIMIT_ERRORS = (
+    "block range is too wide",
+    "block range too large",
+    "block range limit exceeded",
+    "exceed maximum block range",
+    "exceeds max block range",
+    "maximum block range exceeded",
+    "range is too large",
+    "requested too many blocks",
+    "eth_getlogs is limited to",
+)
+
+
+def is_result_limit_error(error: Exception) -> bool:
+    """Return True if the provider rejected a window for returning too many logs."""
+    message = str(error).lower()
+    return any(marker in message for marker in RESULT_LIMIT_ERRORS)
+
+
+def is_block_range_limit_error(error: Exception) -> bool:
+    """Return True if the provider rejected a window for spanning too many blocks."""
+    message = str(error).lower()
+    if is_result_limit_error(error):
+        return False
+    return any(marker in message for marker in BLOCK_RANGE_LIMIT_ERRORS)
+
+
+def density_key(contract_address: str | List[str], event_signature: str | List[str]) -> str:
+    """
+    Build a stable key for a contract/topic set.
+
+    Args:
+        contract_address: Single contract address or list of contract addresses
+        event_signature: Single event signature or list of event signatures
+
+    Returns:
+        Hex digest identifying the filter regardless of argument order or case
+    """
+    addresses = [contract_address] if isinstance(contract_address, str) else contract_address
+    signatures = [event_signature] if isinstance(event_signature, str) else event_signature
+    raw = ",".join(sorted(a.lower() for a in addresses)) + "|" + ",".join(sorted(s.lower() for s in signatures))
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def load_log_density(key: str) -> Dict:
+    """
+    Load the density estimate saved by a previous scan.
+
+    Args:
+        key: Key returned by density_key
+
+    Returns:
+        Dictionary with density, batch_size and max_batch_size, or an empty dict
+    """
+    if not os.path.exists(config.LOG_DENSITY_FILE):
+        return {}
+    with open(config.LOG_DENSITY_FILE, 'r') as f:
+        return json.load(f).get(key, {})
+
+
+def save_log_density(key: str, planner: "AdaptiveRangePlanner"):
+    """
+    Persist the planner's density estimate so the next scan starts with a good window size.
+
+    Args:
+        key: Key returned by density_key
+        planner: Planner whose state should be saved
+    """
+    estimates = {}
+    if os.path.exists(config.LOG_DENSITY_FILE):
+        with open(config.LOG_DENSITY_FILE, 'r') as f:
+            estimates = json.load(f)
+
+    estimates[key] = {
+        "density": planner.density,
+        "batch_size": planner.batch_size,
+        "max_batch_size": planner.max_batch_size,
+        "updated": datetime.now().strftime("%Y-%m-%d_%H:%M:%S"),
+    }
+
+    os.makedirs(os.path.dirname(config.LOG_DENSITY_FILE) or ".", exist_ok=True)
+    tmp_filename = config.LOG_DENSITY_FILE + ".tmp"
+    with open(tmp_filename, 'w') as f:
+        json.dump(estimates, f, indent=2)
+    os.replace(tmp_filename, config.LOG_DENSITY_FILE)
+
+
+class AdaptiveRangePlanner:
+    """
+    Hand out eth_getLogs windows whose size follows the observed log density.
+
+    Windows that hit a provider result limit are bisected and re-queued ahead of
+    new windows, windows in sparse regions make the next ones grow (at most doubling
+    each time), and dense regions shrink them towards target_logs logs per call.
+    Every block of [from_block, to_block] is covered by exactly one successful window.
+    """
+
+    def __init__(self, from_block: int, to_block: int, batch_size: Optional[int] = None,
+                 min_batch_size: int = 1, max_batch_size: Optional[int] = None,
+                 target_logs: Optional[int] = None, density: Optional[float] = None,
+                 smoothing: float = 0.3):
+        """
+        Args:
+            from_block: First block of the range
+            to_block: Last block of the range (inclusive)
+            batch_size: Initial window size (defaults to config.LOGS_BATCH_SIZE)
+            min_batch_size: Smallest window a failing window can be split into
+            max_batch_size: Largest window size (defaults to config.LOGS_MAX_BATCH_SIZE)
+            target_logs: Number of logs aimed for per window (defaults to config.LOGS_TARGET_PER_WINDOW)
+            density: Prior estimate of logs per block, usually from a previous run
+            smoothing: Weight of the latest window in the exponential density estimate
+        """
+        self.cursor = from_block
+        self.to_block = to_block
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size or config.LOGS_MAX_BATCH_SIZE
+        self.batch_size = min(batch_size or config.LOGS_BATCH_SIZE, self.max_batch_size)
+        self.target_logs = target_logs or config.LOGS_TARGET_PER_WINDOW
+        self.density = density
+        self.smoothing = smoothing
+        self.retry_windows = deque()
+        self.num_requests = 0
+        self.num_splits = 0
+
+    @classmethod
+    def from_saved_state(cls, key: str, from_block: int, to_block: int,
+                         batch_size: Optional[int] = None, **kwargs) -> "AdaptiveRangePlanner":
+        """Create a planner seeded with the density estimate saved under key."""
+        state = load_log_density(key)
+        return cls(
+            from_block,
+            to_block,
+            batch_size=batch_size or state.get("batch_size"),
+            max_batch_size=kwargs.pop("max_batch_size", None) or state.get("max_batch_size"),
+            density=state.get("density"),
+            **kwargs
+        )
+
+    def next_window(self) -> Optional[Tuple[int, int]]:
+        """
+        Return the next window to fetch, or None when the whole range has been handed out.
+
+        Split windows are always returned before new windows so that the caller's
+        block-ordered output is never held back for long.
+        """
+        if self.retry_windows:
+            return self.retry_windows.popleft()
+        if self.cursor > self.to_block:
+            return None
+        batch_end = min(self.cursor + self.batch_size - 1, self.to_block)
+        window = (self.cursor, batch_end)
+        self.cursor = batch_end + 1
+        return window
+
+    def has_pending(self) -> bool:
+        """Return True if windows remain to be handed out."""
+        return bool(self.retry_windows) or self.cursor <= self.to_block
+
+    def record_success(self, from_block: int, to_block: int, num_logs: int):
+        """
+        Update the density estimate and window size after a successful window.
+
+        Args:
+            from_block: First block of the window
+            to_block: Last block of the window (inclusive)
+            num_logs: Number of logs the window returned
+        """
+        self.num_requests += 1
+        num_blocks = to_block - from_block + 1
+        observed = num_logs / num_blocks
+        if self.density is None:
+            self.density = observed
+        else:
+            self.density = (1 - self.smoothing) * self.density + self.smoothing * observed
+
+        if num_logs > self.target_logs:
+            # Dense region: shrink towards the target
+            self.batch_size = max(self.batch_size // 2, self.min_batch_size)
+        elif num_logs < self.target_logs // 2:
+            # Sparse region: grow, but never more than doubling per window
+            grown = self.batch_size * 2
+            if self.density > 0:
+                grown = min(grown, max(int(self.target_logs / self.density), self.batch_size))
+            self.batch_size = min(grown, self.max_batch_size)
+
+    def record_failure(self, from_block: int, to_block: int, error: Exception) -> bool:
+        """
+        Split a window rejected by the provider for its size.
+
+        Args:
+            from_block: First block of the window
+            to_block: Last block of the window (inclusive)
+            error: Exception raised by the provider
+
+        Returns:
+            True if the window was split and re-queued, False if the caller should
+            retry it as is (or give up) because the error is not a size limit or
+            the window cannot be split further
+        """
+        self.num_requests += 1
+        result_limit = is_result_limit_error(error)
+        range_limit = is_block_range_limit_error(error)
+        num_blocks = to_block - from_block + 1
+        if not (result_limit or range_limit) or num_blocks <= self.min_batch_size:
+            return False
+
+        if range_limit:
+            # The provider caps the span itself: never grow back past it
+            self.max_batch_size = max(num_blocks // 2, self.min_batch_size)
+        self.batch_size = max(min(self.batch_size, num_blocks // 2), self.min_batch_size)
+
+        mid_block = (from_block + to_block) // 2
+        self.retry_windows.appendleft((mid_block + 1, to_block))
+        self.retry_windows.appendleft((from_block, mid_block))
+        self.num_splits += 1
+        return True
+
+    def requeue(self, from_block: int, to_block: int):
+        """Put a window back at the front of the queue to be retried unchanged."""
+        self.retry_windows.appendleft((from_block, to_block))
@@ -0,0 +1,76 @@
+"""
+Raw JSON-RPC helpers for calls web3 would otherwise make one HTTP request at a time.
+"""
+import time
+from typing import Any, List, Optional, Tuple
+
+import requests
+
+from scripts.rpc_pool import get_rpc_pool
+
+
+_SESSION = None
+
+
+def get_session() -> requests.Session:
+    """Return a shared HTTP session, so connections to the node are kept alive."""
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = requests.Session()
+    return _SESSION
+
+
+def json_rpc_batch(calls: List[Tuple[str, list]], endpoint: Optional[str] = None,
+                   max_retries: int = 5, timeout: float = 60) -> List[Any]:
+    """
+    Send many JSON-RPC calls in a single HTTP request.
+
+    Calls that fail individually (error member or missing response) are retried
+    in a smaller batch with exponential backoff, as are failed HTTP requests.
+
+    Args:
+        calls: (method, params) pairs
+        endpoint: RPC endpoint (defaults to the shared pool over config.RPC_ENDPOINTS)
+        max_retries: Number of retries before giving up
+        timeout: HTTP timeout in seconds
+
+    Returns:
+        Results aligned with calls
+
+    Raises:
+        RuntimeError: If some calls still fail after max_retries retries
+    """
+    results = [None] * len(calls)
+    pending = list(range(len(calls)))
+    last_error = None
+    for attempt in range(max_retries + 1):
+        if attempt:
+            time.sleep(min(2 ** (attempt - 1), 30))
+        payload = [{"jsonrpc": "2.0", "id": i, "method": calls[i][0], "params": calls[i][1]} for i in pending]
+        try:
+            if endpoint is None:
+                responses = get_rpc_pool().post(payload)
+            else:
+                response = get_session().post(endpoint, json=payload, timeout=timeout)
+                response.raise_for_status()
+                responses = response.json()
+        except (requests.RequestException, ValueError, RuntimeError) as e:
+            last_error = e
+            continue
+        if isinstance(responses, dict):
+            # Some nodes answer a rejected batch with a single error object
+            last_error = responses.get("error", responses)
+            continue
+
+        failed = set(pending)
+        for item in responses:
+            i = item.get("id")
+            if i in failed and "error" not in item:
+                results[i] = item.get("result")
+                failed.discard(i)
+            elif i in failed:
+                last_error = item["error"]
+        pending = sorted(failed)
+        if not pending:
+            return results
+    raise RuntimeError(f"{len(pending)} of {len(calls)} JSON-RPC calls failed after {max_retries} retries: {last_error}")
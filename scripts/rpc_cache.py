@@ -0,0 +1,318 @@
+"""
+Disk-backed cache of finalized JSON-RPC responses.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from web3 import HTTPProvider
+
+import config
+
+
+# Methods whose result only depends on their params, whatever the chain head
+STATIC_METHODS = {"eth_chainId", "net_version"}
+
+# Methods reading the state at a block, with the position of the block parameter
+BLOCK_PARAM_METHODS = {
+    "eth_getBlockByNumber": 0,
+    "eth_getBlockTransactionCountByNumber": 0,
+    "eth_getBlockReceipts": 0,
+    "eth_call": 1,
+    "eth_getBalance": 1,
+    "eth_getCode": 1,
+    "eth_getTransactionCount": 1,
+    "eth_getStorageAt": 2,
+}
+
+# Methods keyed by hash, final once the block holding the result is
+HASH_METHODS = {"eth_getBlockByHash", "eth_getTransactionByHash", "eth_getTransactionReceipt"}
+
+
+def _normalize(value: Any) -> Any:
+    """Lowercase hex strings and sort dictionaries, so equivalent requests share a key."""
+    if isinstance(value, str):
+        return value.lower()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _block_number(value: Any) -> Optional[int]:
+    """Return a block parameter as an integer, or None for tags such as latest."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.lower().startswith("0x"):
+        return int(value, 16)
+    if isinstance(value, dict):
+        return _block_number(value.get("blockNumber"))
+    return None
+
+
+class RPCResponseCache:
+    """
+    Content-addressed store of JSON-RPC results with a size limit.
+
+    Results are keyed by the hash of the chain id, method and normalized params,
+    stored zlib-compressed in a SQLite file and evicted least recently used
+    first once the store outgrows max_bytes. Hits, misses, stores and evictions
+    are counted per process and accumulated in the store.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Args:
+            directory: Directory of the store (defaults to config.RPC_CACHE_DIR)
+            max_bytes: Size limit of the stored results (defaults to config.RPC_CACHE_MAX_BYTES)
+        """
+        self.directory = directory or config.RPC_CACHE_DIR
+        self.max_bytes = max_bytes or config.RPC_CACHE_MAX_BYTES
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.directory, "responses.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, method TEXT, "
+                         "size INTEGER, last_access REAL, value BLOB)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+        self._db.commit()
+        self.total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._unsaved_stats = dict(self.stats)
+
+    @staticmethod
+    def key(namespace: str, method: str, params: Any) -> str:
+        """Return the content address of a request."""
+        request = json.dumps([namespace, method, _normalize(params)], separators=(",", ":"))
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def _count(self, name: str):
+        self.stats[name] += 1
+        self._unsaved_stats[name] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached result of a request, or None on a miss."""
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        Return the cached results of the parts of one request, counted as a single hit or miss.
+
+        Args:
+            keys: Keys of the parts
+
+        Returns:
+            Results aligned with keys, None for the parts that are not cached; the
+            request counts as a hit only if every part is cached
+        """
+        with self._lock:
+            rows = [self._db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone() for key in keys]
+            found = [key for key, row in zip(keys, rows) if row is not None]
+            now = time.time()
+            self._db.executemany("UPDATE responses SET last_access = ? WHERE key = ?", [(now, key) for key in found])
+            self._count("hits" if len(found) == len(keys) else "misses")
+            return [json.loads(zlib.decompress(row[0])) if row is not None else None for row in rows]
+
+    def put(self, key: str, method: str, result: Any):
+        """Store a result, evicting the least recently used ones if the store is full."""
+        self.put_many([(key, result)], method)
+
+    def put_many(self, items: List[Tuple[str, Any]], method: str):
+        """Store (key, result) pairs, evicting the least recently used results if the store is full."""
+        values = [(key, zlib.compress(json.dumps(result, separators=(",", ":")).encode())) for key, result in items]
+        with self._lock:
+            now = time.time()
+            for key, value in values:
+                old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                                 (key, method, len(value), now, value))
+                self.total_bytes += len(value) - (old[0] if old else 0)
+                self._count("stores")
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """Drop the least recently used results until the store is 90% of max_bytes."""
+        target = self.max_bytes * 0.9
+        evicted = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if self.total_bytes <= target:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.stats["evictions"] += len(evicted)
+        self._unsaved_stats["evictions"] += len(evicted)
+
+    def save_stats(self):
+        """Add the counts since the last save to the cumulative counts of the store."""
+        with self._lock:
+            for name, value in self._unsaved_stats.items():
+                self._db.execute("INSERT INTO stats VALUES (?, ?) ON CONFLICT(name) DO UPDATE "
+                                 "SET value = value + excluded.value", (name, value))
+            self._db.commit()
+            self._unsaved_stats = {name: 0 for name in self._unsaved_stats}
+
+    def cumulative_stats(self) -> Dict[str, int]:
+        """Return the counts accumulated over every run, including this one."""
+        self.save_stats()
+        with self._lock:
+            stats = dict(self._db.execute("SELECT name, value FROM stats").fetchall())
+        stats["bytes"] = self.total_bytes
+        return stats
+
+    def hit_rate(self) -> float:
+        requests = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / requests if requests else 0.0
+
+    def close(self):
+        self.save_stats()
+        with self._lock:
+            self._db.close()
+
+
+class CachingHTTPProvider(HTTPProvider):
+    """
+    HTTPProvider answering repeated requests on finalized data from an RPCResponseCache.
+
+    A result is stored only if it cannot change any more: eth_getLogs windows and
+    block-parameter calls at or below the finalized block, and
+    hash lookups whose result lies in a finalized block. The finalized block is only
+    queried on a miss, so re-running over cached historical ranges makes no network call.
+    """
+
+    def __init__(self, endpoint_uri: Optional[str] = None, cache: Optional[RPCResponseCache] = None,
+                 finalized_refresh: Optional[float] = None, logs_chunk_size: Optional[int] = None, **kwargs):
+        """
+        Args:
+            endpoint_uri: RPC endpoint (defaults to config.RPC_ENDPOINT)
+            cache: Response cache (defaults to one in config.RPC_CACHE_DIR)
+            finalized_refresh: Seconds the finalized block number is reused before being
+                queried again (defaults to config.RPC_FINALIZED_REFRESH)
+            logs_chunk_size: Blocks per cached eth_getLogs chunk (defaults to config.RPC_CACHE_LOGS_CHUNK)
+            **kwargs: Passed to HTTPProvider
+        """
+        super().__init__(endpoint_uri or config.RPC_ENDPOINT, **kwargs)
+        self.cache = cache or RPCResponseCache()
+        self.finalized_refresh = finalized_refresh or config.RPC_FINALIZED_REFRESH
+        self.logs_chunk_size = logs_chunk_size or config.RPC_CACHE_LOGS_CHUNK
+        self._finalized_block = None
+        self._finalized_at = 0.0
+        self._chain_id = None
+
+    def _uncached_request(self, method: str, params: Any) -> Any:
+        response = super().make_request(method, params)
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response["result"]
+
+    def _namespace(self) -> str:
+        """Return the chain id, so that results of different chains never share a key."""
+        if self._chain_id is None:
+            key = RPCResponseCache.key(self.endpoint_uri, "eth_chainId", [])
+            self._chain_id = self.cache.get(key)
+            if self._chain_id is None:
+                self._chain_id = self._uncached_request("eth_chainId", [])
+                self.cache.put(key, "eth_chainId", self._chain_id)
+        return str(self._chain_id)
+
+    def finalized_block(self) -> int:
+        """Return the finalized block, or the head minus config.RPC_FINALITY_DEPTH without finalized tag support."""
+        if self._finalized_block is None or time.time() - self._finalized_at > self.finalized_refresh:
+            try:
+                block = self._uncached_request("eth_getBlockByNumber", ["finalized", False])
+                self._finalized_block = int(block["number"], 16)
+            except (ValueError, KeyError, TypeError):
+                head = int(self._uncached_request("eth_blockNumber", []), 16)
+                self._finalized_block = head - config.RPC_FINALITY_DEPTH
+            self._finalized_at = time.time()
+        return self._finalized_block
+
+    def _is_final(self, method: str, params: Any, result: Any) -> bool:
+        if method in STATIC_METHODS:
+            return True
+        if method in BLOCK_PARAM_METHODS:
+            position = BLOCK_PARAM_METHODS[method]
+            block = _block_number(params[position]) if len(params) > position else None
+            return block is not None and block <= self.finalized_block() and result is not None
+        if method in HASH_METHODS and isinstance(result, dict):
+            block = _block_number(result.get("blockNumber") or result.get("number"))
+            return block is not None and block <= self.finalized_block()
+        return False
+
+    def _get_logs(self, params: Any):
+        """
+        Answer eth_getLogs from logs cached per aligned chunk of logs_chunk_size blocks.
+
+        Windows of any size and alignment share the chunks they fully contain, so
+        re-scanning a range with different window sizes still hits the cache. On a
+        miss the missing chunks are requested whole in one call and stored.
+        """
+        log_filter = params[0]
+        from_block = _block_number(log_filter.get("fromBlock", "earliest"))
+        to_block = _block_number(log_filter.get("toBlock", "latest"))
+        if "blockHash" in log_filter or from_block is None or to_block is None or to_block < from_block:
+            return super().make_request("eth_getLogs", params)
+
+        namespace = self._namespace()
+        base_filter = {k: v for k, v in log_filter.items() if k not in ("fromBlock", "toBlock")}
+        chunks = range(from_block // self.logs_chunk_size, to_block // self.logs_chunk_size + 1)
+        keys = [RPCResponseCache.key(namespace, "eth_getLogs", [base_filter, chunk]) for chunk in chunks]
+        cached = self.cache.get_many(keys)
+        if all(logs is not None for logs in cached):
+            logs = [log for chunk_logs in cached for log in chunk_logs
+                    if from_block <= int(log["blockNumber"], 16) <= to_block]
+            return {"jsonrpc": "2.0", "id": next(self.request_counter), "result": logs}
+
+        if to_block > self.finalized_block():
+            return super().make_request("eth_getLogs", params)
+
+        # Request the missing chunks whole, so that they can all be stored
+        missing = [chunk for chunk, logs in zip(chunks, cached) if logs is None]
+        fetch_from = missing[0] * self.logs_chunk_size
+        fetch_to = min((missing[-1] + 1) * self.logs_chunk_size - 1, self.finalized_block())
+        response = super().make_request("eth_getLogs", [dict(log_filter, fromBlock=hex(fetch_from), toBlock=hex(fetch_to))])
+        if "error" in response:
+            # e.g. too many results for the widened range
+            return super().make_request("eth_getLogs", params)
+
+        fetched = {chunk: [] for chunk in missing if (chunk + 1) * self.logs_chunk_size - 1 <= fetch_to}
+        for log in response["result"]:
+            chunk = int(log["blockNumber"], 16) // self.logs_chunk_size
+            if chunk in fetched:
+                fetched[chunk].append(log)
+        self.cache.put_many([(keys[chunk - chunks.start], logs) for chunk, logs in fetched.items()], "eth_getLogs")
+
+        logs = []
+        for chunk, chunk_logs in zip(chunks, cached):
+            chunk_logs = fetched.get(chunk, chunk_logs)
+            if chunk_logs is None:
+                # Part of the last chunk is not final yet
+                chunk_logs = [log for log in response["result"] if int(log["blockNumber"], 16) // self.logs_chunk_size == chunk]
+            logs.extend(log for log in chunk_logs if from_block <= int(log["blockNumber"], 16) <= to_block)
+        return dict(response, result=logs)
+
+    def make_request(self, method, params):
+        if method == "eth_getLogs":
+            return self._get_logs(params)
+        cacheable = method in STATIC_METHODS or method in BLOCK_PARAM_METHODS or method in HASH_METHODS
+        if not cacheable:
+            return super().make_request(method, params)
+
+        key = RPCResponseCache.key(self._namespace(), method, params)
+        result = self.cache.get(key)
+        if result is not None:
+            return {"jsonrpc": "2.0", "id": next(self.request_counter), "result": result}
+
+        response = super().make_request(method, params)
+        if "error" not in response and self._is_final(method, params, response.get("result")):
+            self.cache.put(key, method, response["result"])
+        return response
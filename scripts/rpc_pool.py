@@ -0,0 +1,346 @@
+"""
+Pool of JSON-RPC endpoints with health-based routing, hedged eth_getLogs and per-endpoint rate limits.
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider
+
+import config
+from scripts.range_planner import is_result_limit_error
+from scripts.rpc_cache import CachingHTTPProvider
+
+
+# Methods whose slow requests are sent again to a second endpoint
+HEDGED_METHODS = {"eth_getLogs"}
+
+# Error messages of JSON-RPC errors that mean the endpoint throttled us rather than rejected the request
+THROTTLE_ERRORS = (
+    "rate limit",
+    "rate exceeded",
+    "too many requests",
+    "request limit",
+    "exceeded the quota",
+    "capacity exceeded",
+    "daily limit",
+)
+
+# Weight of the latest sample in the latency and error-rate moving averages
+EMA_ALPHA = 0.2
+
+# Latency samples kept per endpoint and method, and needed before their percentile is used
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+class EndpointError(Exception):
+    """The endpoint failed to answer: transport error, HTTP error or throttling."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_throttle_error(error: Any) -> bool:
+    """Return True if a JSON-RPC error object means the endpoint is rate limiting us."""
+    if isinstance(error, dict) and error.get("code") == 429:
+        return True
+    # Providers share -32005 between throttling and too many results, so only the message is matched
+    message = str(error.get("message", "") if isinstance(error, dict) else error)
+    if is_result_limit_error(Exception(message)):
+        return False
+    return any(marker in message.lower() for marker in THROTTLE_ERRORS)
+
+
+class Endpoint:
+    """Health statistics and token-bucket rate limit of one endpoint."""
+
+    def __init__(self, url: str, rate_limit: Optional[float] = None):
+        """
+        Args:
+            url: RPC endpoint
+            rate_limit: Requests per second allowed, None or 0 for no limit
+        """
+        self.url = url
+        self.rate_limit = rate_limit or None
+        self.lock = threading.Lock()
+        self.tokens = max(1.0, self.rate_limit or 0.0)
+        self.refilled_at = time.monotonic()
+        self.latency_ema = None
+        self.error_ema = 0.0
+        self.latencies = {}
+        self.requests = 0
+        self.errors = 0
+        self.hedges_won = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def _refill(self, now: float):
+        if self.rate_limit:
+            self.tokens = min(max(1.0, self.rate_limit), self.tokens + (now - self.refilled_at) * self.rate_limit)
+        self.refilled_at = now
+
+    def token_wait(self) -> float:
+        """Return the seconds until the rate limit allows a request."""
+        if not self.rate_limit:
+            return 0.0
+        with self.lock:
+            self._refill(time.monotonic())
+            return max(0.0, (1.0 - self.tokens) / self.rate_limit)
+
+    def acquire(self) -> float:
+        """Reserve a request and return the seconds to wait before sending it."""
+        if not self.rate_limit:
+            return 0.0
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1.0
+            return max(0.0, -self.tokens / self.rate_limit)
+
+    def score(self, now: float) -> float:
+        """Return the expected cost of a request; lower is healthier, endpoints without samples go first."""
+        latency = self.latency_ema or 0.0
+        return latency * (1.0 + 10.0 * self.error_ema) + max(0.0, self.cooldown_until - now) + self.token_wait()
+
+    def record_success(self, method: str, latency: float):
+        with self.lock:
+            self.requests += 1
+            self.consecutive_failures = 0
+            self.latency_ema = latency if self.latency_ema is None else \
+                (1 - EMA_ALPHA) * self.latency_ema + EMA_ALPHA * latency
+            self.error_ema = (1 - EMA_ALPHA) * self.error_ema
+            self.latencies.setdefault(method, deque(maxlen=LATENCY_WINDOW)).append(latency)
+
+    def record_failure(self, cooldown: float, retry_after: Optional[float] = None):
+        with self.lock:
+            self.requests += 1
+            self.errors += 1
+            self.consecutive_failures += 1
+            self.error_ema = (1 - EMA_ALPHA) * self.error_ema + EMA_ALPHA
+            # Back off exponentially on repeated failures, or as long as the endpoint asked
+            backoff = retry_after if retry_after is not None else min(cooldown, 0.5 * 2 ** (self.consecutive_failures - 1))
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + backoff)
+
+    def latency_percentile(self, method: str, percentile: float) -> Optional[float]:
+        """Return a percentile of the recent latencies of a method, or None without enough samples."""
+        with self.lock:
+            samples = list(self.latencies.get(method, ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return float(np.percentile(samples, percentile))
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            samples = list(itertools.chain.from_iterable(self.latencies.values()))
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "error_rate": self.errors / self.requests if self.requests else 0.0,
+                "latency_ema": self.latency_ema,
+                "latency_p50": float(np.percentile(samples, 50)) if samples else None,
+                "latency_p90": float(np.percentile(samples, 90)) if samples else None,
+                "hedges_won": self.hedges_won,
+                "cooling_down": self.cooldown_until > time.monotonic(),
+            }
+
+
+class RPCPool:
+    """
+    Routes JSON-RPC requests over several endpoints.
+
+    Each request goes to the endpoint with the lowest expected cost: its latency
+    moving average, inflated by its recent error rate, plus any time it still has
+    to wait for its rate limit or for a cooldown after failures. Transport errors,
+    HTTP errors and throttling responses put the endpoint in cooldown and the
+    request fails over to the next endpoint. eth_getLogs requests still running
+    after the primary endpoint's latency percentile are hedged: the same request
+    is sent to the second best endpoint and the first answer wins. JSON-RPC errors
+    about the request itself, such as too many results, are returned to the caller.
+    """
+
+    def __init__(self, endpoints: Optional[List[str]] = None, rate_limits: Optional[Dict[str, float]] = None,
+                 hedge_percentile: Optional[float] = None, hedge_delay: Optional[float] = None,
+                 cooldown: Optional[float] = None, timeout: Optional[float] = None, max_attempts: Optional[int] = None):
+        """
+        Args:
+            endpoints: RPC endpoints (defaults to config.RPC_ENDPOINTS)
+            rate_limits: Requests per second allowed by endpoint (defaults to config.RPC_RATE_LIMITS)
+            hedge_percentile: Latency percentile of the primary endpoint after which a request
+                is hedged (defaults to config.RPC_HEDGE_PERCENTILE)
+            hedge_delay: Seconds after which a request is hedged while the primary endpoint has
+                too few latency samples (defaults to config.RPC_HEDGE_DELAY)
+            cooldown: Longest cooldown in seconds of a failing endpoint (defaults to config.RPC_ENDPOINT_COOLDOWN)
+            timeout: HTTP timeout in seconds (defaults to config.RPC_TIMEOUT)
+            max_attempts: Endpoints tried before giving up (defaults to twice the number of endpoints)
+        """
+        endpoints = endpoints or config.RPC_ENDPOINTS
+        if not endpoints:
+            raise ValueError("No RPC endpoint configured")
+        rate_limits = config.RPC_RATE_LIMITS if rate_limits is None else rate_limits
+        self.endpoints = [Endpoint(url, rate_limits.get(url)) for url in endpoints]
+        self.hedge_percentile = hedge_percentile or config.RPC_HEDGE_PERCENTILE
+        self.hedge_delay = hedge_delay or config.RPC_HEDGE_DELAY
+        self.cooldown = cooldown or config.RPC_ENDPOINT_COOLDOWN
+        self.timeout = timeout or config.RPC_TIMEOUT
+        self.max_attempts = max_attempts or 2 * len(self.endpoints)
+        self.request_counter = itertools.count()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=4 * config.RPC_MAX_CONCURRENCY)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Hedged requests run here; abandoned ones keep their thread until they answer or time out
+        self._executor = ThreadPoolExecutor(max_workers=max(8, 4 * config.RPC_MAX_CONCURRENCY),
+                                            thread_name_prefix="rpc-pool")
+
+    def ranked(self, exclude: Optional[set] = None) -> List[Endpoint]:
+        """Return the endpoints from healthiest to least healthy."""
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if not exclude or e.url not in exclude]
+        return sorted(candidates, key=lambda e: e.score(now))
+
+    def _send(self, endpoint: Endpoint, payload: Any, method: str) -> Any:
+        """Post a payload to one endpoint, recording its latency or failure."""
+        wait_time = max(endpoint.acquire(), endpoint.cooldown_until - time.monotonic())
+        if wait_time > 0:
+            time.sleep(wait_time)
+        start = time.monotonic()
+        try:
+            response = self.session.post(endpoint.url, json=payload, timeout=self.timeout)
+            if response.status_code == 429 or response.status_code >= 500:
+                retry_after = response.headers.get("Retry-After")
+                raise EndpointError(f"HTTP {response.status_code} from {endpoint.url}",
+                                    float(retry_after) if retry_after and retry_after.isdigit() else None)
+            response.raise_for_status()
+            result = response.json()
+        except (requests.RequestException, ValueError) as e:
+            endpoint.record_failure(self.cooldown)
+            raise EndpointError(f"{endpoint.url}: {e}") from e
+        except EndpointError as e:
+            endpoint.record_failure(self.cooldown, e.retry_after)
+            raise
+
+        errors = [item.get("error") for item in (result if isinstance(result, list) else [result])
+                  if isinstance(item, dict) and "error" in item]
+        if any(is_throttle_error(error) for error in errors):
+            endpoint.record_failure(self.cooldown)
+            raise EndpointError(f"{endpoint.url} throttled the request: {errors[0]}")
+        endpoint.record_success(method, time.monotonic() - start)
+        return result
+
+    def _hedged(self, primary: Endpoint, secondary: Endpoint, payload: Any, method: str) -> Any:
+        """Send to primary, and to secondary too if primary is slower than its latency percentile."""
+        delay = primary.latency_percentile(method, self.hedge_percentile)
+        first = self._executor.submit(self._send, primary, payload, method)
+        done, _ = wait([first], timeout=self.hedge_delay if delay is None else delay)
+        if done:
+            return first.result()
+
+        second = self._executor.submit(self._send, secondary, payload, method)
+        futures = {first: primary, second: secondary}
+        last_error = None
+        while futures:
+            done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            for future in done:
+                endpoint = futures.pop(future)
+                try:
+                    result = future.result()
+                except EndpointError as e:
+                    last_error = e
+                    continue
+                if endpoint is secondary:
+                    with secondary.lock:
+                        secondary.hedges_won += 1
+                return result
+        raise last_error
+
+    def post(self, payload: Any, method: Optional[str] = None) -> Any:
+        """
+        Post a JSON-RPC request or batch to the healthiest endpoint, failing over on endpoint errors.
+
+        Args:
+            payload: JSON-RPC request object or list of request objects
+            method: Method used for latency statistics and hedging (defaults to the payload's
+                method, or "batch" for a batch)
+
+        Returns:
+            Decoded JSON response
+
+        Raises:
+            RuntimeError: If every attempt failed
+        """
+        if method is None:
+            method = payload["method"] if isinstance(payload, dict) else "batch"
+        tried = set()
+        last_error = None
+        for _ in range(self.max_attempts):
+            ranked = self.ranked(exclude=tried)
+            if not ranked:
+                # Every endpoint failed once; start another round
+                tried.clear()
+                ranked = self.ranked()
+            primary = ranked[0]
+            try:
+                if method in HEDGED_METHODS and len(ranked) > 1:
+                    return self._hedged(primary, ranked[1], payload, method)
+                return self._send(primary, payload, method)
+            except EndpointError as e:
+                last_error = e
+                tried.add(primary.url)
+        raise RuntimeError(f"JSON-RPC request failed on every endpoint after {self.max_attempts} attempts: {last_error}")
+
+    def request(self, method: str, params: Any) -> Dict[str, Any]:
+        """Send one JSON-RPC call and return its response object."""
+        return self.post({"jsonrpc": "2.0", "id": next(self.request_counter), "method": method, "params": params})
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return the health statistics of each endpoint."""
+        return {endpoint.url: endpoint.stats() for endpoint in self.endpoints}
+
+
+_POOL = None
+
+
+def get_rpc_pool() -> RPCPool:
+    """Return the shared pool over config.RPC_ENDPOINTS."""
+    global _POOL
+    if _POOL is None:
+        _POOL = RPCPool()
+    return _POOL
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """HTTPProvider sending its requests through an RPCPool instead of a single endpoint."""
+
+    def __init__(self, endpoint_uri: Optional[str] = None, pool: Optional[RPCPool] = None, **kwargs):
+        """
+        Args:
+            endpoint_uri: Name of the provider, used to key per-provider state such as the
+                response cache namespace (defaults to the pool's first endpoint)
+            pool: Endpoint pool (defaults to the shared pool over config.RPC_ENDPOINTS)
+            **kwargs: Passed to HTTPProvider
+        """
+        self.pool = pool or get_rpc_pool()
+        super().__init__(endpoint_uri or self.pool.endpoints[0].url, **kwargs)
+
+    def make_request(self, method, params):
+        return self.pool.request(method, params)
+
+    def make_batch_request(self, batch_requests):
+        payload = [{"jsonrpc": "2.0", "id": next(self.pool.request_counter), "method": method, "params": params}
+                   for method, params in batch_requests]
+        response = self.pool.post(payload)
+        if not isinstance(response, list):
+            return response
+        return sorted(response, key=lambda item: item.get("id", 0))
+
+
+class CachingPooledHTTPProvider(CachingHTTPProvider, PooledHTTPProvider):
+    """CachingHTTPProvider whose cache misses are sent through an RPCPool."""
@@ -0,0 +1,196 @@
+"""
+Time-weighted stake accounting for reward vaults.
+
+A user's stake is a step function of time that changes at each Staked/Withdrawn
+event. Its integral over a window (stake-seconds when time is a timestamp,
+stake-blocks when it is a block number) is read from two cumulative sums over
+the events sorted by key and time, so any window costs a binary search per key
+instead of a pass over the events.
+"""
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+STAKE_EPSILON = 1e-12  # Average stake, relative to a key's total staked and withdrawn volume, that is rounding noise
+
+
+def _factorize_keys(frame: pd.DataFrame, key_columns: List[str]) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Number the distinct key tuples of a frame.
+
+    Each column is factorized on its own and the codes are combined into one
+    integer, which is much faster than factorizing a MultiIndex of strings.
+
+    Returns:
+        Tuple of (code of each row, DataFrame of the distinct keys in code order)
+    """
+    combined = np.zeros(len(frame), dtype=np.int64)
+    uniques = []
+    for column in key_columns:
+        column_codes, column_uniques = pd.factorize(frame[column])
+        combined = combined * len(column_uniques) + column_codes
+        uniques.append((column_codes, column_uniques))
+    _, first_rows, codes = np.unique(combined, return_index=True, return_inverse=True)
+    keys = pd.DataFrame({
+        column: column_uniques[column_codes[first_rows]]
+        for column, (column_codes, column_uniques) in zip(key_columns, uniques)
+    })
+    return codes, keys
+
+
+class StakeIntegral:
+    """
+    Integral over time of the net position of each key, from sorted event arrays.
+
+    With events (x_i, a_i) of a key, the position at t is A(t) = sum of a_i over
+    x_i < t, and its integral up to t is F(t) = t * A(t) - sum of a_i * x_i over
+    x_i < t. Both sums are prefix sums of the sorted events of the key, so the integral
+    over [start, end) is F(end) - F(start) for every key at once.
+    """
+
+    def __init__(self, events: pd.DataFrame, key_columns: List[str], amount_column: str = "amount",
+                 time_column: str = "block_number"):
+        """
+        Args:
+            events: Decoded events with the key columns, the amount column and the time column
+            key_columns: Columns identifying a position (e.g. user_address and rv_address)
+            amount_column: Column holding the signed stake change
+            time_column: Column the stake is integrated over (block_number or timestamp);
+                an event counts from its own time onwards
+        """
+        self.key_columns = key_columns
+        codes, self.keys = _factorize_keys(events, key_columns)
+        num_keys = len(self.keys)
+
+        times = events[time_column].to_numpy(dtype=np.int64)
+        amounts = events[amount_column].to_numpy(dtype=np.float64)
+        order = np.lexsort((times, codes))
+        codes, times, amounts = codes[order], times[order], amounts[order]
+
+        # Times are shifted to start at 0 so that amount * time keeps its precision
+        self.origin = int(times.min()) if len(times) else 0
+        self.span = int(times.max()) - self.origin + 2 if len(times) else 1
+        relative_times = times - self.origin
+        self._sort_keys = codes.astype(np.int64) * self.span + relative_times
+        # Sums restart at each key: differences of sums running across every key would
+        # lose the precision of small positions next to large ones
+        self._amount_sums = np.concatenate([[0.0], pd.Series(amounts).groupby(codes).cumsum().to_numpy()])
+        self._weighted_sums = np.concatenate([[0.0], pd.Series(amounts * relative_times).groupby(codes)
+                                              .cumsum().to_numpy()])
+        self._key_starts = np.searchsorted(codes, np.arange(num_keys), side='left')
+        self._volumes = np.bincount(codes, weights=np.abs(amounts), minlength=num_keys)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _prefix_index(self, t: int) -> np.ndarray:
+        """Return, per key, the index in the sorted events of its first event at or after t."""
+        relative_t = min(max(t - self.origin, 0), self.span - 1)
+        query = np.arange(len(self.keys), dtype=np.int64) * self.span + relative_t
+        return np.searchsorted(self._sort_keys, query, side='left')
+
+    def _position_and_integral(self, t: int) -> Tuple[np.ndarray, np.ndarray]:
+        index = self._prefix_index(t)
+        has_events = index > self._key_starts
+        position = np.where(has_events, self._amount_sums[index], 0.0)
+        weighted = np.where(has_events, self._weighted_sums[index], 0.0)
+        return position, (t - self.origin) * position - weighted
+
+    def positions_at(self, t: int) -> np.ndarray:
+        """
+        Return the position of each key just before t.
+
+        Args:
+            t: Block number or timestamp
+
+        Returns:
+            Array aligned with self.keys
+        """
+        return self._position_and_integral(t)[0]
+
+    def integral(self, start: int, end: int) -> np.ndarray:
+        """
+        Return the integral of each key's position over [start, end).
+
+        Args:
+            start: First block number or timestamp of the window
+            end: End of the window (exclusive)
+
+        Returns:
+            Array aligned with self.keys
+        """
+        if end < start:
+            raise ValueError(f"Window end {end} is before its start {start}")
+        integral = self._position_and_integral(end)[1] - self._position_and_integral(start)[1]
+        # Rounding leaves withdrawn positions a tiny non-zero stake
+        integral[np.abs(integral) < STAKE_EPSILON * self._volumes * (end - start)] = 0.0
+        return integral
+
+
+class UserRewardsVaultStakeSeconds:
+    """
+    Time-weighted shares of users in reward vaults over arbitrary windows.
+
+    Positions are assumed non-negative, as they are on chain: a vault's total
+    stake integral is then the sum of its users' integrals.
+    """
+
+    def __init__(self, decoded_logs_df: pd.DataFrame, time_column: str = "block_number",
+                 rv_addresses: Optional[Iterable[str]] = None):
+        """
+        Args:
+            decoded_logs_df: Decoded Staked/Withdrawn logs with user_address, rv_address,
+                amount and the time column
+            time_column: block_number, or timestamp if the logs carry block timestamps
+            rv_addresses: Reward vaults to account for (defaults to every vault in the logs;
+                pass config.REWARD_VAULT_DIC.values() to restrict to the configured vaults)
+        """
+        if rv_addresses is not None:
+            rv_addresses = {a.lower() for a in rv_addresses}
+            decoded_logs_df = decoded_logs_df.loc[decoded_logs_df.rv_address.str.lower().isin(rv_addresses)]
+        self.time_column = time_column
+        self.stakes = StakeIntegral(decoded_logs_df, ["user_address", "rv_address"], "amount", time_column)
+        self._rv_codes, self.rv_addresses = pd.factorize(self.stakes.keys["rv_address"])
+
+    def shares(self, start: int, end: int) -> pd.DataFrame:
+        """
+        Compute each user's stake integral and time-weighted share of its vaults over [start, end).
+
+        Args:
+            start: First block number or timestamp of the window
+            end: End of the window (exclusive)
+
+        Returns:
+            DataFrame with user_address, rv_address, stake_integral, total_stake_integral,
+            time_weighted_share, avg_stake, start and end, for users with stake in the window
+        """
+        stake_integral = self.stakes.integral(start, end)
+        total_stake_integral = np.bincount(self._rv_codes, weights=stake_integral,
+                                           minlength=len(self.rv_addresses))[self._rv_codes]
+        active = stake_integral > 0
+
+        result = self.stakes.keys.loc[active].reset_index(drop=True)
+        result["stake_integral"] = stake_integral[active]
+        result["total_stake_integral"] = total_stake_integral[active]
+        result["time_weighted_share"] = result.stake_integral / result.total_stake_integral
+        result["avg_stake"] = result.stake_integral / (end - start) if end > start else 0.0
+        result["start"] = start
+        result["end"] = end
+        return result
+
+    def shares_over(self, windows: Iterable[Tuple[int, int]]) -> pd.DataFrame:
+        """
+        Compute time-weighted shares over several windows.
+
+        Args:
+            windows: (start, end) pairs
+
+        Returns:
+            The concatenated shares() of every window
+        """
+        frames = [self.shares(start, end) for start, end in windows]
+        if not frames:
+            return self.shares(0, 0)
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,387 @@
+"""
+Incremental state stores for validator-delegator and user-rewards vault positions.
+
+Instead of re-aggregating every decoded log since genesis, a store keeps the net
+position of each key and the last applied block, and only applies the deltas of
+newer blocks. Each update is appended to a journal of net deltas, which is
+folded into the snapshot once it grows, so saving costs time proportional to
+the new events as well.
+"""
+import json
+import os
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import config
+from scripts.checkpoints import CheckpointManifest
+from scripts.process_user_rewards_vault import decode_user_rewards_vault_batch
+from scripts.process_validator_delegator import decode_validator_delegator_batch
+from scripts.utils import iter_raw_log_shards, load_raw_log_table
+
+
+# Positions whose absolute value falls below this are considered closed
+POSITION_EPSILON = 1e-12
+
+
+def decode_saved_logs(data_type: str, decode_batch: Callable, from_block: int,
+                      to_block: Optional[int] = None) -> Tuple[Optional[pd.DataFrame], int]:
+    """
+    Decode the checkpointed raw logs of a data type from from_block onwards.
+
+    Only the contiguous range recorded in the checkpoint manifest is complete
+    enough to apply, so to_block is capped at its last block.
+
+    Args:
+        data_type: Raw log data type (see config.RAW_LOGS_DIR)
+        decode_batch: Batch decoder of the data type
+        from_block: First block to decode
+        to_block: Last block to decode (defaults to the last saved block)
+
+    Returns:
+        Tuple of (decoded logs, last block covered); decoded logs is None if there
+        is nothing saved after from_block
+    """
+    saved_to_block = CheckpointManifest(data_type).last_block()
+    to_block = saved_to_block if to_block is None else min(to_block, saved_to_block)
+    if to_block < from_block:
+        return None, to_block
+    raw_logs = load_raw_log_table(data_type, from_block=from_block, to_block=to_block)
+    result = decode_batch(raw_logs)
+    return (result[0] if isinstance(result, tuple) else result), to_block
+
+
+def user_rv_state_frame(positions: pd.DataFrame, block_number: int,
+                        totals: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """
+    Format user-rewards vault positions like calculate_user_rv_state.
+
+    Args:
+        positions: DataFrame with user_address, rv_address and amount
+        block_number: Block the positions are valid at
+        totals: Total positive stake per reward vault (computed from positions if None)
+
+    Returns:
+        DataFrame with user_address, rv_address, amount, total_stake, user_rv_share and block_number
+    """
+    state = positions.loc[positions.amount > 0].reset_index(drop=True)
+    if totals is None:
+        totals = state.groupby('rv_address').amount.sum()
+    state['total_stake'] = state.rv_address.map(totals)
+    state['user_rv_share'] = state.amount / state.total_stake
+    state['block_number'] = block_number
+    return state
+
+
+class IncrementalPositionStore:
+    """
+    Net positions keyed by a tuple of columns, updated from decoded deltas.
+
+    When total_key_index is set, the sum of the positive positions sharing that key
+    element (e.g. the total stake of a reward vault) is maintained alongside.
+    """
+
+    def __init__(self, name: str, directory: str, key_columns: List[str], amount_column: str,
+                 total_key_index: Optional[int] = None, max_journal_files: int = 24):
+        """
+        Args:
+            name: Name of the state, used for its file names
+            directory: Directory holding the snapshot and journal
+            key_columns: Columns identifying a position
+            amount_column: Column holding the signed delta
+            total_key_index: Index in key_columns of the key totals are kept for, or None
+            max_journal_files: Number of journal files after which save() compacts
+        """
+        self.name = name
+        self.directory = directory
+        self.key_columns = key_columns
+        self.amount_column = amount_column
+        self.total_key_index = total_key_index
+        self.max_journal_files = max_journal_files
+        self.positions = {}
+        self.totals = {}
+        self.last_block = 0
+        self.journal = []
+        self.journal_sequence = 0
+        self.pending_deltas = {}
+        self.load()
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.directory, f"{self.name}_meta.json")
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, f"{self.name}_snapshot.parquet")
+
+    def _apply_delta(self, key: Tuple, delta: float):
+        old = self.positions.get(key, 0.0)
+        new = old + delta
+        if abs(new) < POSITION_EPSILON:
+            self.positions.pop(key, None)
+            new = 0.0
+        else:
+            self.positions[key] = new
+        if self.total_key_index is not None:
+            total_key = key[self.total_key_index]
+            total = self.totals.get(total_key, 0.0) + max(new, 0.0) - max(old, 0.0)
+            if total < POSITION_EPSILON:
+                self.totals.pop(total_key, None)
+            else:
+                self.totals[total_key] = total
+
+    def _apply_frame(self, deltas: pd.DataFrame):
+        for *key, delta in deltas.itertuples(index=False, name=None):
+            self._apply_delta(tuple(key), delta)
+
+    def apply(self, decoded_logs_df: pd.DataFrame, through_block: Optional[int] = None) -> int:
+        """
+        Apply the decoded logs of blocks after the last applied block.
+
+        Logs of a block must all be applied in the same call: rows at or before
+        last_block are ignored, which makes re-applying an overlapping batch safe.
+
+        Args:
+            decoded_logs_df: Decoded logs with block_number, the key columns and the amount column
+            through_block: Last block the batch is complete for, so empty blocks after
+                its last log count as applied (defaults to the batch's last block)
+
+        Returns:
+            Number of rows applied
+        """
+        new_logs = decoded_logs_df.loc[decoded_logs_df.block_number > self.last_block]
+        if through_block is not None:
+            new_logs = new_logs.loc[new_logs.block_number <= through_block]
+        if new_logs.empty:
+            if through_block is not None:
+                self.last_block = max(self.last_block, through_block)
+            return 0
+        deltas = new_logs.groupby(self.key_columns, sort=False)[self.amount_column].sum()
+        for key, delta in deltas.items():
+            key = key if isinstance(key, tuple) else (key,)
+            self._apply_delta(key, delta)
+            self.pending_deltas[key] = self.pending_deltas.get(key, 0.0) + delta
+        self.last_block = max(int(new_logs.block_number.max()), through_block or 0)
+        return len(new_logs)
+
+    def rollback(self, to_block: int, decoded_logs_df: pd.DataFrame) -> int:
+        """
+        Undo the logs of the blocks after to_block, e.g. after a chain reorganization.
+
+        Args:
+            to_block: Last block to keep
+            decoded_logs_df: Decoded logs of the blocks after to_block that were applied
+
+        Returns:
+            Number of rows undone
+        """
+        if to_block >= self.last_block:
+            return 0
+        undone = decoded_logs_df.loc[(decoded_logs_df.block_number > to_block) &
+                                     (decoded_logs_df.block_number <= self.last_block)]
+        if not undone.empty:
+            deltas = undone.groupby(self.key_columns, sort=False)[self.amount_column].sum()
+            for key, delta in deltas.items():
+                key = key if isinstance(key, tuple) else (key,)
+                self._apply_delta(key, -delta)
+                self.pending_deltas[key] = self.pending_deltas.get(key, 0.0) - delta
+        self.last_block = to_block
+        return len(undone)
+
+    def update_from_raw_logs(self, data_type: str, decode_batch: Callable, to_block: Optional[int] = None) -> int:
+        """
+        Decode and apply the checkpointed raw logs saved after the last applied block.
+
+        Args:
+            data_type: Raw log data type (see config.RAW_LOGS_DIR)
+            decode_batch: Batch decoder of the data type
+            to_block: Last block to apply (defaults to the last saved block)
+
+        Returns:
+            Number of rows applied
+        """
+        decoded_logs_df, to_block = decode_saved_logs(data_type, decode_batch, self.last_block + 1, to_block)
+        if decoded_logs_df is None:
+            return 0
+        return self.apply(decoded_logs_df, through_block=to_block)
+
+    def rebuild(self, data_type: str, decode_batch: Callable) -> int:
+        """
+        Recompute the state from the saved raw logs up to its last applied block and save it.
+
+        Needed when logs of blocks already applied are added to the raw logs, e.g.
+        the logs of reward vaults discovered after those blocks were fetched. The
+        raw logs are decoded and applied one shard at a time, so the history is
+        never held in memory at once.
+
+        Args:
+            data_type: Raw log data type (see config.RAW_LOGS_DIR)
+            decode_batch: Batch decoder of the data type
+
+        Returns:
+            Number of rows applied
+        """
+        to_block = self.last_block
+        self.positions = {}
+        self.totals = {}
+        self.pending_deltas = {}
+        self.last_block = 0
+        applied = 0
+        for raw_logs in iter_raw_log_shards(data_type, 0, to_block):
+            result = decode_batch(raw_logs)
+            decoded_logs_df = result[0] if isinstance(result, tuple) else result
+            applied += self.apply(decoded_logs_df)
+        self.last_block = max(self.last_block, to_block)
+        self.compact()
+        return applied
+
+    def positions_frame(self) -> pd.DataFrame:
+        """Return every open position as a DataFrame with the key columns and the amount column."""
+        rows = [key + (amount,) for key, amount in self.positions.items()]
+        return pd.DataFrame(rows, columns=self.key_columns + [self.amount_column])
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return the current state as a DataFrame."""
+        return self.positions_frame()
+
+    def load(self):
+        """Load the snapshot and replay the journal, starting empty if nothing was saved."""
+        self.positions = {}
+        self.totals = {}
+        self.pending_deltas = {}
+        if not os.path.exists(self.meta_path):
+            self.last_block = 0
+            self.journal = []
+            self.journal_sequence = 0
+            return
+        with open(self.meta_path, 'r') as f:
+            meta = json.load(f)
+        self.last_block = meta["last_block"]
+        self.journal = meta["journal"]
+        self.journal_sequence = meta.get("journal_sequence", len(self.journal))
+        if meta.get("snapshot"):
+            self._apply_frame(pd.read_parquet(self.snapshot_path))
+        for filename in self.journal:
+            self._apply_frame(pd.read_parquet(os.path.join(self.directory, filename)))
+
+    def _write_meta(self, snapshot: bool):
+        tmp_filename = self.meta_path + ".tmp"
+        with open(tmp_filename, 'w') as f:
+            json.dump({
+                "last_block": self.last_block,
+                "snapshot": snapshot,
+                "journal": self.journal,
+                "journal_sequence": self.journal_sequence,
+                "saved_at": datetime.now().strftime("%Y-%m-%d_%H:%M:%S"),
+            }, f, indent=2)
+        os.replace(tmp_filename, self.meta_path)
+
+    def save(self):
+        """
+        Persist the deltas applied since the last save as a journal file.
+
+        The journal is compacted into the snapshot once it holds more than
+        max_journal_files files.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if len(self.journal) >= self.max_journal_files:
+            self.compact()
+            return
+        if self.pending_deltas:
+            # Numbered rather than named after last_block alone, which a rollback can bring back
+            # to a block already saved
+            filename = f"{self.name}_journal_{self.journal_sequence:06d}_{self.last_block:010d}.parquet"
+            self.journal_sequence += 1
+            rows = [key + (delta,) for key, delta in self.pending_deltas.items()]
+            pd.DataFrame(rows, columns=self.key_columns + [self.amount_column]).to_parquet(
+                os.path.join(self.directory, filename), index=False)
+            self.journal.append(filename)
+            self.pending_deltas = {}
+        self._write_meta(snapshot=os.path.exists(self.snapshot_path))
+
+    def compact(self):
+        """Write the full positions as the snapshot and drop the journal."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_filename = self.snapshot_path + ".tmp"
+        self.positions_frame().to_parquet(tmp_filename, index=False)
+        os.replace(tmp_filename, self.snapshot_path)
+        old_journal = self.journal
+        self.journal = []
+        self.pending_deltas = {}
+        self._write_meta(snapshot=True)
+        for filename in old_journal:
+            os.remove(os.path.join(self.directory, filename))
+
+
+class ValidatorDelegatorState(IncrementalPositionStore):
+    """BGT delegated by each delegator to each validator."""
+
+    def __init__(self, directory: Optional[str] = None, **kwargs):
+        super().__init__(
+            name="validator_delegator_state",
+            directory=directory or os.path.join(config.PROCESSED_DATA_DIR['validator_delegator'], 'states'),
+            key_columns=["validator_address", "delegator_address"],
+            amount_column="amount_bgt_delegated",
+            **kwargs
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return the positive delegations, like the notebooks' groupby of decoded logs."""
+        state = self.positions_frame()
+        return state.loc[state.amount_bgt_delegated > 0].reset_index(drop=True)
+
+
+class UserRewardsVaultState(IncrementalPositionStore):
+    """Stake of each user in each reward vault, with per-vault totals."""
+
+    def __init__(self, directory: Optional[str] = None, **kwargs):
+        super().__init__(
+            name="user_rewards_vault_state",
+            directory=directory or os.path.join(config.PROCESSED_DATA_DIR['user_rewards_vault'], 'states'),
+            key_columns=["user_address", "rv_address"],
+            amount_column="amount",
+            total_key_index=1,
+            **kwargs
+        )
+
+    def total_stake(self, rv_address: str) -> float:
+        """Return the total positive stake of a reward vault."""
+        return self.totals.get(rv_address, 0.0)
+
+    def user_rv_share(self, user_address: str, rv_address: str) -> float:
+        """Return a user's share of a reward vault."""
+        amount = self.positions.get((user_address, rv_address), 0.0)
+        total = self.totals.get(rv_address, 0.0)
+        return amount / total if amount > 0 and total > 0 else 0.0
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Return the state in the format of calculate_user_rv_state.
+
+        Shares are read from the maintained vault totals instead of re-merging a
+        groupby of every position.
+        """
+        return user_rv_state_frame(self.positions_frame(), self.last_block, self.totals)
+
+
+def refresh_states(to_block: Optional[int] = None) -> Tuple[ValidatorDelegatorState, UserRewardsVaultState]:
+    """
+    Bring both position states up to date with the checkpointed raw logs and save them.
+
+    Args:
+        to_block: Last block to apply (defaults to the last saved block)
+
+    Returns:
+        Tuple of (validator-delegator state, user-rewards vault state)
+    """
+    vd_state = ValidatorDelegatorState()
+    applied = vd_state.update_from_raw_logs("validator_delegator", decode_validator_delegator_batch, to_block)
+    vd_state.save()
+    print(f"Applied {applied} validator-delegator logs up to block {vd_state.last_block}")
+
+    urv_state = UserRewardsVaultState()
+    applied = urv_state.update_from_raw_logs("user_rewards_vault", decode_user_rewards_vault_batch, to_block)
+    urv_state.save()
+    print(f"Applied {applied} user-rewards vault logs up to block {urv_state.last_block}")
+    return vd_state, urv_state
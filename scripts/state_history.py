@@ -0,0 +1,321 @@
+"""
+Point-in-time queries over validator-delegator and user-rewards vault positions.
+
+History is split into intervals of snapshot_interval blocks. For every interval
+holding at least one log, the store keeps a snapshot of the positions before the
+interval starts and the block-sorted deltas of the interval. state_at(block)
+loads the nearest snapshot and replays at most one interval of deltas, so its
+latency does not depend on how deep in history the block is.
+"""
+import json
+import os
+from bisect import bisect_right
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import config
+from scripts.process_user_rewards_vault import decode_user_rewards_vault_batch
+from scripts.process_validator_delegator import decode_validator_delegator_batch
+from scripts.state import POSITION_EPSILON, decode_saved_logs, user_rv_state_frame
+
+
+class StateHistory:
+    """
+    Snapshots every snapshot_interval blocks plus block-sorted deltas between them.
+    """
+
+    def __init__(self, name: str, directory: str, key_columns: List[str], amount_column: str,
+                 snapshot_interval: Optional[int] = None):
+        """
+        Args:
+            name: Name of the history, used for its file names
+            directory: Directory holding the snapshots and deltas
+            key_columns: Columns identifying a position
+            amount_column: Column holding the signed delta
+            snapshot_interval: Blocks per interval (defaults to config.STATE_SNAPSHOT_INTERVAL;
+                an existing history keeps the interval it was built with)
+        """
+        self.name = name
+        self.directory = directory
+        self.key_columns = key_columns
+        self.amount_column = amount_column
+        self.snapshot_interval = snapshot_interval or config.STATE_SNAPSHOT_INTERVAL
+        self.last_block = 0
+        self.intervals = []
+        self._positions = None
+        self.load()
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.directory, f"{self.name}_history.json")
+
+    def _snapshot_path(self, interval: int) -> str:
+        return os.path.join(self.directory, f"{self.name}_snapshot_{interval * self.snapshot_interval:010d}.parquet")
+
+    def _deltas_path(self, interval: int) -> str:
+        return os.path.join(self.directory, f"{self.name}_deltas_{interval * self.snapshot_interval:010d}.parquet")
+
+    def load(self):
+        """Load the history index, starting empty if nothing was saved."""
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+            self.last_block = meta["last_block"]
+            self.snapshot_interval = meta["snapshot_interval"]
+            self.intervals = meta["intervals"]
+        self._positions = None
+
+    def _save_meta(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_filename = self.meta_path + ".tmp"
+        with open(tmp_filename, 'w') as f:
+            json.dump({
+                "last_block": self.last_block,
+                "snapshot_interval": self.snapshot_interval,
+                "intervals": self.intervals,
+            }, f, indent=2)
+        os.replace(tmp_filename, self.meta_path)
+
+    def _write_parquet(self, frame: pd.DataFrame, path: str):
+        tmp_filename = path + ".tmp"
+        frame.to_parquet(tmp_filename, index=False)
+        os.replace(tmp_filename, path)
+
+    def _empty_positions(self) -> pd.Series:
+        index = pd.MultiIndex.from_arrays([[] for _ in self.key_columns], names=self.key_columns)
+        return pd.Series([], index=index, dtype=float, name=self.amount_column)
+
+    def _to_series(self, frame: pd.DataFrame) -> pd.Series:
+        if frame.empty:
+            return self._empty_positions()
+        return frame.groupby(self.key_columns, sort=False)[self.amount_column].sum()
+
+    def _add(self, positions: pd.Series, deltas: pd.DataFrame) -> pd.Series:
+        """Add net deltas to positions, dropping closed positions."""
+        if deltas.empty:
+            return positions
+        positions = positions.add(self._to_series(deltas), fill_value=0)
+        return positions[positions.abs() >= POSITION_EPSILON]
+
+    def _to_frame(self, positions: pd.Series) -> pd.DataFrame:
+        if positions.empty:
+            return pd.DataFrame(columns=self.key_columns + [self.amount_column])
+        return positions.rename(self.amount_column).reset_index()
+
+    def _read_deltas(self, interval: int, from_block: Optional[int] = None,
+                     to_block: Optional[int] = None) -> pd.DataFrame:
+        filters = []
+        if from_block is not None:
+            filters.append(('block_number', '>=', from_block))
+        if to_block is not None:
+            filters.append(('block_number', '<=', to_block))
+        return pd.read_parquet(self._deltas_path(interval), filters=filters or None)
+
+    def _latest_positions(self) -> pd.Series:
+        """Return the positions after the last applied block, computed once and kept up to date."""
+        if self._positions is None:
+            self._positions = self._series_at(self.last_block)
+        return self._positions
+
+    def _series_at(self, block: int) -> pd.Series:
+        index = bisect_right(self.intervals, block // self.snapshot_interval) - 1
+        if index < 0:
+            return self._empty_positions()
+        interval = self.intervals[index]
+        positions = self._to_series(pd.read_parquet(self._snapshot_path(interval)))
+        return self._add(positions, self._read_deltas(interval, to_block=block))
+
+    def extend(self, decoded_logs_df: pd.DataFrame, through_block: Optional[int] = None) -> int:
+        """
+        Append the decoded logs of blocks after the last recorded block.
+
+        Args:
+            decoded_logs_df: Decoded logs with block_number, the key columns and the amount column
+            through_block: Last block the batch is complete for (defaults to the batch's last block)
+
+        Returns:
+            Number of rows recorded
+        """
+        columns = ["block_number"] + self.key_columns + [self.amount_column]
+        new_logs = decoded_logs_df.loc[decoded_logs_df.block_number > self.last_block, columns]
+        if through_block is not None:
+            new_logs = new_logs.loc[new_logs.block_number <= through_block]
+        new_logs = new_logs.sort_values("block_number", kind="stable")
+
+        positions = self._latest_positions()
+        os.makedirs(self.directory, exist_ok=True)
+        for interval, deltas in new_logs.groupby(new_logs.block_number // self.snapshot_interval, sort=True):
+            interval = int(interval)
+            if self.intervals and interval == self.intervals[-1]:
+                # Rows after last_block were written by an extend that stopped before saving the meta
+                deltas = pd.concat([self._read_deltas(interval, to_block=self.last_block), deltas], ignore_index=True)
+            else:
+                # The positions before this interval become its snapshot
+                self._write_parquet(self._to_frame(positions), self._snapshot_path(interval))
+                self.intervals.append(interval)
+            self._write_parquet(deltas.reset_index(drop=True), self._deltas_path(interval))
+            positions = self._add(positions, deltas.loc[deltas.block_number > self.last_block])
+
+        self._positions = positions
+        if not new_logs.empty:
+            self.last_block = int(new_logs.block_number.iloc[-1])
+        if through_block is not None:
+            self.last_block = max(self.last_block, through_block)
+        self._save_meta()
+        return len(new_logs)
+
+    def rollback(self, to_block: int) -> int:
+        """
+        Drop the deltas of the blocks after to_block, e.g. after a chain reorganization.
+
+        Args:
+            to_block: Last block to keep
+
+        Returns:
+            Number of rows dropped
+        """
+        if to_block >= self.last_block:
+            return 0
+        num_dropped = 0
+        while self.intervals and self.intervals[-1] * self.snapshot_interval > to_block:
+            interval = self.intervals.pop()
+            num_dropped += len(self._read_deltas(interval))
+            os.remove(self._snapshot_path(interval))
+            os.remove(self._deltas_path(interval))
+        if self.intervals:
+            interval = self.intervals[-1]
+            deltas = self._read_deltas(interval)
+            kept = deltas.loc[deltas.block_number <= to_block]
+            if len(kept) < len(deltas):
+                num_dropped += len(deltas) - len(kept)
+                self._write_parquet(kept.reset_index(drop=True), self._deltas_path(interval))
+        self.last_block = to_block
+        self._positions = None
+        self._save_meta()
+        return num_dropped
+
+    def update_from_raw_logs(self, data_type: str, decode_batch: Callable, to_block: Optional[int] = None) -> int:
+        """
+        Decode and record the checkpointed raw logs saved after the last recorded block.
+
+        Args:
+            data_type: Raw log data type (see config.RAW_LOGS_DIR)
+            decode_batch: Batch decoder of the data type
+            to_block: Last block to record (defaults to the last saved block)
+
+        Returns:
+            Number of rows recorded
+        """
+        decoded_logs_df, to_block = decode_saved_logs(data_type, decode_batch, self.last_block + 1, to_block)
+        if decoded_logs_df is None:
+            return 0
+        return self.extend(decoded_logs_df, through_block=to_block)
+
+    def format_state(self, positions: pd.DataFrame, block: int) -> pd.DataFrame:
+        """Format raw positions for callers; subclasses add derived columns."""
+        return positions
+
+    def state_at(self, block: int) -> pd.DataFrame:
+        """
+        Return the positions after all logs up to and including block.
+
+        Args:
+            block: Block number, at most last_block
+
+        Returns:
+            DataFrame of positions, formatted by format_state
+        """
+        if block > self.last_block:
+            raise ValueError(f"{self.name} history only goes up to block {self.last_block}")
+        return self.format_state(self._to_frame(self._series_at(block)), block)
+
+    def iter_states_at(self, blocks: List[int]) -> Iterator[Tuple[int, pd.DataFrame]]:
+        """
+        Return the state at many blocks, reusing each state to compute the next one.
+
+        The deltas of the current interval are read once and consecutive blocks
+        within it only replay the deltas between them instead of starting again
+        from the snapshot.
+
+        Args:
+            blocks: Block numbers, at most last_block
+
+        Yields:
+            (block, state) tuples in ascending block order
+        """
+        positions = None
+        current_index = None
+        deltas = None
+        replayed = 0
+        for block in sorted(set(blocks)):
+            if block > self.last_block:
+                raise ValueError(f"{self.name} history only goes up to block {self.last_block}")
+            interval_index = bisect_right(self.intervals, block // self.snapshot_interval) - 1
+            if positions is None or interval_index != current_index:
+                current_index = interval_index
+                replayed = 0
+                positions, deltas = {}, None
+                if interval_index >= 0:
+                    interval = self.intervals[interval_index]
+                    snapshot = self._to_frame(self._to_series(pd.read_parquet(self._snapshot_path(interval))))
+                    positions = dict(zip(snapshot[self.key_columns].itertuples(index=False, name=None),
+                                         snapshot[self.amount_column]))
+                    deltas = self._read_deltas(interval)
+            if deltas is not None:
+                # Positions are kept in a dict, as the few deltas between two blocks are
+                # much cheaper to apply one by one than by aligning indexes
+                end = int(np.searchsorted(deltas.block_number.to_numpy(), block, side='right'))
+                for *key, delta in deltas.iloc[replayed:end][self.key_columns + [self.amount_column]] \
+                        .itertuples(index=False, name=None):
+                    key = tuple(key)
+                    amount = positions.get(key, 0.0) + delta
+                    if abs(amount) < POSITION_EPSILON:
+                        positions.pop(key, None)
+                    else:
+                        positions[key] = amount
+                replayed = end
+            frame = pd.DataFrame(list(positions), columns=self.key_columns)
+            frame[self.amount_column] = np.fromiter(positions.values(), dtype=np.float64, count=len(positions))
+            yield block, self.format_state(frame, block)
+
+
+class ValidatorDelegatorHistory(StateHistory):
+    """Point-in-time BGT delegations."""
+
+    def __init__(self, directory: Optional[str] = None, **kwargs):
+        super().__init__(
+            name="validator_delegator",
+            directory=directory or os.path.join(config.PROCESSED_DATA_DIR['validator_delegator'], 'history'),
+            key_columns=["validator_address", "delegator_address"],
+            amount_column="amount_bgt_delegated",
+            **kwargs
+        )
+
+    def format_state(self, positions: pd.DataFrame, block: int) -> pd.DataFrame:
+        return positions.loc[positions.amount_bgt_delegated > 0].reset_index(drop=True)
+
+    def update(self, to_block: Optional[int] = None) -> int:
+        """Record the checkpointed validator-delegator logs saved since the last update."""
+        return self.update_from_raw_logs("validator_delegator", decode_validator_delegator_batch, to_block)
+
+
+class UserRewardsVaultHistory(StateHistory):
+    """Point-in-time reward vault stakes and shares."""
+
+    def __init__(self, directory: Optional[str] = None, **kwargs):
+        super().__init__(
+            name="user_rewards_vault",
+            directory=directory or os.path.join(config.PROCESSED_DATA_DIR['user_rewards_vault'], 'history'),
+            key_columns=["user_address", "rv_address"],
+            amount_column="amount",
+            **kwargs
+        )
+
+    def format_state(self, positions: pd.DataFrame, block: int) -> pd.DataFrame:
+        return user_rv_state_frame(positions, block)
+
+    def update(self, to_block: Optional[int] = None) -> int:
+        """Record the checkpointed user-rewards vault logs saved since the last update."""
+        return self.update_from_raw_logs("user_rewards_vault", decode_user_rewards_vault_batch, to_block)
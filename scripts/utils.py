@@ -2,29 +2,80 @@
 Utility functions for the Berachain data processing system.
 """
 import csv
+import hashlib
 import json
 import os
 import pickle
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Iterator, Optional, Tuple
 import shutil
 
 from web3 import Web3
+import pyarrow as pa
 import requests
 
 import config
+from scripts.checkpoints import CheckpointManifest
+from scripts.log_store import logs_to_table, read_log_table, table_to_logs, write_log_table
+from scripts.range_planner import AdaptiveRangePlanner, density_key, save_log_density
+from scripts.rpc_pool import CachingPooledHTTPProvider, PooledHTTPProvider
 
 
-def setup_web3():
-    """Initialize and return a Web3 instance."""
-    return Web3(Web3.HTTPProvider(config.RPC_ENDPOINT))
+def setup_web3(use_cache: Optional[bool] = None):
+    """
+    Initialize and return a Web3 instance.
+
+    Requests are routed over the endpoints of config.RPC_ENDPOINTS by the shared RPC pool.
+
+    Args:
+        use_cache: Answer requests on finalized data from the local response cache
+            (defaults to config.RPC_CACHE_ENABLED)
+    """
+    if use_cache is None:
+        use_cache = config.RPC_CACHE_ENABLED
+    if use_cache:
+        return Web3(CachingPooledHTTPProvider())
+    return Web3(PooledHTTPProvider())
+
 
+_ABI_CACHE = {}
 
-def get_contract_abi(abi_url: str) -> dict:
-    """Fetch contract ABI from URL."""
-    response = requests.get(abi_url)
-    return response.json()
+
+def get_contract_abi(abi_url: str, refresh: bool = False) -> dict:
+    """
+    Fetch contract ABI from URL.
+    
+    ABIs are cached in memory and on disk in config.ABI_CACHE_DIR, keyed by URL,
+    so they are downloaded once and decoding works offline afterwards.
+    
+    Args:
+        abi_url: URL of the ABI JSON file (ContractConfig.abi_url)
+        refresh: Whether to download the ABI again even if it is cached
+        
+    Returns:
+        Contract ABI
+    """
+    if not refresh and abi_url in _ABI_CACHE:
+        return _ABI_CACHE[abi_url]
+    
+    cache_filename = os.path.join(config.ABI_CACHE_DIR, hashlib.sha1(abi_url.encode()).hexdigest() + ".json")
+    if not refresh and os.path.exists(cache_filename):
+        with open(cache_filename, 'r') as f:
+            abi = json.load(f)["abi"]
+    else:
+        response = requests.get(abi_url)
+        response.raise_for_status()
+        abi = response.json()
+        os.makedirs(config.ABI_CACHE_DIR, exist_ok=True)
+        tmp_filename = cache_filename + ".tmp"
+        with open(tmp_filename, 'w') as f:
+            json.dump({"abi_url": abi_url, "abi": abi}, f)
+        os.replace(tmp_filename, cache_filename)
+    
+    _ABI_CACHE[abi_url] = abi
+    return abi
 
 
 def get_contract(web3: Web3, address: str, abi_url: str):
@@ -33,10 +84,60 @@ def get_contract(web3: Web3, address: str, abi_url: str):
     return web3.eth.contract(address=address, abi=abi)
 
 
-def get_logs(web3: Web3, contract_address: str | List[str], event_signature: str | List[str], 
-             from_block: int = 0, to_block: Optional[int] = None) -> List[Dict]:
+def _build_log_filter(contract_address: str | List[str], event_signature: str | List[str],
+                      from_block: int, to_block: int) -> Dict:
+    """Build the eth_getLogs filter for a block window."""
+    # Convert single event signature to list for consistent handling
+    if isinstance(event_signature, str):
+        event_signatures = [event_signature]
+    else:
+        event_signatures = event_signature
+
+    return {
+        "fromBlock": from_block,
+        "toBlock": to_block,
+        "address": contract_address,  # This can be a single address or a list of addresses
+        "topics": [[sig for sig in event_signatures]]
+    }
+
+
+def fetch_log_window(web3: Web3, contract_address: str | List[str], event_signature: str | List[str],
+                     from_block: int, to_block: int, delay: float = 0) -> List[Dict]:
     """
-    Fetch logs for one or multiple event signatures and contract addresses in batches to avoid RPC limitations.
+    Fetch the logs of a single block window.
+    
+    Args:
+        web3: Web3 instance
+        contract_address: Single contract address or list of contract addresses to filter logs
+        event_signature: Single event signature or list of event signatures to filter logs
+        from_block: First block of the window
+        to_block: Last block of the window (inclusive)
+        delay: Seconds to wait before the request, used as retry backoff
+        
+    Returns:
+        List of log entries in block order
+    """
+    if delay:
+        time.sleep(delay)
+    return web3.eth.get_logs(_build_log_filter(contract_address, event_signature, from_block, to_block))
+
+
+def iter_log_windows(web3: Web3, contract_address: str | List[str], event_signature: str | List[str],
+                     from_block: int = 0, to_block: Optional[int] = None,
+                     batch_size: Optional[int] = None,
+                     max_workers: Optional[int] = None,
+                     max_retries: int = 5,
+                     adaptive: bool = True,
+                     verbose: bool = True) -> Iterator[Tuple[int, int, List[Dict]]]:
+    """
+    Fetch logs window by window, keeping up to max_workers eth_getLogs calls in flight.
+    
+    Window sizes come from an AdaptiveRangePlanner: windows rejected for returning
+    too many results are bisected, windows in sparse regions grow, and the density
+    estimate is saved per contract/topic set for the next scan. Windows are fetched
+    concurrently by a bounded thread pool but always yielded in block order and no
+    window is ever dropped: other errors are retried with exponential backoff and
+    raised once max_retries is exhausted.
     
     Args:
         web3: Web3 instance
@@ -44,45 +145,193 @@ def get_logs(web3: Web3, contract_address: str | List[str], event_signature: str
         event_signature: Single event signature or list of event signatures to filter logs
         from_block: Starting block number
         to_block: Ending block number (defaults to latest block)
+        batch_size: Initial blocks per window (defaults to the saved estimate or config.LOGS_BATCH_SIZE)
+        max_workers: Maximum concurrent requests (defaults to config.RPC_MAX_CONCURRENCY)
+        max_retries: Retries for a window failing with an error other than a size limit
+        adaptive: Whether to grow windows and use the saved density estimate; if False
+            windows keep batch_size blocks unless they have to be split
+        verbose: Whether to print a summary of the scan once it is done
         
-    Returns:
-        List of log entries
+    Yields:
+        (start_block, end_block, logs) tuples in block order
     """
     if to_block is None:
         to_block = web3.eth.get_block("latest")["number"]
-    
-    all_logs = []
-    current_block = from_block
-    end_block = to_block
-    batch_size = 10000  # Adjust based on RPC limitations
-    
-    # Convert single event signature to list for consistent handling
-    if isinstance(event_signature, str):
-        event_signatures = [event_signature]
+    if max_workers is None:
+        max_workers = config.RPC_MAX_CONCURRENCY
+    max_workers = max(max_workers, 1)
+
+    key = density_key(contract_address, event_signature)
+    if adaptive:
+        planner = AdaptiveRangePlanner.from_saved_state(key, from_block, to_block, batch_size)
     else:
-        event_signatures = event_signature
+        batch_size = batch_size or config.LOGS_BATCH_SIZE
+        planner = AdaptiveRangePlanner(from_block, to_block, batch_size, max_batch_size=batch_size)
+
+    # Cap how far fetching may run ahead of the oldest window not yielded yet
+    max_buffered = max_workers * 4
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+        completed = {}
+        attempts = {}
+        next_block = from_block
+
+        def fill() -> None:
+            while len(in_flight) < max_workers:
+                # Split and retried windows may be holding back the output: always dispatch them
+                if len(completed) >= max_buffered and not planner.retry_windows:
+                    return
+                window = planner.next_window()
+                if window is None:
+                    return
+                attempt = attempts.get(window, 0)
+                delay = 2 ** (attempt - 1) if attempt else 0
+                future = executor.submit(fetch_log_window, web3, contract_address, event_signature,
+                                         *window, delay)
+                in_flight[future] = window
+
+        fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                start, end = in_flight.pop(future)
+                try:
+                    logs = future.result()
+                except Exception as e:
+                    print(f"Error fetching logs from {start} to {end}: {e}")
+                    if planner.record_failure(start, end, e):
+                        continue
+                    attempts[(start, end)] = attempts.get((start, end), 0) + 1
+                    if attempts[(start, end)] > max_retries:
+                        raise
+                    planner.requeue(start, end)
+                    continue
+                if adaptive:
+                    planner.record_success(start, end, len(logs))
+                completed[start] = (end, logs)
+
+            # Hand back every window that is contiguous with what was already yielded
+            while next_block in completed:
+                end, logs = completed.pop(next_block)
+                yield next_block, end, logs
+                next_block = end + 1
+            fill()
+
+    if completed or planner.has_pending():
+        raise RuntimeError(f"Log scan stopped at block {next_block} before reaching block {to_block}")
+
+    if adaptive:
+        save_log_density(key, planner)
+    if verbose:
+        print(f"Scanned blocks {from_block} to {to_block} in {planner.num_requests} eth_getLogs calls "
+              f"({planner.num_splits} splits)")
+
+
+def iter_sharded_log_windows(web3: Web3, address_shards: List[Tuple[List[str], int]],
+                             event_signature: str | List[str], from_block: int, to_block: int,
+                             max_workers: Optional[int] = None,
+                             window_iterator: Optional[Callable] = None) -> Iterator[Tuple[int, int, List[Dict]]]:
+    """
+    Fetch the logs of many contracts split into address groups, merged into contiguous windows.
     
-    while current_block < end_block:
-        batch_end = min(current_block + batch_size, end_block)
-        try:
-            logs = web3.eth.get_logs({
-                "fromBlock": current_block,
-                "toBlock": batch_end,
-                "address": contract_address,  # This can be a single address or a list of addresses
-                "topics": [[sig for sig in event_signatures]]
+    Each group is scanned by its own window iterator from the block it starts at,
+    e.g. the creation block of its oldest contract, so no group is scanned over
+    blocks before its contracts existed. The group lagging furthest behind is
+    advanced first, and a window is yielded once every group has scanned it.
+    
+    Args:
+        web3: Web3 instance
+        address_shards: (contract addresses, first block) tuples
+        event_signature: Single event signature or list of event signatures to filter logs
+        from_block: Starting block number
+        to_block: Ending block number (inclusive)
+        max_workers: Maximum concurrent requests per group (defaults to config.RPC_MAX_CONCURRENCY)
+        window_iterator: Window iterator scanning a group (defaults to iter_log_windows)
+        
+    Yields:
+        (start_block, end_block, logs) tuples in block order, logs sorted by block and log index
+    """
+    window_iterator = window_iterator or iter_log_windows
+    shards = []
+    for addresses, start_block in address_shards:
+        start = max(from_block, start_block)
+        if addresses and start <= to_block:
+            shards.append({
+                "windows": window_iterator(web3, addresses, event_signature, start, to_block, max_workers=max_workers),
+                "progress": start - 1,
             })
-            all_logs.extend(logs)
-        except Exception as e:
-            print(f"Error fetching logs from {current_block} to {batch_end}: {e}")
-            # Reduce batch size on error
-            batch_size = max(batch_size // 2, 1000)
-            continue
+    
+    pending_logs = []
+    next_block = from_block
+    while next_block <= to_block:
+        active = [shard for shard in shards if shard["progress"] < to_block]
+        if active:
+            lagging = min(active, key=lambda shard: shard["progress"])
+            _, end, logs = next(lagging["windows"])
+            lagging["progress"] = end
+            pending_logs.extend(logs)
+            if end >= to_block:
+                # Let the iterator finish, e.g. to save its density estimate
+                next(lagging["windows"], None)
+        progress = min((shard["progress"] for shard in shards), default=to_block)
+        if progress >= next_block:
+            ready = sorted((log for log in pending_logs if log["blockNumber"] <= progress),
+                           key=lambda log: (log["blockNumber"], log["logIndex"]))
+            pending_logs = [log for log in pending_logs if log["blockNumber"] > progress]
+            yield next_block, progress, ready
+            next_block = progress + 1
+
+
+def get_logs(web3: Web3, contract_address: str | List[str], event_signature: str | List[str], 
+             from_block: int = 0, to_block: Optional[int] = None,
+             batch_size: Optional[int] = None, max_workers: Optional[int] = None) -> List[Dict]:
+    """
+    Fetch logs for one or multiple event signatures and contract addresses in batches to avoid RPC limitations.
+    
+    Args:
+        web3: Web3 instance
+        contract_address: Single contract address or list of contract addresses to filter logs
+        event_signature: Single event signature or list of event signatures to filter logs
+        from_block: Starting block number
+        to_block: Ending block number (defaults to latest block)
+        batch_size: Initial blocks per window (defaults to the saved estimate or config.LOGS_BATCH_SIZE)
+        max_workers: Maximum concurrent requests (defaults to config.RPC_MAX_CONCURRENCY)
         
-        current_block = batch_end + 1
+    Returns:
+        List of log entries
+    """
+    all_logs = []
+    for _, _, logs in iter_log_windows(web3, contract_address, event_signature, from_block, to_block,
+                                       batch_size, max_workers):
+        all_logs.extend(logs)
     
     return all_logs
 
 
+def iter_logs(web3: Web3, contract_address: str | List[str], event_signature: str | List[str],
+              from_block: int = 0, to_block: Optional[int] = None,
+              batch_size: Optional[int] = None, max_workers: Optional[int] = None) -> Iterator[Dict]:
+    """
+    Stream logs one by one in block order without holding the whole range in memory.
+    
+    Args:
+        web3: Web3 instance
+        contract_address: Single contract address or list of contract addresses to filter logs
+        event_signature: Single event signature or list of event signatures to filter logs
+        from_block: Starting block number
+        to_block: Ending block number (defaults to latest block)
+        batch_size: Initial blocks per window (defaults to the saved estimate or config.LOGS_BATCH_SIZE)
+        max_workers: Maximum concurrent requests (defaults to config.RPC_MAX_CONCURRENCY)
+        
+    Yields:
+        Log entries
+    """
+    for _, _, logs in iter_log_windows(web3, contract_address, event_signature, from_block, to_block,
+                                       batch_size, max_workers):
+        yield from logs
+
+
 class Web3Encoder(json.JSONEncoder):
     """Custom JSON encoder for Web3 objects."""
     def default(self, obj):
@@ -123,26 +372,356 @@ def save_raw_logs(logs: List[Dict], data_type: str, timestamp: int = None):
     return filename
 
 
-def load_raw_logs(filename: str) -> List[Dict]:
+def save_raw_logs_range(logs: List[Dict], data_type: str, from_block: int, to_block: int,
+                        file_format: Optional[str] = None) -> str:
+    """
+    Durably save the raw logs of a block range.
+    
+    Logs are written in the columnar Parquet format by default (see scripts.log_store),
+    or pickled when file_format is "pkl". The file is written under a temporary name,
+    synced to disk and then renamed, so a crash never leaves a truncated file behind.
+    
+    Args:
+        logs: List of log entries
+        data_type: Type of data (validator_delegator, user_rewards_vault, berachef_weight_updates)
+        from_block: First block of the range
+        to_block: Last block of the range (inclusive)
+        file_format: "parquet" or "pkl" (defaults to config.RAW_LOGS_FORMAT)
+        
+    Returns:
+        Path of the saved file
+    """
+    if file_format is None:
+        file_format = config.RAW_LOGS_FORMAT
+    
+    os.makedirs(config.RAW_LOGS_DIR[data_type], exist_ok=True)
+    
+    filename = f"{config.RAW_LOGS_DIR[data_type]}/logs_{from_block:010d}_{to_block:010d}.{file_format}"
+    if file_format == "parquet":
+        write_log_table(logs_to_table(logs), filename)
+    else:
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, 'wb') as f:
+            pickle.dump(logs, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+    
+    print(f"Saved {len(logs)} raw logs for blocks {from_block}-{to_block} to {filename}")
+    return filename
+
+
+def truncate_raw_logs(data_type: str, block: int, manifest: Optional[CheckpointManifest] = None) -> int:
+    """
+    Drop the checkpointed raw logs of the blocks after block, e.g. after a chain reorganization.
+    
+    Shards entirely after block are removed from the manifest and deleted, and the
+    shard holding block is rewritten with only its logs up to block. The manifest
+    is saved before the old files are deleted, so it never points at a missing file.
+    
+    Args:
+        data_type: Type of data (see config.RAW_LOGS_DIR)
+        block: Last block to keep
+        manifest: Checkpoint manifest to update (defaults to the data type's manifest)
+        
+    Returns:
+        Number of logs dropped
+    """
+    manifest = manifest or CheckpointManifest(data_type)
+    kept_entries = []
+    obsolete_files = []
+    num_dropped = 0
+    for entry in manifest.entries:
+        if entry["to_block"] <= block:
+            kept_entries.append(entry)
+            continue
+        path = os.path.join(manifest.directory, entry["file"]) if entry["file"] else None
+        if path:
+            obsolete_files.append(path)
+        if entry["from_block"] > block:
+            num_dropped += entry["num_logs"]
+            continue
+        logs = load_raw_logs(path, to_block=block) if path and os.path.exists(path) else []
+        filename = save_raw_logs_range(logs, data_type, entry["from_block"], block) if logs else None
+        num_dropped += entry["num_logs"] - len(logs)
+        kept_entries.append(dict(entry, to_block=block, file=os.path.basename(filename) if filename else None,
+                                 num_logs=len(logs)))
+    manifest.entries = kept_entries
+    manifest.save()
+    for path in obsolete_files:
+        if os.path.exists(path):
+            os.remove(path)
+    return num_dropped
+
+
+def merge_raw_logs(data_type: str, logs: List[Dict], manifest: Optional[CheckpointManifest] = None) -> int:
+    """
+    Add logs to the saved shards covering their blocks, e.g. the logs of contracts
+    discovered after those blocks were fetched.
+    
+    Each shard is rewritten with its logs and the new ones in block order, so the
+    shards read as if the logs had been fetched with them. Logs already saved (same
+    block and log index) are skipped, which makes merging the same logs again
+    harmless. Logs of blocks no shard covers are ignored.
+    
+    Args:
+        data_type: Type of data (see config.RAW_LOGS_DIR)
+        logs: Log entries to add
+        manifest: Checkpoint manifest to update (defaults to the data type's manifest)
+        
+    Returns:
+        Number of logs added
+    """
+    manifest = manifest or CheckpointManifest(data_type)
+    obsolete_files = []
+    num_added = 0
+    for entry in manifest.valid_entries():
+        entry_logs = [log for log in logs if entry["from_block"] <= log["blockNumber"] <= entry["to_block"]]
+        if not entry_logs:
+            continue
+        logs = [log for log in logs if not entry["from_block"] <= log["blockNumber"] <= entry["to_block"]]
+        path = os.path.join(manifest.directory, entry["file"]) if entry["file"] else None
+        saved_logs = load_raw_logs(path) if path else []
+        saved_keys = {(log["blockNumber"], log["logIndex"]) for log in saved_logs}
+        new_logs = [log for log in entry_logs if (log["blockNumber"], log["logIndex"]) not in saved_keys]
+        if not new_logs:
+            continue
+        merged_logs = sorted(saved_logs + new_logs, key=lambda log: (log["blockNumber"], log["logIndex"]))
+        filename = save_raw_logs_range(merged_logs, data_type, entry["from_block"], entry["to_block"])
+        if path and os.path.basename(filename) != entry["file"]:
+            obsolete_files.append(path)
+        entry["file"] = os.path.basename(filename)
+        entry["num_logs"] = len(merged_logs)
+        num_added += len(new_logs)
+    if num_added:
+        manifest.save()
+    for path in obsolete_files:
+        if os.path.exists(path):
+            os.remove(path)
+    return num_added
+
+
+def migrate_raw_logs(filename: str, data_type: str) -> Optional[str]:
+    """
+    Convert a legacy pickle or JSON raw log file to the columnar format.
+    
+    The converted block range is recorded in the data type's checkpoint manifest,
+    so later fetches skip it. Note that legacy files only prove which blocks had
+    logs: the range recorded is from the first to the last log of the file.
+    
+    Args:
+        filename: Path to the legacy .pkl or .json file
+        data_type: Type of data (validator_delegator, user_rewards_vault, berachef_weight_updates)
+        
+    Returns:
+        Path of the Parquet file, or None if the file holds no logs
+    """
+    logs = load_raw_logs(filename)
+    if not logs:
+        return None
+    logs = sorted(logs, key=lambda log: (log['blockNumber'], log['logIndex']))
+    from_block, to_block = logs[0]['blockNumber'], logs[-1]['blockNumber']
+    output_filename = save_raw_logs_range(logs, data_type, from_block, to_block, file_format="parquet")
+    CheckpointManifest(data_type).add_range(from_block, to_block, output_filename, len(logs))
+    return output_filename
+
+
+class RawLogShardWriter:
+    """
+    Write raw logs to bounded-size shard files as their windows arrive.
+    
+    A shard is closed once it holds max_logs logs or spans max_blocks blocks, then
+    saved with save_raw_logs_range and recorded in the checkpoint manifest, so
+    memory use is bounded by one shard whatever the length of the scanned range.
+    Windows must be added contiguously and in block order. Buffered windows are
+    flushed when the writer is closed, including when the scan raises, since they
+    were fully fetched.
+    """
+
+    def __init__(self, data_type: str, from_block: int, max_logs: Optional[int] = None,
+                 max_blocks: Optional[int] = None, manifest: Optional[CheckpointManifest] = None):
+        """
+        Args:
+            data_type: Type of data (validator_delegator, user_rewards_vault, berachef_weight_updates)
+            from_block: First block of the first window that will be added
+            max_logs: Logs per shard (defaults to config.CHECKPOINT_LOGS)
+            max_blocks: Blocks per shard (defaults to config.CHECKPOINT_BLOCKS)
+            manifest: Checkpoint manifest to record shards in (defaults to the data type's manifest)
+        """
+        self.data_type = data_type
+        self.max_logs = max_logs or config.CHECKPOINT_LOGS
+        self.max_blocks = max_blocks or config.CHECKPOINT_BLOCKS
+        self.manifest = manifest or CheckpointManifest(data_type)
+        self.shard_start = from_block
+        self.shard_end = None
+        self.buffer = []
+        self.num_logs = 0
+        self.num_shards = 0
+
+    def add_window(self, from_block: int, to_block: int, logs: List[Dict]):
+        """
+        Add the logs of a fetched window, closing the current shard if it is full.
+        
+        Args:
+            from_block: First block of the window
+            to_block: Last block of the window (inclusive)
+            logs: Logs of the window
+        """
+        expected_block = self.shard_start if self.shard_end is None else self.shard_end + 1
+        if from_block != expected_block:
+            raise ValueError(f"Window starting at {from_block} is not contiguous with block {expected_block - 1}")
+        self.buffer.extend(logs)
+        self.shard_end = to_block
+        if len(self.buffer) >= self.max_logs or to_block - self.shard_start + 1 >= self.max_blocks:
+            self.flush()
+
+    def flush(self):
+        """Save the current shard and record its block range in the manifest."""
+        if self.shard_end is None:
+            return
+        filename = save_raw_logs_range(self.buffer, self.data_type, self.shard_start, self.shard_end) \
+            if self.buffer else None
+        self.manifest.add_range(self.shard_start, self.shard_end, filename, len(self.buffer))
+        self.num_logs += len(self.buffer)
+        self.num_shards += 1 if filename else 0
+        self.shard_start = self.shard_end + 1
+        self.shard_end = None
+        self.buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
+
+
+def iter_raw_logs(data_type: str, from_block: int = 0, to_block: Optional[int] = None) -> Iterator[Dict]:
+    """
+    Stream the checkpointed raw logs of a data type shard by shard.
+    
+    Only one shard is held in memory at a time.
+    
+    Args:
+        data_type: Type of data (validator_delegator, user_rewards_vault, berachef_weight_updates)
+        from_block: First block to load
+        to_block: Last block to load (defaults to the last saved block)
+        
+    Yields:
+        Log entries in block order
+    """
+    manifest = CheckpointManifest(data_type)
+    for filename in manifest.files(from_block, to_block):
+        yield from load_raw_logs(filename, from_block=from_block, to_block=to_block)
+
+
+def iter_raw_log_shards(data_type: str, from_block: int = 0, to_block: Optional[int] = None) -> Iterator[List[Dict]]:
+    """
+    Stream the checkpointed raw logs of a data type as one list per shard.
+    
+    Args:
+        data_type: Type of data (validator_delegator, user_rewards_vault, berachef_weight_updates)
+        from_block: First block to load
+        to_block: Last block to load (defaults to the last saved block)
+        
+    Yields:
+        Lists of log entries, one per shard, in block order
+    """
+    manifest = CheckpointManifest(data_type)
+    for filename in manifest.files(from_block, to_block):
+        logs = load_raw_logs(filename, from_block=from_block, to_block=to_block)
+        if logs:
+            yield logs
+
+
+def load_raw_logs_range(data_type: str, from_block: int = 0, to_block: Optional[int] = None) -> List[Dict]:
+    """
+    Load the checkpointed raw logs of a data type between two blocks.
+    
+    Args:
+        data_type: Type of data (validator_delegator, user_rewards_vault, berachef_weight_updates)
+        from_block: First block to load
+        to_block: Last block to load (defaults to the last saved block)
+        
+    Returns:
+        List of log entries in block order
+    """
+    return list(iter_raw_logs(data_type, from_block, to_block))
+
+
+def load_raw_logs(filename: str, columns: Optional[List[str]] = None,
+                  from_block: Optional[int] = None, to_block: Optional[int] = None) -> List[Dict]:
     """
     Load raw logs from a file.
     
-    Supports both pickle (.pkl) and JSON (.json) files for backward compatibility.
+    Supports the columnar Parquet (.parquet) files as well as pickle (.pkl) and
+    JSON (.json) files for backward compatibility. For Parquet files the column
+    projection and block range are pushed down to the reader; use
+    load_raw_log_table to get the columns without building log entries.
     
     Args:
         filename: Path to the log file
+        columns: Raw log columns to load, from scripts.log_store.RAW_LOG_COLUMNS (Parquet only,
+            defaults to all columns)
+        from_block: First block to load
+        to_block: Last block to load (inclusive)
         
     Returns:
         List of log entries
     """
-    if filename.endswith('.pkl'):
+    if filename.endswith('.parquet'):
+        return table_to_logs(read_log_table(filename, columns, from_block, to_block))
+    elif filename.endswith('.pkl'):
         # Load from pickle file
         with open(filename, 'rb') as f:
-            return pickle.load(f)
+            logs = pickle.load(f)
     else:
         # Load from JSON file (for backward compatibility)
         with open(filename, 'r') as f:
-            return json.load(f)
+            logs = json.load(f)
+    
+    if from_block is not None or to_block is not None:
+        logs = [
+            log for log in logs
+            if (from_block is None or log['blockNumber'] >= from_block) and
+               (to_block is None or log['blockNumber'] <= to_block)
+        ]
+    return logs
+
+
+def load_raw_log_table(data_type: str, columns: Optional[List[str]] = None,
+                       from_block: int = 0, to_block: Optional[int] = None):
+    """
+    Load the checkpointed raw logs of a data type as a single columnar table.
+    
+    Shards outside the block range are skipped using the checkpoint manifest, and
+    the remaining Parquet files are read with column projection and block range
+    pushdown. Legacy pickle shards are converted on the fly.
+    
+    Args:
+        data_type: Type of data (validator_delegator, user_rewards_vault, berachef_weight_updates)
+        columns: Raw log columns to load (defaults to all RAW_LOG_COLUMNS)
+        from_block: First block to load
+        to_block: Last block to load (defaults to the last saved block)
+        
+    Returns:
+        pyarrow Table sorted by block_number and log_index
+    """
+    filenames = CheckpointManifest(data_type).files(from_block, to_block)
+    parquet_files = [f for f in filenames if f.endswith('.parquet')]
+    legacy_files = [f for f in filenames if not f.endswith('.parquet')]
+    
+    table = read_log_table(parquet_files, columns, from_block, to_block)
+    if legacy_files:
+        legacy_logs = []
+        for filename in legacy_files:
+            legacy_logs.extend(load_raw_logs(filename, from_block=from_block, to_block=to_block))
+        legacy_table = logs_to_table(legacy_logs).select(table.column_names)
+        table = pa.concat_tables([table, legacy_table])
+        sort_keys = [(c, "ascending") for c in ("block_number", "log_index") if c in table.column_names]
+        if sort_keys:
+            table = table.sort_by(sort_keys)
+    return table
 
 
 def save_csv_data(data: List[Dict], columns: List[str], data_type: str, 
@@ -0,0 +1,179 @@
+"""
+Registry of every reward vault, discovered from the reward vault factory's VaultCreated events.
+"""
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from web3 import Web3
+
+import config
+from scripts.log_store import bytes_to_hex, fixed_binary_to_numpy, hex_to_bytes, logs_to_table
+from scripts.utils import load_raw_log_table
+
+
+REGISTRY_COLUMNS = ["vault_address", "staking_token", "creation_block", "tx_hash", "name",
+                    "backfill_from", "backfill_to"]
+
+
+def decode_vault_creations(raw_logs: pa.Table | List) -> pd.DataFrame:
+    """
+    Decode VaultCreated(address indexed stakingToken, address indexed vault) logs.
+
+    Args:
+        raw_logs: Raw log table (see scripts.log_store.RAW_LOG_SCHEMA) or list of raw log entries
+
+    Returns:
+        DataFrame with vault_address, staking_token, creation_block and tx_hash, in block order
+    """
+    if not isinstance(raw_logs, pa.Table):
+        raw_logs = logs_to_table(raw_logs)
+    topic0 = fixed_binary_to_numpy(raw_logs.column("topic0"), 32)
+    created = (topic0 == hex_to_bytes(config.REWARD_VAULT_FACTORY.event_signatures["VaultCreated"])).all(axis=1)
+    created &= raw_logs.column("topic2").is_valid().to_numpy(zero_copy_only=False)
+    if not created.all():
+        print(f"Skipping {int((~created).sum())} reward vault factory logs that are not VaultCreated events")
+
+    vaults = bytes_to_hex(fixed_binary_to_numpy(raw_logs.column("topic2"), 32)[created, 12:])
+    staking_tokens = bytes_to_hex(fixed_binary_to_numpy(raw_logs.column("topic1"), 32)[created, 12:])
+    return pd.DataFrame({
+        "vault_address": [Web3.to_checksum_address(a) for a in vaults],
+        "staking_token": [Web3.to_checksum_address(a) for a in staking_tokens],
+        "creation_block": raw_logs.column("block_number").to_numpy().astype(np.int64)[created],
+        "tx_hash": bytes_to_hex(fixed_binary_to_numpy(raw_logs.column("tx_hash"), 32)[created]),
+    })
+
+
+class VaultRegistry:
+    """
+    Every known reward vault with its creation block, saved as a Parquet file.
+
+    Vaults of config.REWARD_VAULT_DIC are always included and named after their
+    key. A vault discovered after the user-rewards vault logs were already saved
+    past its creation block is missing from those ranges: its backfill_from and
+    backfill_to columns hold the blocks still to fetch for it alone. backfill_to
+    stays set once they are fetched, until the states are rebuilt with them, and
+    both are -1 when there is nothing to do.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Parquet file of the registry (defaults to config.VAULT_REGISTRY_FILE)
+        """
+        self.path = path or config.VAULT_REGISTRY_FILE
+        if os.path.exists(self.path):
+            self.vaults = pd.read_parquet(self.path)
+        else:
+            self.vaults = pd.DataFrame({column: pd.Series(dtype=object if column in ("vault_address", "staking_token",
+                                                                                     "tx_hash", "name") else np.int64)
+                                        for column in REGISTRY_COLUMNS})
+
+    def __len__(self) -> int:
+        return len(self.vaults)
+
+    def save(self):
+        """Write the registry atomically."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_filename = self.path + ".tmp"
+        self.vaults.to_parquet(tmp_filename, index=False)
+        os.replace(tmp_filename, self.path)
+
+    def addresses(self) -> List[str]:
+        """Return the addresses of every known vault."""
+        return self.vaults.vault_address.tolist()
+
+    def update(self, creations: pd.DataFrame, covered_to: int = 0) -> int:
+        """
+        Add newly discovered vaults.
+
+        Args:
+            creations: Decoded VaultCreated logs (see decode_vault_creations)
+            covered_to: Last block of the saved user-rewards vault logs; new vaults
+                created before it are marked for backfill
+
+        Returns:
+            Number of vaults added
+        """
+        # Vaults first known from REWARD_VAULT_DIC get their creation block once discovered
+        creation_blocks = creations.drop_duplicates("vault_address").set_index("vault_address").creation_block
+        undated = (self.vaults.creation_block == 0) & self.vaults.vault_address.isin(creation_blocks.index)
+        self.vaults.loc[undated, "creation_block"] = self.vaults.loc[undated, "vault_address"].map(creation_blocks)
+
+        known = set(self.vaults.vault_address)
+        named = {address: name for name, address in config.REWARD_VAULT_DIC.items()}
+        new_vaults = creations.loc[~creations.vault_address.isin(known)] \
+            .drop_duplicates("vault_address").copy()
+        # Vaults of REWARD_VAULT_DIC were fetched since genesis and need no backfill
+        hardcoded = pd.DataFrame({"vault_address": [a for a in named if a not in known and
+                                                    a not in set(new_vaults.vault_address)]})
+        hardcoded["creation_block"] = 0
+        new_vaults = pd.concat([new_vaults, hardcoded], ignore_index=True)
+        if new_vaults.empty:
+            return 0
+
+        new_vaults["name"] = new_vaults.vault_address.map(named)
+        needs_backfill = (new_vaults.creation_block <= covered_to) & new_vaults.name.isna()
+        new_vaults["backfill_from"] = np.where(needs_backfill, new_vaults.creation_block, -1)
+        new_vaults["backfill_to"] = np.where(needs_backfill, covered_to, -1)
+        new_vaults = new_vaults.reindex(columns=REGISTRY_COLUMNS)
+        new_vaults["creation_block"] = new_vaults.creation_block.astype(np.int64)
+        self.vaults = new_vaults if self.vaults.empty else pd.concat([self.vaults, new_vaults], ignore_index=True)
+        self.vaults = self.vaults.sort_values(["creation_block", "vault_address"], kind="stable").reset_index(drop=True)
+        return len(new_vaults)
+
+    def update_from_raw_logs(self, covered_to: int = 0) -> int:
+        """Add the vaults of the saved reward vault factory logs (see update)."""
+        return self.update(decode_vault_creations(load_raw_log_table("reward_vault_factory")), covered_to)
+
+    def plan_shards(self, from_block: int, to_block: int, max_addresses: Optional[int] = None,
+                    vaults: Optional[pd.DataFrame] = None) -> List[Tuple[List[str], int]]:
+        """
+        Split the vaults existing in a block range into address groups for eth_getLogs.
+
+        Vaults are grouped in creation order, so each group starts at the creation
+        block of its oldest vault and groups of recent vaults skip most of history.
+
+        Args:
+            from_block: First block to fetch
+            to_block: Last block to fetch
+            max_addresses: Addresses per group (defaults to config.LOGS_MAX_ADDRESSES)
+            vaults: Vaults to group (defaults to the whole registry)
+
+        Returns:
+            List of (vault addresses, first block) tuples
+        """
+        max_addresses = max_addresses or config.LOGS_MAX_ADDRESSES
+        vaults = self.vaults if vaults is None else vaults
+        vaults = vaults.loc[vaults.creation_block <= to_block].sort_values("creation_block", kind="stable")
+        shards = []
+        for i in range(0, len(vaults), max_addresses):
+            group = vaults.iloc[i:i + max_addresses]
+            shards.append((group.vault_address.tolist(), max(from_block, int(group.creation_block.iloc[0]))))
+        return shards
+
+    def pending_backfills(self) -> pd.DataFrame:
+        """Return the vaults with blocks still to backfill."""
+        return self.vaults.loc[(self.vaults.backfill_to >= 0) &
+                               (self.vaults.backfill_from <= self.vaults.backfill_to)]
+
+    def has_backfills(self) -> bool:
+        """Return whether some backfill is still to fetch or to apply to the states."""
+        return bool((self.vaults.backfill_to >= 0).any())
+
+    def finish_backfills(self):
+        """Record that the backfilled logs are fetched and applied to the states."""
+        self.vaults.loc[self.vaults.backfill_to >= 0, ["backfill_from", "backfill_to"]] = -1
+
+    def mark_backfilled(self, addresses: List[str], through_block: int):
+        """Record that the logs of some vaults are saved up to through_block."""
+        rows = self.vaults.vault_address.isin(addresses)
+        self.vaults.loc[rows, "backfill_from"] = np.maximum(self.vaults.loc[rows, "backfill_from"], through_block + 1)
+
+
+def reward_vault_addresses() -> List[str]:
+    """Return every vault of the saved registry, or the vaults of config.REWARD_VAULT_DIC before any discovery."""
+    registry = VaultRegistry()
+    return registry.addresses() if len(registry) else list(config.REWARD_VAULT_DIC.values())
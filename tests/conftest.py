@@ -0,0 +1,95 @@
+"""
+Local JSON-RPC stub servers for testing the RPC layer without a node.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pytest
+
+
+class StubRPCServer:
+    """
+    JSON-RPC server on a local port answering from a handler function.
+
+    status, error, delay and headers can be changed while the server runs to
+    simulate an endpoint failing, throttling or slowing down.
+    """
+
+    def __init__(self, handler: Optional[Callable[[str, Any], Any]] = None):
+        """
+        Args:
+            handler: Function of (method, params) returning the result (defaults to a
+                chain whose head is block 1000)
+        """
+        self.handler = handler or self.default_handler
+        self.status = 200
+        self.error = None
+        self.delay = 0.0
+        self.delayed_methods = None
+        self.headers = {}
+        self.calls: List[Tuple[float, str]] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                requests = body if isinstance(body, list) else [body]
+                for request in requests:
+                    stub.calls.append((time.monotonic(), request["method"]))
+                if stub.delay and (stub.delayed_methods is None or
+                                   any(request["method"] in stub.delayed_methods for request in requests)):
+                    time.sleep(stub.delay)
+                responses = [stub.respond(request) for request in requests]
+                data = json.dumps(responses if isinstance(body, list) else responses[0]).encode()
+                self.send_response(stub.status)
+                for name, value in stub.headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @staticmethod
+    def default_handler(method: str, params: Any) -> Any:
+        if method == "eth_blockNumber":
+            return hex(1000)
+        if method == "eth_chainId":
+            return hex(80094)
+        if method == "eth_getLogs":
+            return []
+        raise ValueError(f"Unsupported method {method}")
+
+    def respond(self, request: Dict) -> Dict:
+        if self.error is not None:
+            return {"jsonrpc": "2.0", "id": request["id"], "error": self.error}
+        return {"jsonrpc": "2.0", "id": request["id"], "result": self.handler(request["method"], request["params"])}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_rpc():
+    """Factory of StubRPCServer instances, shut down after the test."""
+    servers = []
+
+    def make(handler: Optional[Callable[[str, Any], Any]] = None) -> StubRPCServer:
+        server = StubRPCServer(handler)
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.close()
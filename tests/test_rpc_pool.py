@@ -0,0 +1,86 @@
+import time
+
+from scripts.rpc_pool import RPCPool
+
+
+def test_failover_on_5xx(stub_rpc):
+    failing, healthy = stub_rpc(), stub_rpc()
+    failing.status = 503
+    pool = RPCPool([failing.url, healthy.url], rate_limits={}, cooldown=5)
+
+    for _ in range(10):
+        assert pool.request("eth_blockNumber", [])["result"] == hex(1000)
+
+    # The failing endpoint is tried once, then cooled down while the healthy one serves
+    assert len(failing.calls) == 1
+    assert len(healthy.calls) == 10
+    stats = pool.stats()
+    assert stats[failing.url]["errors"] == 1
+    assert stats[failing.url]["cooling_down"]
+
+
+def test_throttled_endpoint_is_cooled_down(stub_rpc):
+    throttled, healthy = stub_rpc(), stub_rpc()
+    throttled.error = {"code": -32005, "message": "rate limit exceeded"}
+    pool = RPCPool([throttled.url, healthy.url], rate_limits={}, cooldown=5)
+
+    for _ in range(10):
+        assert "result" in pool.request("eth_chainId", [])
+
+    assert len(throttled.calls) == 1
+    assert pool.stats()[throttled.url]["cooling_down"]
+
+
+def test_retry_after_sets_cooldown(stub_rpc):
+    throttled, healthy = stub_rpc(), stub_rpc()
+    throttled.status = 429
+    throttled.headers = {"Retry-After": "3"}
+    pool = RPCPool([throttled.url, healthy.url], rate_limits={}, cooldown=30)
+
+    pool.request("eth_chainId", [])
+
+    endpoint = next(e for e in pool.endpoints if e.url == throttled.url)
+    assert 2 < endpoint.cooldown_until - time.monotonic() <= 3
+
+
+def test_result_limit_error_is_returned_to_caller(stub_rpc):
+    limited = stub_rpc()
+    limited.error = {"code": -32005, "message": "query returned more than 10000 results"}
+    pool = RPCPool([limited.url], rate_limits={})
+
+    response = pool.request("eth_getLogs", [{}])
+
+    assert response["error"]["code"] == -32005
+    assert not pool.stats()[limited.url]["cooling_down"]
+
+
+def test_hedge_wins_over_slow_endpoint(stub_rpc):
+    slow, fast = stub_rpc(), stub_rpc()
+    slow.delay = 1.0
+    slow.delayed_methods = {"eth_getLogs"}
+    pool = RPCPool([slow.url, fast.url], rate_limits={}, hedge_delay=0.1)
+
+    start = time.monotonic()
+    response = pool.request("eth_getLogs", [{"fromBlock": "0x0", "toBlock": "0x10"}])
+    elapsed = time.monotonic() - start
+
+    assert response["result"] == []
+    assert elapsed < 0.8
+    assert pool.stats()[fast.url]["hedges_won"] == 1
+
+
+def test_token_bucket_spaces_requests(stub_rpc):
+    server = stub_rpc()
+    rate_limit = 20
+    pool = RPCPool([server.url], rate_limits={server.url: rate_limit})
+
+    for _ in range(rate_limit + 10):
+        pool.request("eth_chainId", [])
+
+    # A full bucket lets the first rate_limit requests through, the rest are spaced 1 / rate_limit apart.
+    # The first request after the burst can come sooner, as tokens refilled while the burst was sent,
+    # and single gaps jitter with the server's scheduling, so the tail is checked on average
+    times = [t for t, _ in server.calls]
+    assert times[-1] - times[0] >= 10 / rate_limit * 0.9
+    tail = times[rate_limit + 1:]
+    assert (tail[-1] - tail[0]) / (len(tail) - 1) >= 1 / rate_limit * 0.9